@@ -0,0 +1,135 @@
+"""
+Cancellable background jobs (formatting, linting) whose results are delivered on the Tk thread.
+
+Work runs on a thread pool. Results are queued and picked up by an ``after()`` poll, so callbacks may
+touch widgets. Submitting a job cancels the previous job of the same kind: its result is dropped, and its
+subprocesses and formatter workers are killed (see formatters.run_formatter). A job whose ``still_valid``
+check fails at delivery (the buffer was edited meanwhile) is dropped too.
+"""
+import logging
+import queue
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOB_POLL_MS = 30
+JOB_WORKERS = 2
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work once the job has been cancelled."""
+
+
+class Job:
+    """Handle passed to a job's work function: cancellation state plus subprocesses that cancel() kills."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.cancelled = threading.Event()
+        self._processes = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self.cancelled.set()
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+    def check(self):
+        """Raises JobCancelled if the job was cancelled; call between steps of long work."""
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+    def run_process(self, command, input_text):
+        """Like ``subprocess.run(command, input=input_text, capture_output=True, text=True)``, but killed on cancel."""
+        self.check()
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   text=True, encoding='utf-8', errors='replace')
+        with self._lock:
+            self._processes.append(process)
+        try:
+            if self.cancelled.is_set(): process.kill()
+            stdout, stderr = process.communicate(input_text)
+        finally:
+            with self._lock:
+                self._processes.remove(process)
+        self.check()
+        return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+class JobRunner:
+    """Runs at most one job per kind at a time; ``widget`` is used for the after() polling."""
+
+    def __init__(self, widget, max_workers=JOB_WORKERS):
+        self.widget = widget
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="background-job")
+        self.current = {}
+        self._results = queue.Queue()
+        self._polling = False
+
+    def submit(self, kind, work, on_done, on_error=None, still_valid=None):
+        """
+        Runs ``work(job)`` in the background and calls ``on_done(result)`` (or ``on_error(exception)``) on the
+        Tk thread, unless the job was superseded or ``still_valid()`` returns False by then.
+        """
+        self.cancel(kind)
+        job = Job(kind)
+        self.current[kind] = job
+        future = self.executor.submit(work, job)
+        future.add_done_callback(lambda f: self._results.put((job, f, on_done, on_error, still_valid)))
+        if not self._polling:
+            self._polling = True
+            self.widget.after(JOB_POLL_MS, self._poll)
+        return job
+
+    def cancel(self, kind):
+        """Cancels the running job of ``kind`` (killing its subprocesses); its result will be dropped."""
+        job = self.current.pop(kind, None)
+        if job is not None:
+            job.cancel()
+            logger.info(f"Cancelled stale {kind} job.")
+
+    def cancel_all(self):
+        for kind in list(self.current):
+            self.cancel(kind)
+
+    def busy(self, kind):
+        return kind in self.current
+
+    def _poll(self):
+        while True:
+            try:
+                job, future, on_done, on_error, still_valid = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._deliver(job, future, on_done, on_error, still_valid)
+        if self.current:
+            self.widget.after(JOB_POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def _deliver(self, job, future, on_done, on_error, still_valid):
+        if job.cancelled.is_set() or self.current.get(job.kind) is not job:
+            return
+        del self.current[job.kind]
+        error = future.exception()
+        if isinstance(error, JobCancelled):
+            return
+        if still_valid is not None and not still_valid():
+            logger.info(f"Dropped {job.kind} result: the buffer changed while it ran.")
+            return
+        try:
+            if error is None:
+                on_done(future.result())
+            elif on_error is not None:
+                on_error(error)
+            else:
+                logger.error(f"{job.kind} job failed: {error}")
+        except Exception as e:
+            logger.error(f"Error delivering {job.kind} result: {e}", exc_info=True)
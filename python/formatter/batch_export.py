@@ -0,0 +1,163 @@
+"""
+Bulk export of highlighted source files to HTML on a process pool.
+
+Every worker initializes the style tables once; lexers are resolved per extension through get_lexer's cache.
+A manifest in the output directory records the SHA-256 of each exported source, so files that have not
+changed since the last run are skipped. Usage:
+
+    python batch_export.py path/to/repo path/to/output --style monokai --jobs 8
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import syntax_highlighter
+from syntax_highlighter import initialize_style, get_lexer, export_css, export_file
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".export_manifest.json"
+STYLESHEET_NAME = "style.css"
+# Files handed to a worker per task; keeps IPC overhead low for thousands of small files
+EXPORT_TASK_CHUNK_SIZE = 16
+MAX_EXPORT_FILE_SIZE = 20 * 1024 * 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+BINARY_SNIFF_SIZE = 8192
+SKIPPED_DIRECTORIES = {'__pycache__'}
+
+
+def _init_worker(style_name):
+    """Process pool initializer: builds the style tables once per worker."""
+    logging.getLogger('syntax_highlighter').setLevel(logging.WARNING)
+    initialize_style(style_name)
+
+def file_sha256(path):
+    """SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _export_one(task):
+    """
+    Worker: exports one file unless its hash matches ``previous``.
+    Returns (relative path, status, manifest entry) with status "exported", "unchanged", "binary", "too_large" or "error".
+    """
+    source_root, output_root, rel_path, previous = task
+    source_path = os.path.join(source_root, rel_path)
+    output_path = os.path.join(output_root, rel_path + ".html")
+    try:
+        stat = os.stat(source_path)
+        if stat.st_size > MAX_EXPORT_FILE_SIZE:
+            return rel_path, "too_large", None
+        if previous and previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns \
+                and os.path.exists(output_path):
+            return rel_path, "unchanged", previous
+        sha256 = file_sha256(source_path)
+        entry = {'sha256': sha256, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if previous and previous.get('sha256') == sha256 and os.path.exists(output_path):
+            return rel_path, "unchanged", entry
+        with open(source_path, 'rb') as f:
+            head = f.read(BINARY_SNIFF_SIZE)
+        if b'\0' in head:
+            return rel_path, "binary", None
+
+        lexer = get_lexer(source_path, head.decode('utf-8', errors='replace'))
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        stylesheet_href = os.path.relpath(os.path.join(output_root, STYLESHEET_NAME), os.path.dirname(output_path))
+        temp_path = output_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as out:
+            export_file(source_path, out, "html", lexer=lexer, stylesheet_href=stylesheet_href.replace(os.sep, '/'))
+        os.replace(temp_path, output_path)
+        return rel_path, "exported", entry
+    except Exception as e:
+        logger.error(f"Failed to export {rel_path}: {e}")
+        return rel_path, "error", None
+
+def iter_source_files(source_root, output_root):
+    """
+    Yields paths relative to ``source_root`` of the regular files to export, skipping hidden entries,
+    SKIPPED_DIRECTORIES and the output directory.
+    """
+    output_root = os.path.abspath(output_root)
+    for dirpath, dirnames, filenames in os.walk(source_root):
+        dirnames[:] = sorted(d for d in dirnames
+                             if not d.startswith('.') and d not in SKIPPED_DIRECTORIES
+                             and os.path.abspath(os.path.join(dirpath, d)) != output_root)
+        for filename in sorted(filenames):
+            if filename.startswith('.'): continue
+            path = os.path.join(dirpath, filename)
+            if os.path.isfile(path):
+                yield os.path.relpath(path, source_root)
+
+def load_manifest(output_root, style_name):
+    """Returns the previous run's {relative path: entry} map, or {} if missing or made with another style."""
+    try:
+        with open(os.path.join(output_root, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('style') != style_name:
+        logger.info(f"Style changed from {manifest.get('style')!r} to {style_name!r}: exporting everything.")
+        return {}
+    return manifest.get('files', {})
+
+def save_manifest(output_root, style_name, files):
+    path = os.path.join(output_root, MANIFEST_NAME)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump({'style': style_name, 'files': files}, f)
+    os.replace(path + ".tmp", path)
+
+def export_tree(source_root, output_root, style_name='monokai', jobs=None, force=False):
+    """Exports every file below ``source_root`` to ``output_root`` and returns a {status: count} summary."""
+    os.makedirs(output_root, exist_ok=True)
+    previous_files = {} if force else load_manifest(output_root, style_name)
+    initialize_style(style_name)
+    with open(os.path.join(output_root, STYLESHEET_NAME), 'w', encoding='utf-8') as f:
+        f.write(export_css())
+
+    tasks = [(source_root, output_root, rel_path, previous_files.get(rel_path))
+             for rel_path in iter_source_files(source_root, output_root)]
+    logger.info(f"Exporting {len(tasks)} files from {source_root} with {jobs or os.cpu_count()} workers...")
+    files, summary = {}, {}
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(style_name,)) as executor:
+            for done, (rel_path, status, entry) in enumerate(
+                    executor.map(_export_one, tasks, chunksize=EXPORT_TASK_CHUNK_SIZE), 1):
+                summary[status] = summary.get(status, 0) + 1
+                if entry: files[rel_path] = entry
+                if done % 1000 == 0:
+                    logger.info(f"{done}/{len(tasks)} files processed...")
+    finally:
+        # Keep what was done even if the run is interrupted
+        save_manifest(output_root, style_name, files)
+    logger.info(f"Done in {time.perf_counter() - start:.1f}s: "
+                + ", ".join(f"{count} {status}" for status, count in sorted(summary.items())))
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export highlighted source files to HTML in parallel.")
+    parser.add_argument("source", help="Directory to export")
+    parser.add_argument("output", help="Directory for the HTML files")
+    parser.add_argument("--style", default="monokai", choices=syntax_highlighter.get_style_names(),
+                        metavar="STYLE", help="Pygments style (default: monokai)")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Export every file even if it has not changed")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger('syntax_highlighter').setLevel(logging.WARNING)
+    if not os.path.isdir(args.source):
+        parser.error(f"not a directory: {args.source}")
+    summary = export_tree(args.source, args.output, args.style, args.jobs, args.force)
+    return 1 if summary.get("error") else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
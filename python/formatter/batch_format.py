@@ -0,0 +1,248 @@
+"""
+Headless formatting (or checking) of a whole directory on a process pool, for CI.
+
+Each file's language comes from the extension index in formatters.py (content analysis only for extensions
+several languages claim), and its formatter from SUPPORTED_FORMATTERS, exactly as in the editor. A manifest
+records the SHA-256 of every file found to be formatted together with the formatter's identity, so files
+that have not changed since the last run are skipped; it is kept in MANIFEST_DIR, outside the checked tree.
+The results are printed to stdout as JSON. Usage:
+
+    python batch_format.py path/to/repo --check --jobs 8
+    python main.py --check path/to/repo
+
+Exit codes: 0 if every file is formatted, 1 if --check found files that need formatting, 2 on errors or when
+the formatter of some files is not installed (unless --skip-missing).
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import inprocess_formatters
+from format_cache import FORMAT_CACHE_DIR
+from formatter_pool import FormatterPool
+from formatters import (SUPPORTED_FORMATTERS, language_for_lexer, languages_for_filename, formatter_command,
+                        runs_in_process, run_formatter)
+from syntax_highlighter import get_lexer
+from tool_detection import ToolRegistry
+
+logger = logging.getLogger(__name__)
+
+# One manifest per checked directory, named after the hash of its real path
+MANIFEST_DIR = os.path.join(FORMAT_CACHE_DIR, "manifests")
+# Files handed to a worker per task; formatting costs far more than the IPC
+FORMAT_TASK_CHUNK_SIZE = 4
+MAX_FORMAT_FILE_SIZE = 5 * 1024 * 1024
+BINARY_SNIFF_SIZE = 8192
+SKIPPED_DIRECTORIES = {'__pycache__', 'node_modules'}
+
+EXIT_OK = 0
+EXIT_NEEDS_FORMATTING = 1
+EXIT_ERRORS = 2
+
+# Per worker process: formatter -> identity of the installed formatter (see _formatter_identities)
+_IDENTITIES = {}
+_POOL = None
+
+
+def _init_worker(identities):
+    """Process pool initializer."""
+    global _IDENTITIES
+    for name in ('syntax_highlighter', 'formatters', 'formatter_pool', 'inprocess_formatters'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    _IDENTITIES = identities
+
+def _worker_pool():
+    """Each worker process keeps its own warm formatter workers (prettier), started on first use."""
+    global _POOL
+    if _POOL is None:
+        _POOL = FormatterPool()
+    return _POOL
+
+def _format_one(task):
+    """
+    Worker: formats (or checks) one file unless its size and mtime, or its hash, match ``previous``.
+    Returns (result, manifest entry); the result's status is "formatted", "unchanged", "would_reformat",
+    "skipped", "unsupported", "missing_formatter", "binary", "too_large" or "error".
+    """
+    root, rel_path, languages, check, previous = task
+    path = os.path.join(root, rel_path)
+    result = {'path': rel_path}
+    try:
+        stat = os.stat(path)
+        if stat.st_size > MAX_FORMAT_FILE_SIZE:
+            return dict(result, status="too_large"), None
+        if previous and previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+            return dict(result, language=previous.get('language'), formatter=previous.get('formatter'),
+                        status="skipped"), previous
+        with open(path, 'rb') as f:
+            data = f.read()
+        if b'\0' in data[:BINARY_SNIFF_SIZE]:
+            return dict(result, status="binary"), None
+
+        language = languages[0] if len(languages) == 1 else None
+        if language is None:
+            language = language_for_lexer(get_lexer(path, data[:BINARY_SNIFF_SIZE].decode('utf-8', errors='replace')))
+        formatter = SUPPORTED_FORMATTERS.get(language)
+        result.update(language=language, formatter=formatter)
+        if formatter is None:
+            return dict(result, status="unsupported"), None
+        if formatter not in _IDENTITIES:
+            return dict(result, status="missing_formatter"), None
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        entry = {'sha256': sha256, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                 'language': language, 'formatter': formatter}
+        if previous and previous.get('sha256') == sha256 and previous.get('formatter') == formatter:
+            return dict(result, status="skipped"), entry
+        code = data.decode('utf-8')
+        formatted = run_formatter(formatter, formatter_command(formatter, language), code,
+                                  runs_in_process(formatter), _worker_pool())
+        if formatted == code:
+            return dict(result, status="unchanged"), entry
+        if check:
+            return dict(result, status="would_reformat"), None
+
+        formatted_data = formatted.encode('utf-8')
+        with open(path + ".tmp", 'wb') as f:
+            f.write(formatted_data)
+        shutil.copymode(path, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        stat = os.stat(path)
+        return dict(result, status="formatted"), dict(entry, sha256=hashlib.sha256(formatted_data).hexdigest(),
+                                                      size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    except Exception as e:
+        logger.error(f"Failed to format {rel_path}: {e}")
+        return dict(result, status="error", error=str(e).strip()), None
+
+def iter_files(root):
+    """Yields paths relative to ``root`` of the regular files below it, skipping hidden entries and SKIPPED_DIRECTORIES."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.') and d not in SKIPPED_DIRECTORIES)
+        for filename in sorted(filenames):
+            if filename.startswith('.'): continue
+            path = os.path.join(dirpath, filename)
+            if os.path.isfile(path):
+                yield os.path.relpath(path, root)
+
+def _formatter_identities(formatters):
+    """{formatter: identity} for the installed ``formatters``; the identity changes when a formatter is upgraded."""
+    tools = ToolRegistry()
+    tools.detect([formatter for formatter in formatters if not runs_in_process(formatter)])
+    identities = {}
+    for formatter in formatters:
+        identity = inprocess_formatters.identity(formatter) if runs_in_process(formatter) else tools.identity(formatter)
+        if identity is not None:
+            # Lists, to compare equal with the identities read back from the manifest
+            identities[formatter] = list(identity)
+    return identities
+
+def load_manifest(manifest_path, identities):
+    """Returns the previous run's {relative path: entry} map, without entries of formatters that changed since."""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    previous_identities = manifest.get('formatters', {})
+    changed = {formatter for formatter, identity in identities.items() if previous_identities.get(formatter) != identity}
+    if changed:
+        logger.info(f"Formatters changed since the last run: {', '.join(sorted(changed))}")
+    return {rel_path: entry for rel_path, entry in manifest.get('files', {}).items()
+            if entry.get('formatter') in identities and entry.get('formatter') not in changed}
+
+def default_manifest_path(root):
+    """Manifest of ``root`` in MANIFEST_DIR, so that checking a tree never writes into it."""
+    digest = hashlib.sha256(os.path.realpath(root).encode('utf-8')).hexdigest()
+    return os.path.join(MANIFEST_DIR, digest + ".json")
+
+def save_manifest(manifest_path, identities, files):
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump({'formatters': identities, 'files': files}, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+def format_tree(root, check=False, jobs=None, force=False, manifest_path=None):
+    """Formats (or with ``check``, only checks) every supported file below ``root``; returns the JSON report."""
+    manifest_path = manifest_path or default_manifest_path(root)
+    identities = _formatter_identities(sorted(set(SUPPORTED_FORMATTERS.values())))
+    previous_files = {} if force else load_manifest(manifest_path, identities)
+
+    tasks, summary = [], {}
+    for rel_path in iter_files(root):
+        languages = languages_for_filename(os.path.basename(rel_path))
+        if not languages:
+            summary["unsupported"] = summary.get("unsupported", 0) + 1
+            continue
+        tasks.append((root, rel_path, languages, check, previous_files.get(rel_path)))
+    logger.info(f"{'Checking' if check else 'Formatting'} {len(tasks)} files in {root} "
+                f"with {jobs or os.cpu_count()} workers...")
+
+    results, files = [], {}
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(identities,)) as executor:
+            for result, entry in executor.map(_format_one, tasks, chunksize=FORMAT_TASK_CHUNK_SIZE):
+                summary[result['status']] = summary.get(result['status'], 0) + 1
+                results.append(result)
+                if entry: files[result['path']] = entry
+    finally:
+        # Keep what was done even if the run is interrupted
+        try:
+            save_manifest(manifest_path, identities, files)
+        except OSError as e:
+            logger.warning(f"Could not save the manifest {manifest_path}: {e}")
+    elapsed = time.perf_counter() - start
+    logger.info(f"Done in {elapsed:.1f}s: " + ", ".join(f"{count} {status}" for status, count in sorted(summary.items())))
+    missing = sorted({result['formatter'] for result in results if result['status'] == "missing_formatter"})
+    if missing:
+        logger.error(f"Not installed: {', '.join(missing)}; {summary['missing_formatter']} files were not "
+                     f"{'checked' if check else 'formatted'}")
+    return {'root': root, 'mode': "check" if check else "format", 'elapsed_seconds': round(elapsed, 3),
+            'summary': summary, 'missing_formatters': missing, 'files': results}
+
+def exit_code(report, skip_missing=False):
+    """EXIT_ERRORS if a formatter failed or, unless ``skip_missing``, some files' formatter is not installed."""
+    summary = report['summary']
+    if summary.get("error") or (summary.get("missing_formatter") and not skip_missing):
+        return EXIT_ERRORS
+    if summary.get("would_reformat"):
+        return EXIT_NEEDS_FORMATTING
+    return EXIT_OK
+
+def add_arguments(parser):
+    """The batch options, also accepted by ``main.py``."""
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Process every file even if it has not changed")
+    parser.add_argument("--manifest", help=f"Manifest of the last run (default: in {MANIFEST_DIR})")
+    parser.add_argument("--skip-missing", action="store_true",
+                        help="Do not fail when the formatter of some files is not installed")
+
+def run(directory, args):
+    """Formats or checks ``directory`` with the parsed ``args``, prints the JSON report and returns the exit code."""
+    # stdout carries the report only
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr,
+                        force=True)
+    logging.getLogger('syntax_highlighter').setLevel(logging.WARNING)
+    report = format_tree(directory, check=args.check, jobs=args.jobs, force=args.force, manifest_path=args.manifest)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return exit_code(report, args.skip_missing)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Format (or check) every supported file in a directory in parallel.")
+    parser.add_argument("directory", help="Directory to format")
+    parser.add_argument("--check", action="store_true", help="Report files that need formatting without changing them")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.directory):
+        parser.error(f"not a directory: {args.directory}")
+    return run(args.directory, args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+Headless benchmarks for the syntax highlighter.
+
+Runs get_lexer, configure_tags, highlight_line and highlight_document against a RecordingWidget stub (no
+display needed) over generated Python, JavaScript and JSON files, and reports tokens per second and widget
+calls per line. Usage:
+
+    python benchmark.py --sizes 1K,100K,1M --languages python,json --json results.json
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from collections import Counter
+
+import syntax_highlighter
+from syntax_highlighter import get_lexer, configure_tags, highlight_line, highlight_document
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = "1K,10K,100K,1M,10M,50M"
+DEFAULT_LANGUAGES = "python,javascript,json"
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 * 1024}
+BENCHMARK_STYLE = 'monokai'
+HIGHLIGHTERS = ('highlight_line', 'highlight_document')
+
+
+class RecordingWidget:
+    """
+    Stand-in for a tk.Text that keeps the inserted text and counts every call made on it.
+    Only supports what the highlighter uses: appending at "end" and absolute or "end-1c" indices.
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+        self.chunks = []
+        self.last_line, self.last_col = 1, 0
+        self.tags = {}
+
+    def __str__(self):
+        return f".recording_widget_{id(self)}"
+
+    def insert(self, index, text, *tags):
+        self.calls['insert'] += 1
+        self.chunks.append(text)
+        newlines = text.count('\n')
+        if newlines:
+            self.last_line += newlines
+            self.last_col = len(text) - text.rfind('\n') - 1
+        else:
+            self.last_col += len(text)
+
+    def index(self, index):
+        self.calls['index'] += 1
+        if index in ("end-1c", "end"):
+            return f"{self.last_line}.{self.last_col}"
+        return index
+
+    def get(self, start, end=None):
+        self.calls['get'] += 1
+        return "".join(self.chunks) + "\n"
+
+    def tag_add(self, tag_name, *indices):
+        self.calls['tag_add'] += 1
+        self.calls['tag_add_ranges'] += len(indices) // 2
+        self.tags.setdefault(tag_name, {})
+
+    def tag_remove(self, tag_name, *indices):
+        self.calls['tag_remove'] += 1
+
+    def tag_names(self, index=None):
+        self.calls['tag_names'] += 1
+        return tuple(self.tags)
+
+    def tag_configure(self, tag_name, **options):
+        self.calls['tag_configure'] += 1
+        self.tags.setdefault(tag_name, {}).update(options)
+
+    def cget(self, option):
+        self.calls['cget'] += 1
+        return "#272822"
+
+    def widget_calls(self):
+        """Total widget calls, not counting the tag_add_ranges tally."""
+        return sum(count for name, count in self.calls.items() if name != 'tag_add_ranges')
+
+
+def _python_block(i):
+    return (
+        f"class Widget{i}(Base):\n"
+        f"    \"\"\"Docstring for widget {i}.\"\"\"\n"
+        f"    LIMIT = {i * 7} # upper bound\n\n"
+        f"    def render_{i}(self, items, scale=1.5):\n"
+        f"        total = sum(item.value * scale for item in items if item)\n"
+        f"        label = f\"widget-{{self.name}}-{i}\"\n"
+        f"        return {{'total': total, 'label': label, 'ok': total > {i}}}\n\n"
+    )
+
+def _javascript_block(i):
+    return (
+        f"// Component {i}\n"
+        f"export class Component{i} extends Base {{\n"
+        f"  constructor(props) {{ super(props); this.limit = {i * 7}; }}\n"
+        f"  render(items, scale = 1.5) {{\n"
+        f"    const total = items.filter(Boolean).reduce((acc, it) => acc + it.value * scale, 0);\n"
+        f"    return `component-${{this.name}}-{i}: ${{total > {i} ? 'ok' : \"low\"}}`;\n"
+        f"  }}\n"
+        f"}}\n\n"
+    )
+
+def _json_block(i):
+    return (
+        f"  {{\n"
+        f"    \"id\": {i},\n"
+        f"    \"name\": \"item-{i}\",\n"
+        f"    \"price\": {i * 1.25},\n"
+        f"    \"active\": {'true' if i % 2 else 'false'},\n"
+        f"    \"tags\": [\"a{i % 10}\", \"b{i % 7}\", null]\n"
+        f"  }},\n"
+    )
+
+CORPUS_GENERATORS = {
+    'python': ('bench.py', _python_block, "", ""),
+    'javascript': ('bench.js', _javascript_block, "", ""),
+    'json': ('bench.json', _json_block, "[\n", "  {}\n]\n"),
+}
+
+def generate_corpus(language, size):
+    """Returns (filename, code) for a generated file of roughly ``size`` characters."""
+    filename, block, head, tail = CORPUS_GENERATORS[language]
+    parts, length, i = [head], len(head) + len(tail), 0
+    while length < size:
+        text = block(i)
+        parts.append(text)
+        length += len(text)
+        i += 1
+    parts.append(tail)
+    return filename, "".join(parts)
+
+def parse_size(text):
+    """Parses sizes such as "512", "10K" or "50M" into bytes."""
+    text = text.strip().upper()
+    multiplier = SIZE_SUFFIXES.get(text[-1:], 1)
+    return int(float(text.rstrip("KM")) * multiplier)
+
+
+def bench_get_lexer(filename, code, repeat):
+    """Times a cold (empty cache) and a warm get_lexer call."""
+    syntax_highlighter._LEXER_CACHE.clear()
+    start = time.perf_counter()
+    lexer = get_lexer(filename, code)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat): get_lexer(filename, code)
+    warm = (time.perf_counter() - start) / repeat
+    return lexer, {'lexer': type(lexer).__name__, 'cold_ms': cold * 1000, 'warm_ms': warm * 1000}
+
+def bench_configure_tags():
+    """Times configure_tags on a fresh widget, re-applying the same style, and switching style."""
+    results = {}
+    widget = RecordingWidget()
+    for label, style_name in (('first', BENCHMARK_STYLE), ('reapply', BENCHMARK_STYLE), ('switch', 'default')):
+        widget.calls.clear()
+        start = time.perf_counter()
+        configure_tags(widget, style_name, merge_inherited=True)
+        results[label] = {'ms': (time.perf_counter() - start) * 1000, 'widget_calls': widget.widget_calls()}
+    configure_tags(widget, BENCHMARK_STYLE, merge_inherited=True)
+    return results
+
+def _run_highlighter(name, code, lexer, widget):
+    if name == 'highlight_line':
+        for line in code.splitlines(keepends=True):
+            highlight_line(widget, line, None, lexer)
+    elif name == 'highlight_document':
+        widget.insert("end", code)
+        widget.calls.clear()
+        highlight_document(widget, lexer)
+    else:
+        raise ValueError(f"Unknown highlighter: {name}")
+
+def bench_highlighter(name, code, lexer):
+    """Runs one highlighter over ``code`` on a RecordingWidget and returns its throughput and call counts."""
+    token_count = sum(1 for _index, _token_type, value in lexer.get_tokens_unprocessed(code) if value)
+    line_count = code.count('\n') + 1
+    widget = RecordingWidget()
+    configure_tags(widget, BENCHMARK_STYLE, merge_inherited=True)
+    widget.calls.clear()
+    start = time.perf_counter()
+    _run_highlighter(name, code, lexer, widget)
+    elapsed = time.perf_counter() - start
+    return {
+        'seconds': elapsed,
+        'tokens': token_count,
+        'lines': line_count,
+        'tokens_per_second': token_count / elapsed if elapsed else 0.0,
+        'widget_calls_per_line': widget.widget_calls() / line_count,
+        'tag_ranges_per_line': widget.calls['tag_add_ranges'] / line_count,
+        'calls': dict(widget.calls),
+    }
+
+def run_benchmarks(sizes, languages, highlighters, repeat=100):
+    """Runs every benchmark and returns the results as a JSON-serialisable dict."""
+    results = {'configure_tags': bench_configure_tags(), 'files': []}
+    for language in languages:
+        for size in sizes:
+            filename, code = generate_corpus(language, size)
+            lexer, lexer_result = bench_get_lexer(filename, code, repeat)
+            entry = {'language': language, 'size': len(code), 'get_lexer': lexer_result}
+            for name in highlighters:
+                entry[name] = bench_highlighter(name, code, lexer)
+                logger.info(f"{language:<10} {len(code):>10} B {name:<18} "
+                            f"{entry[name]['tokens_per_second']:>12,.0f} tokens/s "
+                            f"{entry[name]['widget_calls_per_line']:>6.2f} calls/line")
+            results['files'].append(entry)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless syntax highlighter benchmarks.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma separated corpus sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--languages", default=DEFAULT_LANGUAGES, help=f"Comma separated languages (default: {DEFAULT_LANGUAGES})")
+    parser.add_argument("--highlighters", default=",".join(HIGHLIGHTERS), help="Comma separated highlighters to run")
+    parser.add_argument("--repeat", type=int, default=100, help="Warm get_lexer calls to average over")
+    parser.add_argument("--json", metavar="PATH", help="Write the results as JSON to PATH ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logging.getLogger('syntax_highlighter').setLevel(logging.WARNING)
+    languages = [language.strip() for language in args.languages.split(',') if language.strip()]
+    unknown = [language for language in languages if language not in CORPUS_GENERATORS]
+    if unknown:
+        parser.error(f"unknown languages: {', '.join(unknown)} (choose from {', '.join(CORPUS_GENERATORS)})")
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    highlighters = [name.strip() for name in args.highlighters.split(',') if name.strip()]
+    unknown = [name for name in highlighters if name not in HIGHLIGHTERS]
+    if unknown:
+        parser.error(f"unknown highlighters: {', '.join(unknown)} (choose from {', '.join(HIGHLIGHTERS)})")
+
+    results = run_benchmarks(sizes, languages, highlighters, args.repeat)
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Results written to {args.json}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,416 @@
+"""
+Line diff engine and Tk diff view for comparing the buffer with the formatter's output.
+
+Hunks come from Myers' O(ND) difference algorithm (linear space, divide and conquer on the middle snake)
+run over interned lines after trimming the common prefix and suffix. Character-level intraline highlights
+are only computed for changed lines once their hunk scrolls into view.
+"""
+import logging
+from bisect import bisect_left, bisect_right
+from collections import Counter
+import tkinter as tk
+
+logger = logging.getLogger(__name__)
+
+# Edit cost after which the middle snake search settles for the furthest reaching path instead of the
+# optimal one; keeps wholesale rewrites from going quadratic at the price of a less minimal diff.
+DIFF_MAX_COST = 256
+DIFF_CONTEXT_LINES = 3
+# Searches over more items than this are first split at lines that are unique to both sides
+DIFF_ANCHOR_MIN_ITEMS = 2000
+# Runs of very common lines up to this long are dropped from the search when surrounded by changed lines
+DISCARD_MAX_RUN = 2
+# Lines with more changes than this ratio are shown without intraline highlights (they are rewrites)
+INTRALINE_MAX_CHANGE_RATIO = 0.6
+# Intraline highlighting skips lines longer than this
+INTRALINE_MAX_LINE_LENGTH = 2000
+INTRALINE_MARGIN_LINES = 50
+NO_NEWLINE_MARKER = "\\ No newline at end of file"
+
+
+def _middle_snake(a, a0, a1, b, b0, b1, max_cost):
+    """
+    Finds the middle snake of the shortest edit script for a[a0:a1] -> b[b0:b1].
+    Returns (x, y, u, v, cost): the snake runs from (x, y) to (u, v), relative to (a0, b0).
+    """
+    n, m = a1 - a0, b1 - b0
+    delta = n - m
+    odd = delta & 1
+    max_d = (n + m + 1) // 2
+    # Diagonals only reach +-d, so the arrays are sized by the cost bound rather than by the input length
+    offset = min(max_d, max_cost) + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+    for d in range(max_d + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a0 + x] == b[b0 + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if odd and delta - (d - 1) <= k <= delta + (d - 1) and x + backward[offset + delta - k] >= n:
+                return x0, y0, x, y, 2 * d - 1
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a1 - 1 - x] == b[b1 - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + k] = x
+            if not odd and -d <= delta - k <= d and x + forward[offset + delta - k] >= n:
+                return n - x, m - y, n - x0, m - y0, 2 * d
+        if d >= max_cost:
+            # Too expensive: split at the forward point that got furthest along the diagonal
+            best_k = max(range(-d, d + 1, 2), key=lambda k: 2 * forward[offset + k] - k
+                         if 0 <= forward[offset + k] <= n and 0 <= forward[offset + k] - k <= m else -1)
+            x = forward[offset + best_k]
+            return x, x - best_k, x, x - best_k, 2 * d
+    raise AssertionError("middle snake not found")
+
+def _matching_blocks(a, a0, a1, b, b0, b1, max_cost, blocks):
+    """Appends the (i, j, length) blocks of equal items between a[a0:a1] and b[b0:b1] to ``blocks``."""
+    start_a, start_b = a0, b0
+    while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+        a0 += 1
+        b0 += 1
+    if a0 > start_a:
+        blocks.append((start_a, start_b, a0 - start_a))
+    end_a, end_b = a1, b1
+    while a1 > a0 and b1 > b0 and a[a1 - 1] == b[b1 - 1]:
+        a1 -= 1
+        b1 -= 1
+    if a0 < a1 and b0 < b1:
+        x, y, u, v, cost = _middle_snake(a, a0, a1, b, b0, b1, max_cost)
+        if (x, y) == (0, 0) and (u, v) == (a1 - a0, b1 - b0):
+            raise AssertionError("middle snake made no progress")
+        _matching_blocks(a, a0, a0 + x, b, b0, b0 + y, max_cost, blocks)
+        if u > x:
+            blocks.append((a0 + x, b0 + y, u - x))
+        _matching_blocks(a, a0 + u, a1, b, b0 + v, b1, max_cost, blocks)
+    if a1 < end_a:
+        blocks.append((a1, b1, end_a - a1))
+
+def _kept_indices(items, other_counts):
+    """
+    Indices of the items worth handing to the O(ND) search. Items absent from the other sequence can never
+    match. Items that are very common there (blank lines, lone braces) are dropped too when they sit among
+    dropped items: inside a rewritten region they would only produce scattered, meaningless matches while
+    making the search expensive.
+    """
+    many = 5
+    scale = len(items) // 64
+    while scale >> 2:
+        scale >>= 2
+        many *= 2
+    # 0: never matches, 1: matches, 2: matches but very common
+    kinds = [0 if not other_counts.get(item) else 2 if other_counts[item] > many else 1 for item in items]
+    kept = []
+    i, count = 0, len(kinds)
+    while i < count:
+        if kinds[i] != 2:
+            if kinds[i]: kept.append(i)
+            i += 1
+            continue
+        run_end = i
+        while run_end < count and kinds[run_end] == 2:
+            run_end += 1
+        among_dropped = (i == 0 or kinds[i - 1] == 0) and (run_end == count or kinds[run_end] == 0)
+        if not (among_dropped and run_end - i <= DISCARD_MAX_RUN):
+            kept.extend(range(i, run_end))
+        i = run_end
+    return kept
+
+def _unique_anchors(a, b):
+    """
+    Pairs up the items occurring exactly once in each sequence and returns the longest chain of such
+    (i, j) pairs that is increasing in both, as patience diff does. The anchors split a large search into
+    small independent ones.
+    """
+    a_counts, b_counts = Counter(a), Counter(b)
+    b_position = {item: j for j, item in enumerate(b) if b_counts[item] == 1}
+    pairs = [(i, b_position[item]) for i, item in enumerate(a) if a_counts[item] == 1 and item in b_position]
+    # Patience sorting: tails[k] is the smallest j ending an increasing chain of length k + 1
+    tails, tail_pairs, previous = [], [], []
+    for index, (i, j) in enumerate(pairs):
+        k = bisect_left(tails, j)
+        if k == len(tails):
+            tails.append(j)
+            tail_pairs.append(index)
+        else:
+            tails[k] = j
+            tail_pairs[k] = index
+        previous.append(tail_pairs[k - 1] if k else -1)
+    chain = []
+    index = tail_pairs[-1] if tail_pairs else -1
+    while index != -1:
+        chain.append(pairs[index])
+        index = previous[index]
+    chain.reverse()
+    return chain
+
+def matching_blocks(a, b, max_cost=DIFF_MAX_COST):
+    """
+    Returns the maximal (i, j, length) runs of equal items of sequences ``a`` and ``b``, in order and ending
+    with the (len(a), len(b), 0) sentinel, like difflib.SequenceMatcher.get_matching_blocks.
+    Items that cannot (or should not) match are dropped before the search, and large searches are split at
+    lines unique to both sides, so wholesale rewrites do not hit the O(ND) worst case.
+    """
+    a_index = _kept_indices(a, Counter(b))
+    b_index = _kept_indices(b, Counter(a))
+    a_kept = [a[i] for i in a_index]
+    b_kept = [b[j] for j in b_index]
+    blocks = []
+    i = j = 0
+    anchors = _unique_anchors(a_kept, b_kept) if len(a_kept) + len(b_kept) > DIFF_ANCHOR_MIN_ITEMS else []
+    for anchor_i, anchor_j in anchors:
+        if anchor_i != i or anchor_j != j:
+            _matching_blocks(a_kept, i, anchor_i, b_kept, j, anchor_j, max_cost, blocks)
+        blocks.append((anchor_i, anchor_j, 1))
+        i, j = anchor_i + 1, anchor_j + 1
+    _matching_blocks(a_kept, i, len(a_kept), b_kept, j, len(b_kept), max_cost, blocks)
+    merged = []
+    for i, j, size in blocks:
+        ai, bj = a_index[i], b_index[j]
+        if a_index[i + size - 1] - ai == size - 1 and b_index[j + size - 1] - bj == size - 1:
+            # Contiguous in the original sequences too (the common case)
+            if merged and merged[-1][0] + merged[-1][2] == ai and merged[-1][1] + merged[-1][2] == bj:
+                merged[-1][2] += size
+            else:
+                merged.append([ai, bj, size])
+            continue
+        for k in range(size):
+            ai, bj = a_index[i + k], b_index[j + k]
+            if merged and merged[-1][0] + merged[-1][2] == ai and merged[-1][1] + merged[-1][2] == bj:
+                merged[-1][2] += 1
+            else:
+                merged.append([ai, bj, 1])
+    merged = [tuple(block) for block in merged]
+    merged.append((len(a), len(b), 0))
+    return merged
+
+def get_opcodes(a, b, max_cost=DIFF_MAX_COST):
+    """Returns difflib-style (tag, i1, i2, j1, j2) opcodes turning ``a`` into ``b``."""
+    opcodes = []
+    i = j = 0
+    for ai, bj, size in matching_blocks(a, b, max_cost):
+        if i < ai and j < bj: opcodes.append(('replace', i, ai, j, bj))
+        elif i < ai: opcodes.append(('delete', i, ai, j, j))
+        elif j < bj: opcodes.append(('insert', i, i, j, bj))
+        if size: opcodes.append(('equal', ai, ai + size, bj, bj + size))
+        i, j = ai + size, bj + size
+    return opcodes
+
+def intern_lines(old_lines, new_lines):
+    """Maps every distinct line to a small int so the diff compares ints instead of strings."""
+    ids = {}
+    old_ids = [ids.setdefault(line, len(ids)) for line in old_lines]
+    new_ids = [ids.setdefault(line, len(ids)) for line in new_lines]
+    return old_ids, new_ids
+
+def split_lines(text):
+    """
+    Splits ``text`` into lines keeping their '\n'. Unlike str.splitlines, only '\n' ends a line, as in a Tk
+    Text widget, so line numbers match the editor's even with form feeds or Unicode line separators.
+    """
+    lines = text.split('\n')
+    last = lines.pop()
+    lines = [line + '\n' for line in lines]
+    if last: lines.append(last)
+    return lines
+
+def diff_lines(old_text, new_text, max_cost=DIFF_MAX_COST):
+    """Splits both texts into lines (see split_lines) and returns (old_lines, new_lines, opcodes)."""
+    old_lines = split_lines(old_text)
+    new_lines = split_lines(new_text)
+    old_ids, new_ids = intern_lines(old_lines, new_lines)
+    return old_lines, new_lines, get_opcodes(old_ids, new_ids, max_cost)
+
+def group_hunks(opcodes, context=DIFF_CONTEXT_LINES):
+    """Groups opcodes into hunks with up to ``context`` unchanged lines around each change."""
+    if not any(tag != 'equal' for tag, *_ in opcodes):
+        return []
+    codes = list(opcodes)
+    tag, i1, i2, j1, j2 = codes[0]
+    if tag == 'equal': codes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    tag, i1, i2, j1, j2 = codes[-1]
+    if tag == 'equal': codes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+
+    hunks, current = [], []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2 - i1 > 2 * context:
+            current.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            hunks.append(current)
+            current = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        current.append((tag, i1, i2, j1, j2))
+    if current and not (len(current) == 1 and current[0][0] == 'equal'):
+        hunks.append(current)
+    return [hunk for hunk in hunks if any(op[0] != 'equal' for op in hunk)]
+
+def _merge_ranges(ranges, gap):
+    merged = []
+    for start, end in ranges:
+        if merged and start - merged[-1][1] <= gap:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def intraline_ranges(old_line, new_line):
+    """
+    Returns the changed character ranges of a modified line as (old_ranges, new_ranges), or None when the
+    lines differ too much for intraline highlighting to be useful.
+    """
+    if len(old_line) > INTRALINE_MAX_LINE_LENGTH or len(new_line) > INTRALINE_MAX_LINE_LENGTH:
+        return None
+    old_ranges, new_ranges = [], []
+    for tag, i1, i2, j1, j2 in get_opcodes(old_line, new_line, max_cost=INTRALINE_MAX_LINE_LENGTH):
+        if tag == 'equal': continue
+        if i2 > i1: old_ranges.append((i1, i2))
+        if j2 > j1: new_ranges.append((j1, j2))
+    changed = sum(e - s for s, e in old_ranges) + sum(e - s for s, e in new_ranges)
+    if changed > INTRALINE_MAX_CHANGE_RATIO * max(len(old_line) + len(new_line), 1):
+        return None
+    # Bridge one-character islands so highlights read as words rather than confetti
+    return _merge_ranges(old_ranges, 1), _merge_ranges(new_ranges, 1)
+
+
+class DiffView:
+    """
+    Renders a unified diff of two texts into a Tk text widget using the diff tags set up by configure_tags.
+    Intraline highlights are computed for replaced lines only when their hunk is near the visible area.
+    """
+
+    def __init__(self, text_widget, margin=INTRALINE_MARGIN_LINES):
+        self.text_widget = text_widget
+        self.margin = margin
+        self.old_lines = []
+        self.new_lines = []
+        # Widget line of each hunk's header, and per hunk the (widget line, old line, new line) pairs to refine
+        self.hunk_lines = []
+        self.hunk_pairs = []
+        self.refined = bytearray()
+        self.gutter_width = 0
+        self._scroll_command = None
+
+    def attach(self):
+        """Hooks yscrollcommand and <Configure> so intraline highlights follow the view."""
+        widget = self.text_widget
+        self._scroll_command = widget.cget("yscrollcommand")
+        widget.configure(yscrollcommand=self._on_yscroll)
+        widget.bind("<Configure>", self._on_view_changed, add="+")
+
+    def _on_yscroll(self, first, last):
+        if self._scroll_command:
+            self.text_widget.tk.call(*self.text_widget.tk.splitlist(self._scroll_command), first, last)
+        self._on_view_changed()
+
+    def _on_view_changed(self, event=None):
+        self.refine_visible()
+
+    def set_texts(self, old_text, new_text, context=DIFF_CONTEXT_LINES):
+        """Diffs ``old_text`` against ``new_text`` and renders the hunks. Returns the number of hunks."""
+        self.old_lines, self.new_lines, opcodes = diff_lines(old_text, new_text)
+        hunks = group_hunks(opcodes, context)
+        self.gutter_width = len(str(max(len(self.old_lines), len(self.new_lines), 1)))
+        width = self.gutter_width
+
+        parts, ranges_by_tag = [], {}
+        self.hunk_lines, self.hunk_pairs = [], []
+        line = 1
+        def add_range(tag_name, start, end):
+            ranges_by_tag.setdefault(tag_name, []).extend((start, end))
+        def add_line(text, line_tag, old_no="", new_no="", marker=" "):
+            nonlocal line
+            parts.append(f"{old_no:>{width}} {new_no:>{width}} {marker}{text.rstrip(chr(13) + chr(10))}\n")
+            add_range("line_no", f"{line}.0", f"{line}.{2 * width + 1}")
+            add_range(line_tag, f"{line}.{2 * width + 1}", f"{line + 1}.0")
+            line += 1
+            if not text.endswith('\n'):
+                parts.append(f"{'':>{width}} {'':>{width}} {NO_NEWLINE_MARKER}\n")
+                add_range("no_newline_marker", f"{line}.0", f"{line + 1}.0")
+                line += 1
+
+        for hunk in hunks:
+            _tag, i1, _i2, j1, _j2 = hunk[0]
+            i2, j2 = hunk[-1][2], hunk[-1][4]
+            self.hunk_lines.append(line)
+            parts.append(f"@@ -{i1 + 1},{i2 - i1} +{j1 + 1},{j2 - j1} @@\n")
+            add_range("diff_header", f"{line}.0", f"{line + 1}.0")
+            line += 1
+            pairs = []
+            for tag, i1, i2, j1, j2 in hunk:
+                if tag == 'equal':
+                    for i, j in zip(range(i1, i2), range(j1, j2)):
+                        add_line(self.old_lines[i], "diff_common", i + 1, j + 1)
+                    continue
+                paired = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+                old_start = line
+                for i in range(i1, i2):
+                    add_line(self.old_lines[i], "diff_del", i + 1, "", "-")
+                new_start = line
+                for j in range(j1, j2):
+                    add_line(self.new_lines[j], "diff_add", "", j + 1, "+")
+                for k in range(paired):
+                    pairs.append((old_start + k, new_start + k, i1 + k, j1 + k))
+            self.hunk_pairs.append(pairs)
+        self.refined = bytearray(len(hunks))
+
+        widget = self.text_widget
+        try:
+            widget.configure(state=tk.NORMAL)
+            widget.delete("1.0", tk.END)
+            widget.insert("1.0", "".join(parts))
+            for tag_name, indices in ranges_by_tag.items():
+                widget.tag_add(tag_name, *indices)
+            widget.configure(state=tk.DISABLED)
+        except tk.TclError as e:
+            logger.error(f"TclError rendering diff: {e}", exc_info=False)
+        logger.debug(f"Rendered diff: {len(hunks)} hunks, {line - 1} lines.")
+        self.refine_visible()
+        return len(hunks)
+
+    def visible_lines(self):
+        """Returns the first and last line currently shown in the widget."""
+        widget = self.text_widget
+        first = int(widget.index("@0,0").split('.')[0])
+        last = int(widget.index(f"@0,{widget.winfo_height()}").split('.')[0])
+        return first, last
+
+    def refine_visible(self):
+        """Adds intraline highlights to the hunks near the visible area that do not have them yet."""
+        if not self.hunk_lines: return
+        try:
+            first, last = self.visible_lines()
+            self.refine_lines(first - self.margin, last + self.margin)
+        except tk.TclError as e:
+            logger.error(f"TclError refining visible diff: {e}", exc_info=False)
+
+    def refine_lines(self, first_line, last_line):
+        """Adds intraline highlights to every hunk overlapping widget lines ``first_line``..``last_line``."""
+        first_hunk = max(bisect_right(self.hunk_lines, first_line) - 1, 0)
+        last_hunk = bisect_right(self.hunk_lines, last_line)
+        ranges_by_tag = {}
+        for hunk in range(first_hunk, last_hunk):
+            if self.refined[hunk]: continue
+            self.refined[hunk] = 1
+            for old_row, new_row, i, j in self.hunk_pairs[hunk]:
+                changes = intraline_ranges(self.old_lines[i].rstrip('\r\n'), self.new_lines[j].rstrip('\r\n'))
+                if changes is None: continue
+                offset = 2 * self.gutter_width + 2
+                for tag_name, row, char_ranges in (("char_highlight_del", old_row, changes[0]),
+                                                   ("char_highlight_add", new_row, changes[1])):
+                    indices = ranges_by_tag.setdefault(tag_name, [])
+                    for start, end in char_ranges:
+                        indices.extend((f"{row}.{offset + start}", f"{row}.{offset + end}"))
+        for tag_name, indices in ranges_by_tag.items():
+            if indices: self.text_widget.tag_add(tag_name, *indices)
@@ -0,0 +1,61 @@
+"""
+Tracks which lines of the editor were edited since the last save or format, for range formatting.
+
+Fed by the edit proxy of syntax_highlighter.DocumentHighlighter (see ``edit_listeners``): every insert,
+delete or replace reports the edited index range and the line count before and after, so the recorded
+ranges can be shifted and merged as lines come and go.
+"""
+
+
+class ChangedLines:
+    """Sorted, non-overlapping 1-based inclusive (first, last) line ranges edited since the last clear()."""
+
+    def __init__(self):
+        self.ranges = []
+        # Set when an edit of unknown extent (undo/redo) happened: every line counts as changed
+        self.everything = False
+
+    def clear(self):
+        self.ranges = []
+        self.everything = False
+
+    def __bool__(self):
+        return self.everything or bool(self.ranges)
+
+    def on_edit(self, first_index, last_index, end_before, end_after):
+        """Edit proxy listener; the arguments are Tk indices as passed to DocumentHighlighter._on_edit."""
+        if first_index == "0":
+            self.everything = True
+            return
+        first = int(first_index.split('.')[0])
+        last = max(int(last_index.split('.')[0]), first)
+        delta = int(end_after.split('.')[0]) - int(end_before.split('.')[0])
+        self.record(first, last, delta)
+
+    def record(self, first, last, delta):
+        """Lines ``first``..``last`` were replaced by ``last - first + 1 + delta`` lines."""
+        merged_first, merged_last = first, last + delta
+        ranges = []
+        for a, b in self.ranges:
+            if b < first:
+                ranges.append((a, b))
+            elif a > last:
+                ranges.append((a + delta, b + delta))
+            else:
+                # Overlaps the edit: the part before it stays, the part after it moves with the following lines
+                merged_first = min(merged_first, a)
+                merged_last = max(merged_last, b + delta if b > last else last + delta)
+        ranges.append((merged_first, max(merged_last, merged_first)))
+        ranges.sort()
+        self.ranges = []
+        for a, b in ranges:
+            if self.ranges and a <= self.ranges[-1][1] + 1:
+                self.ranges[-1] = (self.ranges[-1][0], max(self.ranges[-1][1], b))
+            else:
+                self.ranges.append((a, b))
+
+    def line_ranges(self, line_count):
+        """The recorded ranges clipped to a document of ``line_count`` lines (all of it after an undo/redo)."""
+        if self.everything:
+            return [(1, line_count)]
+        return [(a, min(b, line_count)) for a, b in self.ranges if a <= line_count]
@@ -0,0 +1,412 @@
+"""
+Faster drop-in tokenizers for the languages opened most often (Python, JSON, YAML).
+
+The Pygments RegexLexer loop tries every rule of the current state with a separate regex call until one
+matches. FastPythonLexer and FastYamlLexer compile each state's rules into a single alternation regex
+instead: Python's ``re`` tries the alternatives in order and takes the first that matches, exactly like
+the loop, so one C-level match replaces a dozen Python-level ones while producing the same token stream.
+FastJsonLexer replaces JsonLexer's per-character state machine with one alternation regex.
+
+Identical output is checked by the differential verifier:
+
+    python fast_lexers.py --verify path/to/sources ...
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+
+from pygments.lexer import LexerContext
+from pygments.lexers.data import JsonLexer, YamlLexer, YamlLexerContext
+from pygments.lexers.python import PythonLexer
+from pygments.token import Comment, Error, Keyword, Name, Number, Punctuation, String, Text, Whitespace, _TokenType
+
+logger = logging.getLogger(__name__)
+
+ROOT_STATE = ('root',)
+# Rules using backreferences, named or conditional groups, or other global inline flags depend on their own
+# group numbering or on being the whole pattern, so they are matched on their own.
+_UNCOMBINABLE_RULE = re.compile(r'\\[1-9]|\(\?P[=<]|\(\?\(|^\(\?[aiLmsux]+\)')
+# A leading (?i), (?m) or (?s) becomes a scoped (?i:...) group so the rule can join its neighbours
+_LEADING_INLINE_FLAGS = re.compile(r'\(\?([ims]+)\)')
+_INLINE_FLAG_BITS = {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL}
+
+
+def _rule_source(rexmatch):
+    """Returns (pattern source, flags) of a rule's regex for use inside an alternation, or None if it cannot join one."""
+    pattern = getattr(rexmatch, '__self__', None)
+    if not isinstance(pattern, re.Pattern) or not isinstance(pattern.pattern, str):
+        return None
+    source, flags = pattern.pattern, pattern.flags
+    # A trailing comment in a verbose pattern would swallow the closing parenthesis of its group
+    newline = "\n" if flags & re.VERBOSE else ""
+    inline = _LEADING_INLINE_FLAGS.match(source)
+    if inline:
+        for letter in inline.group(1):
+            flags &= ~_INLINE_FLAG_BITS[letter]
+        source = source[inline.end():]
+    if _UNCOMBINABLE_RULE.search(source):
+        return None
+    source += newline
+    return (f"(?{inline.group(1)}:{source})" if inline else source), flags
+
+def _combine_rules(rules):
+    """
+    Turns a state's ``(rexmatch, action, new_state)`` rules into segments ``(match, rules_by_group, rules)``.
+    Runs of combinable rules share one alternation regex, each rule wrapped in a capturing group, so the
+    outermost group of the alternative that matched is ``m.lastindex``. Other rules keep their own regex
+    and have ``rules_by_group`` None.
+    """
+    segments, run = [], []
+
+    def close_run():
+        if len(run) == 1:
+            segments.append((run[0][0][0], None, [run[0][0]]))
+        elif run:
+            patterns, rules_by_group, group = [], {}, 1
+            for rule, source, _flags in run:
+                patterns.append(f"({source})")
+                rules_by_group[group] = rule
+                group += rule[0].__self__.groups + 1
+            try:
+                combined = re.compile("|".join(patterns), run[0][2])
+                segments.append((combined.match, rules_by_group, [rule for rule, _source, _flags in run]))
+            except (re.error, OverflowError, RecursionError) as e:
+                logger.debug(f"Could not combine {len(run)} rules, matching them separately: {e}")
+                segments.extend((rule[0], None, [rule]) for rule, _source, _flags in run)
+        run.clear()
+
+    for rule in rules:
+        combinable = _rule_source(rule[0])
+        if combinable is None:
+            close_run()
+            segments.append((rule[0], None, [rule]))
+            continue
+        source, flags = combinable
+        if run and run[0][2] != flags:
+            close_run()
+        run.append((rule, source, flags))
+    close_run()
+    return segments
+
+def _combined_states(lexer):
+    """Per-class cache of the combined segments of every state."""
+    cls = type(lexer)
+    tables = cls.__dict__.get('_combined_tokens')
+    if tables is None:
+        tables = {state: _combine_rules(rules) for state, rules in lexer._tokens.items()}
+        cls._combined_tokens = tables
+        logger.debug(f"Combined {sum(len(rules) for rules in lexer._tokens.values())} rules of {cls.__name__} "
+                     f"into {sum(len(segments) for segments in tables.values())} regexes.")
+    return tables
+
+
+class FastRegexLexerMixin:
+    """RegexLexer loop over combined per-state regexes; mix in before the RegexLexer subclass it speeds up."""
+
+    def get_tokens_unprocessed(self, text, stack=ROOT_STATE):
+        return self.get_tokens_with_line_states(text, stack)
+
+    def get_tokens_with_line_states(self, text, state=ROOT_STATE, line_states=None):
+        """
+        Yields the same tokens as RegexLexer.get_tokens_unprocessed starting from the ``state`` stack.
+        If ``line_states`` is a list, ``(line_offset, state)`` is appended for every line that begins on a
+        token boundary, as syntax_highlighter.lex_with_line_states does.
+        """
+        tables = _combined_states(self)
+        pos, line_offset = 0, 0
+        statestack = list(state)
+        segments = tables[statestack[-1]]
+        while 1:
+            for match, rules_by_group, rules in segments:
+                m = match(text, pos)
+                if m:
+                    if rules_by_group is None:
+                        rexmatch, action, new_state = rules[0]
+                        rule_match = m
+                    else:
+                        rexmatch, action, new_state = rules_by_group[m.lastindex]
+                        rule_match = None
+                    if action is not None:
+                        if type(action) is _TokenType:
+                            yield pos, action, m.group()
+                        else:
+                            # Callbacks index the rule's own groups: re-match with the rule's regex
+                            yield from action(self, rule_match or rexmatch(text, pos))
+                    end = m.end()
+                    if new_state is not None:
+                        if isinstance(new_state, tuple):
+                            for new in new_state:
+                                if new == '#pop':
+                                    if len(statestack) > 1: statestack.pop()
+                                elif new == '#push':
+                                    statestack.append(statestack[-1])
+                                else:
+                                    statestack.append(new)
+                        elif isinstance(new_state, int):
+                            if abs(new_state) >= len(statestack): del statestack[1:]
+                            else: del statestack[new_state:]
+                        elif new_state == '#push':
+                            statestack.append(statestack[-1])
+                        segments = tables[statestack[-1]]
+                    if end > pos:
+                        newlines = text.count('\n', pos, end)
+                        if newlines:
+                            line_offset += newlines
+                            if line_states is not None and text[end - 1] == '\n':
+                                line_states.append((line_offset, tuple(statestack)))
+                    pos = end
+                    break
+            else:
+                try:
+                    if text[pos] == '\n':
+                        statestack = ['root']
+                        segments = tables['root']
+                        yield pos, Whitespace, '\n'
+                        pos += 1
+                        line_offset += 1
+                        if line_states is not None: line_states.append((line_offset, ROOT_STATE))
+                        continue
+                    yield pos, Error, text[pos]
+                    pos += 1
+                except IndexError:
+                    break
+
+
+class FastExtendedRegexLexerMixin:
+    """
+    ExtendedRegexLexer loop over combined per-state regexes; mix in before the lexer it speeds up.
+    A line state is the snapshot of the lexer context returned by _context_state.
+    """
+
+    def get_tokens_unprocessed(self, text=None, context=None):
+        return self._lex_context(context or self._context_from_state(text, ROOT_STATE))
+
+    def get_tokens_with_line_states(self, text, state=ROOT_STATE, line_states=None):
+        """As FastRegexLexerMixin.get_tokens_with_line_states, resuming from a state recorded by an earlier run."""
+        return self._lex_context(self._context_from_state(text, state), line_states)
+
+    def _context_from_state(self, text, state):
+        return LexerContext(text, 0, stack=list(state))
+
+    def _context_state(self, ctx):
+        return tuple(ctx.stack)
+
+    def _lex_context(self, ctx, line_states=None):
+        tables = _combined_states(self)
+        text = ctx.text
+        segments = tables[ctx.stack[-1]]
+        line_offset = 0
+        while 1:
+            start = ctx.pos
+            for match, rules_by_group, rules in segments:
+                m = match(text, ctx.pos, ctx.end)
+                if m:
+                    if rules_by_group is None:
+                        rexmatch, action, new_state = rules[0]
+                        rule_match = m
+                    else:
+                        rexmatch, action, new_state = rules_by_group[m.lastindex]
+                        rule_match = None
+                    if action is not None:
+                        if type(action) is _TokenType:
+                            yield ctx.pos, action, m.group()
+                            ctx.pos = m.end()
+                        else:
+                            yield from action(self, rule_match or rexmatch(text, ctx.pos, ctx.end), ctx)
+                            if not new_state:
+                                segments = tables[ctx.stack[-1]]
+                    if new_state is not None:
+                        if isinstance(new_state, tuple):
+                            for new in new_state:
+                                if new == '#pop':
+                                    if len(ctx.stack) > 1: ctx.stack.pop()
+                                elif new == '#push':
+                                    ctx.stack.append(ctx.stack[-1])
+                                else:
+                                    ctx.stack.append(new)
+                        elif isinstance(new_state, int):
+                            if abs(new_state) >= len(ctx.stack): del ctx.stack[1:]
+                            else: del ctx.stack[new_state:]
+                        elif new_state == '#push':
+                            ctx.stack.append(ctx.stack[-1])
+                        segments = tables[ctx.stack[-1]]
+                    break
+            else:
+                try:
+                    if ctx.pos >= ctx.end:
+                        break
+                    if text[ctx.pos] == '\n':
+                        ctx.stack = ['root']
+                        segments = tables['root']
+                        yield ctx.pos, Text, '\n'
+                        ctx.pos += 1
+                    else:
+                        yield ctx.pos, Error, text[ctx.pos]
+                        ctx.pos += 1
+                except IndexError:
+                    break
+            if line_states is not None and ctx.pos > start:
+                newlines = text.count('\n', start, ctx.pos)
+                if newlines:
+                    line_offset += newlines
+                    if text[ctx.pos - 1] == '\n':
+                        line_states.append((line_offset, self._context_state(ctx)))
+
+
+class FastPythonLexer(FastRegexLexerMixin, PythonLexer):
+    """PythonLexer on combined per-state regexes."""
+
+
+class FastYamlLexer(FastExtendedRegexLexerMixin, YamlLexer):
+    """YamlLexer on combined per-state regexes."""
+
+    # The YAML callbacks keep their indentation bookkeeping on a YamlLexerContext, so a line state
+    # snapshots that bookkeeping along with the state stack.
+    def _context_from_state(self, text, state):
+        context = YamlLexerContext(text, 0)
+        if state != ROOT_STATE:
+            stack, context.indent, indent_stack, context.next_indent, context.block_scalar_indent = state
+            context.stack, context.indent_stack = list(stack), list(indent_stack)
+        return context
+
+    def _context_state(self, ctx):
+        return tuple(ctx.stack), ctx.indent, tuple(ctx.indent_stack), ctx.next_indent, ctx.block_scalar_indent
+
+
+_JSON_TOKEN = re.compile(r'''
+    ([ \n\r\t]+)                                       # 1 whitespace
+  | ("[^"\\]*(?:\\(?:u(?:[0-9a-fA-F]{3}[\s\S]|[0-9a-fA-F]{0,2}[^0-9a-fA-F])|[^u])[^"\\]*)*")  # 2 string
+  | (:[{}\[\],]*)                                      # 3 colon
+  | ([{}\[\],]+)                                       # 4 punctuation
+  | ([-0-9]+[.eE+][-0-9.eE+]*)                         # 5 float
+  | ([-0-9]+)                                          # 6 integer
+  | ([fnt][truefalsn]*)                                # 7 constant
+  | (//[^\n]*)                                         # 8 single line comment
+  | (/\*[\s\S]*?\*/)                                   # 9 multiline comment
+  | (["][\s\S]*|/\*[\s\S]*|[\s\S])                     # 10 unterminated string or comment, stray character
+''', re.VERBOSE)
+_JSON_STRING, _JSON_COLON = 2, 3
+_JSON_HELD_BACK = frozenset((1, 8, 9))
+_JSON_TOKEN_TYPES = (None, Whitespace, String.Double, Punctuation, Punctuation, Number.Float, Number.Integer,
+                     Keyword.Constant, Comment.Single, Comment.Multiline, Error)
+
+
+class FastJsonLexer(JsonLexer):
+    """
+    JsonLexer with its character loop replaced by one alternation regex.
+    Strings, whitespace and comments are held back until the next other token, because a following ``:``
+    turns the held strings into object keys (Name.Tag), just as JsonLexer's queue does.
+    """
+
+    def get_tokens_unprocessed(self, text):
+        queue = []
+        token_types = _JSON_TOKEN_TYPES
+        for m in _JSON_TOKEN.finditer(text):
+            group = m.lastindex
+            if group == _JSON_STRING:
+                queue.append((m.start(), String.Double, m.group()))
+            elif group in _JSON_HELD_BACK:
+                if queue: queue.append((m.start(), token_types[group], m.group()))
+                else: yield m.start(), token_types[group], m.group()
+            elif group == _JSON_COLON:
+                for queued_start, queued_token, queued_value in queue:
+                    yield queued_start, Name.Tag if queued_token is String.Double else queued_token, queued_value
+                queue.clear()
+                yield m.start(), Punctuation, m.group()
+            else:
+                if queue:
+                    yield from queue
+                    queue.clear()
+                yield m.start(), token_types[group], m.group()
+        yield from queue
+
+
+FAST_LEXERS = {
+    PythonLexer: FastPythonLexer,
+    JsonLexer: FastJsonLexer,
+    YamlLexer: FastYamlLexer,
+}
+
+def get_fast_lexer_class(lexer_class):
+    """Returns the fast equivalent of a Pygments lexer class, or None if there is none."""
+    return FAST_LEXERS.get(lexer_class)
+
+
+def _tokens_equal(reference, fast):
+    """Returns None if both token streams are equal, else the index of the first difference."""
+    for index, (expected, got) in enumerate(zip(reference, fast)):
+        if expected != got:
+            return index
+    return None if len(reference) == len(fast) else min(len(reference), len(fast))
+
+def verify_text(lexer_class, text):
+    """Lexes ``text`` with the Pygments lexer and its fast equivalent. Returns (mismatch index or None, pygments s, fast s)."""
+    reference_lexer, fast_lexer = lexer_class(), FAST_LEXERS[lexer_class]()
+    start = time.perf_counter()
+    reference = list(reference_lexer.get_tokens_unprocessed(text))
+    reference_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    fast = list(fast_lexer.get_tokens_unprocessed(text))
+    fast_seconds = time.perf_counter() - start
+    mismatch = _tokens_equal(reference, fast)
+    if mismatch is not None:
+        expected = reference[mismatch] if mismatch < len(reference) else None
+        got = fast[mismatch] if mismatch < len(fast) else None
+        logger.error(f"Token {mismatch} differs: pygments {expected!r}, fast {got!r}")
+    return mismatch, reference_seconds, fast_seconds
+
+def _lexer_class_for_path(path):
+    name = os.path.basename(path)
+    for lexer_class in FAST_LEXERS:
+        if any(re.fullmatch(re.escape(pattern).replace(r'\*', '.*'), name) for pattern in lexer_class.filenames):
+            return lexer_class
+    return None
+
+def _iter_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+                for filename in sorted(filenames):
+                    yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+def verify_paths(paths):
+    """Differential check of every Python, JSON and YAML file below ``paths``. Returns the number of mismatching files."""
+    totals = {}
+    mismatches = 0
+    for path in _iter_paths(paths):
+        lexer_class = _lexer_class_for_path(path)
+        if lexer_class is None: continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError):
+            continue
+        mismatch, reference_seconds, fast_seconds = verify_text(lexer_class, text)
+        if mismatch is not None:
+            mismatches += 1
+            logger.error(f"MISMATCH {path} ({lexer_class.__name__})")
+        files, reference_total, fast_total = totals.get(lexer_class.__name__, (0, 0.0, 0.0))
+        totals[lexer_class.__name__] = (files + 1, reference_total + reference_seconds, fast_total + fast_seconds)
+    for name, (files, reference_total, fast_total) in sorted(totals.items()):
+        speedup = reference_total / fast_total if fast_total else 0.0
+        logger.info(f"{name:<12} {files:>6} files  pygments {reference_total:8.2f}s  fast {fast_total:8.2f}s  ({speedup:.1f}x)")
+    return mismatches
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fast tokenizers for Python, JSON and YAML.")
+    parser.add_argument("--verify", nargs='+', metavar="PATH", required=True,
+                        help="Files or directories to compare against the Pygments lexers token by token")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    mismatches = verify_paths(args.verify)
+    logger.info("All token streams identical." if not mismatches else f"{mismatches} file(s) differ.")
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
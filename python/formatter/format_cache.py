@@ -0,0 +1,116 @@
+"""
+Content-addressed cache of formatter results on disk.
+
+Entries are keyed by the SHA-256 of (formatter identity, options, SHA-256 of the input), where the identity
+is the formatter's resolved path, mtime and version, so upgrading a formatter invalidates its entries.
+Each entry is one file named after its key; the total size is bounded by evicting the least recently used
+entries (a hit refreshes the entry's mtime). The index is kept in memory, so a miss costs no disk access.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+FORMAT_CACHE_DIR = os.path.expanduser("~/.code_formatter_cache")
+FORMAT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def cache_key(identity, options, code):
+    """Key of the result of formatting ``code`` with the formatter ``identity`` and ``options`` (JSON-serializable)."""
+    code_digest = hashlib.sha256(code.encode('utf-8')).hexdigest()
+    material = json.dumps([identity, options, code_digest], sort_keys=True, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class FormatCache:
+    """Size-bounded LRU of formatted outputs, one file per entry in ``directory``."""
+
+    def __init__(self, directory=FORMAT_CACHE_DIR, max_bytes=FORMAT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # key -> (last use, size in bytes)
+        self.entries = {}
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if len(entry.name) != 64 or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    self.entries[entry.name] = (stat.st_mtime_ns, stat.st_size)
+                    self.total_bytes += stat.st_size
+        except OSError as e:
+            logger.warning(f"Format cache disabled: {e}")
+            self.directory = None
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Returns the cached output for ``key``, or None."""
+        with self._lock:
+            if self.directory is None or key not in self.entries:
+                return None
+            try:
+                with open(self._path(key), 'r', encoding='utf-8') as f:
+                    output = f.read()
+                os.utime(self._path(key))
+            except (OSError, ValueError):
+                self._forget(key)
+                return None
+            self.entries[key] = (os.stat(self._path(key)).st_mtime_ns, self.entries[key][1])
+            return output
+
+    def put(self, key, output):
+        """Stores ``output`` under ``key``, evicting the least recently used entries beyond ``max_bytes``."""
+        data = output.encode('utf-8')
+        with self._lock:
+            if self.directory is None or len(data) > self.max_bytes:
+                return
+            try:
+                # Written next to the entry and renamed, so a reader never sees a partial file
+                fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, self._path(key))
+            except OSError as e:
+                logger.warning(f"Could not write format cache entry: {e}")
+                return
+            if key in self.entries:
+                self.total_bytes -= self.entries[key][1]
+            self.entries[key] = (os.stat(self._path(key)).st_mtime_ns, len(data))
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        evicted = 0
+        for key, _entry in sorted(self.entries.items(), key=lambda item: item[1][0]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            self._forget(key)
+            evicted += 1
+        logger.info(f"Evicted {evicted} format cache entries ({self.total_bytes:,} bytes kept).")
+
+    def _forget(self, key):
+        _last_use, size = self.entries.pop(key)
+        self.total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            for key in list(self.entries):
+                self._forget(key)
@@ -0,0 +1,324 @@
+"""
+Pool of long-lived formatter worker processes.
+
+Starting Node and loading prettier costs far more than formatting a file, so each
+formatter gets a worker process that is started once and reused. Requests and responses are JSON
+messages, each framed by a 4-byte big-endian length prefix, exchanged over the worker's stdin/stdout:
+
+    request:  {"id": 1, "code": "...", "filepath": "temp.js", "options": {}}
+    response: {"id": 1, "ok": true, "output": "..."}  or  {"id": 1, "ok": false, "error": "..."}
+
+Workers that crash are restarted on the next request, and workers idle for WORKER_IDLE_TIMEOUT seconds
+are stopped. Try it without any formatter installed:
+
+    python formatter_pool.py --formatter stub --requests 50
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+# Seconds a request may take before its worker is considered hung, and before an unused worker is stopped
+WORKER_REQUEST_TIMEOUT = 30
+WORKER_IDLE_TIMEOUT = 300
+# Seconds between checks of a request's cancellation flag while it waits for its worker
+WORKER_CANCEL_POLL_INTERVAL = 0.05
+REAPER_INTERVAL = 30
+WORKER_SHUTDOWN_TIMEOUT = 2
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+PYTHON_WORKER = os.path.join(_HERE, "formatter_worker.py")
+NODE_WORKER = os.path.join(_HERE, "formatter_worker.js")
+
+
+class WorkerError(Exception):
+    """The worker process died, hung or could not be started; the request may be retried elsewhere."""
+
+
+class FormatterError(Exception):
+    """The formatter itself rejected the code (syntax error, bad options, ...)."""
+
+
+class RequestCancelled(Exception):
+    """The request's ``cancelled`` flag was set; the worker that was running it has been killed."""
+
+
+def write_frame(stream, message):
+    """Writes one length-prefixed JSON message and flushes the stream."""
+    data = json.dumps(message).encode('utf-8')
+    stream.write(FRAME_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+def _read_exact(stream, size):
+    chunks, remaining = [], size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+def read_frame(stream):
+    """Reads one length-prefixed JSON message; returns None at end of stream."""
+    header = _read_exact(stream, FRAME_HEADER.size)
+    if header is None:
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {size} bytes exceeds MAX_FRAME_SIZE")
+    data = _read_exact(stream, size)
+    if data is None:
+        return None
+    return json.loads(data.decode('utf-8'))
+
+
+def _find_package_dir(executable, package_name):
+    """Returns the directory of the npm package whose bin script ``executable`` resolves to, or None."""
+    path = shutil.which(executable)
+    if not path:
+        return None
+    directory = os.path.dirname(os.path.realpath(path))
+    while True:
+        manifest = os.path.join(directory, "package.json")
+        if os.path.isfile(manifest):
+            try:
+                with open(manifest, 'r', encoding='utf-8') as f:
+                    if json.load(f).get('name') == package_name:
+                        return directory
+            except (OSError, ValueError):
+                pass
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+def _prettier_worker_command():
+    node = shutil.which("node")
+    package_dir = _find_package_dir("prettier", "prettier")
+    if not node or not package_dir:
+        return None
+    return [node, NODE_WORKER, package_dir]
+
+def _python_worker_command(backend):
+    return [sys.executable, PYTHON_WORKER, backend]
+
+# Formatter name -> function returning the worker command line, or None if the worker cannot run here
+WORKER_COMMANDS = {
+    "prettier": _prettier_worker_command,
+    "stub": lambda: _python_worker_command("stub"),
+}
+
+
+class FormatterWorker:
+    """One worker process. A reader thread turns its stdout into a queue of response frames."""
+
+    def __init__(self, name, command):
+        self.name = name
+        self.command = command
+        self.next_id = 1
+        self.last_used = time.monotonic()
+        self.responses = queue.Queue()
+        try:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        except OSError as e:
+            raise WorkerError(f"Could not start {name} worker: {e}") from e
+        self._reader = threading.Thread(target=self._read_responses, name=f"{name}-worker-reader", daemon=True)
+        self._reader.start()
+        logger.info(f"Started {name} worker (pid {self.process.pid}).")
+
+    def _read_responses(self):
+        try:
+            while True:
+                message = read_frame(self.process.stdout)
+                if message is None: break
+                self.responses.put(message)
+        except (OSError, ValueError) as e:
+            logger.error(f"{self.name} worker sent an unreadable frame: {e}")
+        self.responses.put(None)
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def request(self, message, timeout=WORKER_REQUEST_TIMEOUT, cancelled=None):
+        """
+        Sends ``message`` and returns the worker's response; raises WorkerError if the worker dies or hangs.
+        If the ``cancelled`` event is set meanwhile, kills the worker (the only way to stop a formatter in the
+        middle of a file) and raises RequestCancelled.
+        """
+        request_id = self.next_id
+        self.next_id += 1
+        self.last_used = time.monotonic()
+        try:
+            write_frame(self.process.stdin, dict(message, id=request_id))
+        except (OSError, ValueError) as e:
+            raise WorkerError(f"{self.name} worker is gone: {e}") from e
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                response = self.responses.get(timeout=min(max(deadline - time.monotonic(), 0), WORKER_CANCEL_POLL_INTERVAL))
+            except queue.Empty:
+                if cancelled is not None and cancelled.is_set():
+                    self.stop(force=True)
+                    raise RequestCancelled(f"{self.name} request cancelled")
+                if time.monotonic() < deadline: continue
+                self.stop(force=True)
+                raise WorkerError(f"{self.name} worker did not answer within {timeout}s")
+            if response is None:
+                raise WorkerError(f"{self.name} worker exited with code {self.process.wait()}")
+            # Answers to requests that timed out earlier are dropped
+            if response.get('id') == request_id:
+                self.last_used = time.monotonic()
+                return response
+
+    def stop(self, force=False):
+        """Closes the worker's stdin (it exits at end of input), killing it if it does not exit in time."""
+        try:
+            if not force: self.process.stdin.close()
+            self.process.wait(timeout=0 if force else WORKER_SHUTDOWN_TIMEOUT)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        logger.info(f"Stopped {self.name} worker (pid {self.process.pid}).")
+
+
+class FormatterPool:
+    """
+    Keeps one warm worker per formatter. Requests to the same formatter are serialized; a worker that has
+    crashed is replaced and the request retried once. Cancelling a request kills its worker, which is
+    restarted by the next request.
+    """
+
+    def __init__(self, idle_timeout=WORKER_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.workers = {}
+        self._commands = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._reaper = None
+        atexit.register(self.shutdown)
+
+    def supports(self, formatter):
+        """True if ``formatter`` has a worker implementation and its runtime is installed."""
+        if formatter not in self._commands:
+            factory = WORKER_COMMANDS.get(formatter)
+            self._commands[formatter] = factory() if factory else None
+        return self._commands[formatter] is not None
+
+    def format(self, formatter, code, filepath=None, options=None, timeout=WORKER_REQUEST_TIMEOUT, cancelled=None):
+        """
+        Formats ``code`` with a warm worker and returns the result; raises FormatterError or WorkerError, or
+        RequestCancelled once the ``cancelled`` event (a threading.Event) is set.
+        """
+        if not self.supports(formatter):
+            raise WorkerError(f"No worker available for {formatter}")
+        message = {'code': code, 'filepath': filepath, 'options': options or {}}
+        with self._formatter_lock(formatter):
+            for attempt in (1, 2):
+                # Waiting for the lock may have taken a while
+                if cancelled is not None and cancelled.is_set():
+                    raise RequestCancelled(f"{formatter} request cancelled")
+                worker = self._get_worker(formatter)
+                try:
+                    response = worker.request(message, timeout, cancelled)
+                    break
+                except WorkerError as e:
+                    with self._lock:
+                        if self.workers.get(formatter) is worker: del self.workers[formatter]
+                    if attempt == 2: raise
+                    logger.warning(f"{e}; restarting the worker.")
+        if not response.get('ok'):
+            raise FormatterError(response.get('error') or "Unknown error")
+        return response.get('output', '')
+
+    def _formatter_lock(self, formatter):
+        with self._lock:
+            return self._locks.setdefault(formatter, threading.Lock())
+
+    def _get_worker(self, formatter):
+        with self._lock:
+            worker = self.workers.get(formatter)
+            if worker is not None and worker.alive():
+                return worker
+        worker = FormatterWorker(formatter, self._commands[formatter])
+        with self._lock:
+            self.workers[formatter] = worker
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, name="formatter-pool-reaper", daemon=True)
+                self._reaper.start()
+        return worker
+
+    def _reap_loop(self):
+        while not self._stopped.wait(REAPER_INTERVAL):
+            self.reap_idle()
+
+    def reap_idle(self):
+        """Stops workers that have not been used for ``idle_timeout`` seconds (or have died)."""
+        now = time.monotonic()
+        for formatter in list(self.workers):
+            lock = self._formatter_lock(formatter)
+            # A worker in the middle of a request is not idle
+            if not lock.acquire(blocking=False): continue
+            try:
+                with self._lock:
+                    worker = self.workers.get(formatter)
+                    if worker is None or (worker.alive() and now - worker.last_used < self.idle_timeout):
+                        continue
+                    del self.workers[formatter]
+                worker.stop()
+            finally:
+                lock.release()
+
+    def shutdown(self):
+        """Stops every worker."""
+        self._stopped.set()
+        with self._lock:
+            workers, self.workers = list(self.workers.values()), {}
+        for worker in workers:
+            worker.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure formatter worker latency.")
+    parser.add_argument("--formatter", default="stub", choices=sorted(WORKER_COMMANDS))
+    parser.add_argument("--file", help="File to format (default: a small generated snippet)")
+    parser.add_argument("--requests", type=int, default=20, help="Number of format requests")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            code = f.read()
+        filepath = os.path.basename(args.file)
+    else:
+        code, filepath = "def f( x ):\n  return x*2\n" * 50, "temp.py"
+    pool = FormatterPool()
+    if not pool.supports(args.formatter):
+        logger.error(f"{args.formatter} is not installed.")
+        return 1
+    latencies = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        pool.format(args.formatter, code, filepath)
+        latencies.append((time.perf_counter() - start) * 1000)
+    warm = sorted(latencies[1:]) or latencies
+    logger.info(f"{args.formatter}: first request {latencies[0]:.1f} ms, warm median {warm[len(warm) // 2]:.1f} ms, "
+                f"warm max {warm[-1]:.1f} ms")
+    pool.shutdown()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+// Prettier worker process for formatter_pool.py: loads prettier once, then answers framed JSON requests
+// (4-byte big-endian length prefix) on stdin until stdin is closed.
+//
+//     node formatter_worker.js /path/to/node_modules/prettier
+
+const prettier = require(process.argv[2] || "prettier");
+
+let buffered = Buffer.alloc(0);
+let pending = Promise.resolve();
+
+function writeFrame(message) {
+  const data = Buffer.from(JSON.stringify(message), "utf8");
+  const header = Buffer.alloc(4);
+  header.writeUInt32BE(data.length, 0);
+  process.stdout.write(Buffer.concat([header, data]));
+}
+
+// The project's .prettierrc and .editorconfig for ``filepath``, as `prettier --stdin-filepath` applies them.
+// Not cached, so edits to the config take effect without restarting the worker.
+async function projectConfig(filepath) {
+  if (!filepath || !prettier.resolveConfig) return null;
+  return prettier.resolveConfig(filepath, { editorconfig: true, useCache: false });
+}
+
+async function handle(request) {
+  try {
+    const config = await projectConfig(request.filepath);
+    // Options of the request (such as a range) take precedence over the config, like command line flags
+    const options = Object.assign({}, config, request.options, { filepath: request.filepath || undefined });
+    // prettier 3 returns a promise, prettier 2 the formatted string
+    const output = await prettier.format(request.code, options);
+    writeFrame({ id: request.id, ok: true, output });
+  } catch (error) {
+    writeFrame({ id: request.id, ok: false, error: String(error && error.message ? error.message : error) });
+  }
+}
+
+process.stdin.on("data", (chunk) => {
+  buffered = Buffer.concat([buffered, chunk]);
+  while (buffered.length >= 4) {
+    const size = buffered.readUInt32BE(0);
+    if (buffered.length < 4 + size) break;
+    const request = JSON.parse(buffered.subarray(4, 4 + size).toString("utf8"));
+    buffered = buffered.subarray(4 + size);
+    // Requests are answered in order
+    pending = pending.then(() => handle(request));
+  }
+});
+
+process.stdin.on("end", () => {
+  pending.then(() => process.exit(0));
+});
@@ -0,0 +1,48 @@
+"""
+Python formatter worker process for formatter_pool: sets up its backend once, then answers framed JSON
+requests on stdin until stdin is closed. The Python formatters run in-process (inprocess_formatters.py),
+so the only backend is a stub returning the code unchanged (after ``options['delay']`` seconds, to test
+timeouts and cancellation), for testing the pool. Usage:
+
+    python formatter_worker.py stub
+"""
+import sys
+import time
+
+from formatter_pool import read_frame, write_frame
+
+
+def _stub_backend():
+    def format_code(code, filepath, options):
+        time.sleep((options or {}).get('delay', 0))
+        return code
+    return format_code
+
+BACKENDS = {
+    "stub": _stub_backend,
+}
+
+def serve(format_code, stdin, stdout):
+    """Answers requests until end of input."""
+    while True:
+        request = read_frame(stdin)
+        if request is None:
+            return
+        try:
+            output = format_code(request['code'], request.get('filepath'), request.get('options'))
+            response = {'id': request.get('id'), 'ok': True, 'output': output}
+        except Exception as e:
+            response = {'id': request.get('id'), 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        write_frame(stdout, response)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1 or argv[0] not in BACKENDS:
+        sys.stderr.write(f"usage: formatter_worker.py {{{','.join(BACKENDS)}}}\n")
+        return 2
+    format_code = BACKENDS[argv[0]]()
+    serve(format_code, sys.stdin.buffer, sys.stdout.buffer)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
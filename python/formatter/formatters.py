@@ -0,0 +1,212 @@
+"""
+Which formatter handles which language, and how to run it.
+
+Shared by the editor (main.py) and the headless batch_format.py; nothing here imports Tk.
+"""
+import concurrent.futures
+import fnmatch
+import functools
+import logging
+import subprocess
+
+from pygments.lexers import get_all_lexers
+
+import inprocess_formatters
+from background_jobs import JobCancelled
+from formatter_pool import WORKER_CANCEL_POLL_INTERVAL, FormatterError, RequestCancelled, WorkerError
+
+logger = logging.getLogger(__name__)
+
+# Lowercased Pygments lexer name (or alias) -> formatter
+SUPPORTED_FORMATTERS = {
+    "python": "autopep8",
+    "javascript": "prettier",
+    "typescript": "prettier",
+    "html": "prettier",
+    "css": "prettier",
+    "json": "prettier",
+    "xml": "xmllint",
+    "c": "clang-format",
+    "cpp": "clang-format",
+    "java": "clang-format",
+    "go": "gofmt",
+    "ruby": "rufo",
+    "php": "php-cs-fixer",
+    "rust": "rustfmt",
+    "sh": "shfmt",
+    "markdown": "prettier",
+    "yaml": "prettier",
+    "dockerfile": "hadolint",
+    "perl": "perltidy",
+    "lua": "luafmt"
+}
+
+FORMATTER_COMMANDS = {
+    "autopep8": ["autopep8", "-"],
+    "prettier": ["prettier", "--stdin-filepath", "temp.{ext}"],
+    "xmllint": ["xmllint", "--format", "-"],
+    "clang-format": ["clang-format"],
+    "gofmt": ["gofmt"],
+    "rufo": ["rufo", "-"],
+    "rustfmt": ["rustfmt"],
+    "shfmt": ["shfmt"],
+}
+
+# Formatters that run in-process (imported once, see inprocess_formatters.py) when their module can be
+# imported, and through FORMATTER_COMMANDS otherwise.
+IN_PROCESS_FORMATTERS = ("autopep8",)
+
+# Language -> file extension prettier infers its parser from
+PRETTIER_EXTENSIONS = {
+    "javascript": "js",
+    "typescript": "ts",
+    "html": "html",
+    "css": "css",
+    "json": "json",
+    "markdown": "md",
+    "yaml": "yaml"
+}
+
+# Formatters that can be restricted to line ranges. prettier and autopep8 take a single range, so they get
+# the span covering all of them.
+RANGE_FORMATTERS = ("clang-format", "prettier", "autopep8")
+
+
+def language_for_lexer(lexer):
+    """Key of SUPPORTED_FORMATTERS for a Pygments lexer (matched by name, then aliases), or None."""
+    for name in (lexer.name.lower(), *getattr(lexer, 'aliases', ())):
+        if name in SUPPORTED_FORMATTERS:
+            return name
+    return None
+
+@functools.lru_cache(maxsize=None)
+def _extension_index():
+    """
+    Built once from the Pygments lexer table: ({exact file name or extension: languages},
+    [(other glob pattern, language)]) for the languages in SUPPORTED_FORMATTERS.
+    """
+    names, patterns = {}, []
+    for name, aliases, filenames, _mimetypes in get_all_lexers():
+        language = next((alias for alias in (name.lower(), *aliases) if alias in SUPPORTED_FORMATTERS), None)
+        if language is None: continue
+        for pattern in filenames:
+            if pattern.startswith("*.") and not any(c in pattern[2:] for c in "*?[."):
+                key = pattern[1:]
+            elif not any(c in pattern for c in "*?["):
+                key = pattern
+            else:
+                patterns.append((pattern, language))
+                continue
+            if language not in names.setdefault(key, ()):
+                names[key] += (language,)
+    return names, patterns
+
+def languages_for_filename(filename):
+    """
+    Languages whose lexers claim ``filename``, from the extension index (no file access): empty if none has a
+    formatter, several if the extension is ambiguous (e.g. .xslt) and the content has to decide.
+    """
+    names, patterns = _extension_index()
+    if filename in names:
+        return names[filename]
+    _stem, dot, extension = filename.rpartition('.')
+    if dot and '.' + extension in names:
+        return names['.' + extension]
+    return tuple(dict.fromkeys(language for pattern, language in patterns if fnmatch.fnmatchcase(filename, pattern)))
+
+def formatter_command(formatter, language):
+    """Command line that formats ``language`` code read from stdin with ``formatter``."""
+    if formatter == "prettier":
+        ext = PRETTIER_EXTENSIONS.get(language, "txt")
+        return ["prettier", "--stdin-filepath", f"temp.{ext}"]
+    return FORMATTER_COMMANDS.get(formatter, [formatter])
+
+def _utf16_length(text):
+    return len(text.encode('utf-16-le')) // 2
+
+def range_formatter_command(formatter, language, code, line_ranges):
+    """
+    (command line, worker/in-process options) that format only ``line_ranges`` of ``code``: sorted 1-based
+    inclusive (first, last) line numbers.
+    """
+    cmd = formatter_command(formatter, language)
+    first, last = line_ranges[0][0], line_ranges[-1][1]
+    if formatter == "clang-format":
+        args, options = [f"--lines={a}:{b}" for a, b in line_ranges], {}
+    elif formatter == "autopep8":
+        args, options = ["--line-range", str(first), str(last)], {'line_range': [first, last]}
+    elif formatter == "prettier":
+        # Line numbers are the editor's: only '\n' ends a line (str.splitlines also splits at form feeds etc.)
+        lines = [line + '\n' for line in code.split('\n')]
+        # Offsets in UTF-16 code units, as JavaScript counts them
+        start = _utf16_length("".join(lines[:first - 1]))
+        end = min(start + _utf16_length("".join(lines[first - 1:last])), _utf16_length(code))
+        args, options = ["--range-start", str(start), "--range-end", str(end)], {'rangeStart': start, 'rangeEnd': end}
+    else:
+        raise ValueError(f"{formatter} cannot format line ranges")
+    # Options go before the "-" that stands for stdin
+    if cmd[-1] == "-":
+        return cmd[:-1] + args + ["-"], options
+    return cmd + args, options
+
+def runs_in_process(formatter):
+    return formatter in IN_PROCESS_FORMATTERS and inprocess_formatters.is_available(formatter)
+
+def _wait_in_process(future, job):
+    """
+    Result of an in-process run. A thread cannot be interrupted, so cancelling ``job`` only drops the run if
+    it has not started yet; otherwise it finishes unobserved while the job stops waiting for it.
+    """
+    while True:
+        try:
+            return future.result(timeout=WORKER_CANCEL_POLL_INTERVAL)
+        except concurrent.futures.TimeoutError:
+            if job.cancelled.is_set():
+                future.cancel()
+                raise JobCancelled()
+
+def run_formatter(formatter, cmd, code, in_process, pool=None, job=None, options=None):
+    """
+    Formats ``code`` with the fastest backend available: in-process, a warm worker from ``pool`` (both given
+    ``options``), or ``cmd`` as a subprocess. Cancelling ``job`` kills the worker or subprocess and raises
+    JobCancelled (see _wait_in_process for in-process runs). Raises Exception with the formatter's message on
+    failure.
+    """
+    if in_process:
+        future = inprocess_formatters.format_code(formatter, code, options)
+        try:
+            return _wait_in_process(future, job) if job is not None else future.result()
+        except JobCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Formatter error: {e}")
+            raise Exception(f"{formatter}: {e}")
+
+    if pool is not None and pool.supports(formatter):
+        try:
+            filepath = cmd[2] if formatter == "prettier" else None
+            return pool.format(formatter, code, filepath, options, cancelled=job.cancelled if job is not None else None)
+        except RequestCancelled:
+            raise JobCancelled()
+        except FormatterError as e:
+            logger.error(f"Formatter error: {e}")
+            raise Exception(str(e))
+        except WorkerError as e:
+            logger.warning(f"Formatter worker failed, running {formatter} directly: {e}")
+
+    if job is not None:
+        process = job.run_process(cmd, code)
+    else:
+        process = subprocess.run(
+            cmd,
+            input=code,
+            capture_output=True,
+            text=True
+        )
+
+    if process.returncode != 0:
+        error_msg = process.stderr or "Unknown error"
+        logger.error(f"Formatter error: {error_msg}")
+        raise Exception(error_msg)
+
+    return process.stdout
@@ -0,0 +1,69 @@
+"""
+In-process backends for Python formatters.
+
+autopep8 is imported once and called as a library on a dedicated worker thread, instead of starting an
+interpreter (and importing the formatter again) for every format.
+"""
+import importlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def _autopep8_format(module, code, options):
+    return module.fix_code(code, options=options or None)
+
+# Formatter name -> (module to import, function(module, code, options) returning the formatted code)
+IN_PROCESS_FORMATTERS = {
+    "autopep8": ("autopep8", _autopep8_format),
+}
+
+# Formatter name -> imported module, or None if the import failed
+_MODULES = {}
+_IMPORT_LOCK = threading.Lock()
+# One thread: the formatters are CPU bound, and keeping them off the Tk thread is what matters
+_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="in-process-formatter")
+
+
+def load_backend(formatter):
+    """Imports the formatter's module on first use; returns it, or None if it is not installed."""
+    if formatter not in IN_PROCESS_FORMATTERS:
+        return None
+    with _IMPORT_LOCK:
+        if formatter not in _MODULES:
+            module_name = IN_PROCESS_FORMATTERS[formatter][0]
+            try:
+                _MODULES[formatter] = importlib.import_module(module_name)
+                logger.info(f"Loaded {module_name} for in-process formatting.")
+            except Exception as e:
+                _MODULES[formatter] = None
+                logger.info(f"{module_name} cannot be imported ({e}); {formatter} will run as a subprocess.")
+        return _MODULES[formatter]
+
+def is_available(formatter):
+    return load_backend(formatter) is not None
+
+def identity(formatter):
+    """(formatter, module file, module version) of the in-process backend, or None if it is not installed."""
+    module = load_backend(formatter)
+    if module is None:
+        return None
+    return formatter, getattr(module, '__file__', None), getattr(module, '__version__', None)
+
+def preload(formatters):
+    """Imports the given formatters' modules on the worker thread, so the first format does not wait for them."""
+    for formatter in formatters:
+        if formatter in IN_PROCESS_FORMATTERS:
+            _EXECUTOR.submit(load_backend, formatter)
+
+def _format(formatter, code, options):
+    module = load_backend(formatter)
+    if module is None:
+        raise ImportError(f"{formatter} is not installed")
+    return IN_PROCESS_FORMATTERS[formatter][1](module, code, options)
+
+def format_code(formatter, code, options=None):
+    """Formats ``code`` on the worker thread; returns a Future of the formatted code."""
+    return _EXECUTOR.submit(_format, formatter, code, options)
@@ -0,0 +1,255 @@
+"""
+Read-only viewer for files too large to insert into a Text widget.
+
+The file is memory-mapped and a worker thread records the byte offset of every line start. Only a
+window of WINDOW_LINES lines is decoded and inserted into the widget; the window moves as the view
+approaches its edges, and the scrollbar is driven with positions in the whole file.
+"""
+import logging
+import mmap
+import threading
+from array import array
+from itertools import accumulate
+
+import tkinter as tk
+
+logger = logging.getLogger(__name__)
+
+# Lines materialized in the widget at a time, and how close (in lines) the view may get to a window
+# edge before the window is moved to centre on it again.
+WINDOW_LINES = 3000
+WINDOW_MARGIN_LINES = 500
+# Bytes scanned per step by the line index worker
+INDEX_BLOCK_SIZE = 16 * 1024 * 1024
+INDEX_POLL_MS = 100
+
+
+class LineIndex:
+    """
+    Byte offsets of the line starts of a memory-mapped file, built on a worker thread.
+    Lines become available in order while the index is built; ``done`` is set once the whole file is indexed.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+        self.offsets = array('Q', [0])
+        self.indexed_bytes = 0
+        self.done = False
+        self.error = None
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._build, name="large-file-index", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        """Stops the worker and waits for it, so the mapping can be closed safely."""
+        self._cancelled = True
+        if self._thread.is_alive(): self._thread.join()
+
+    def _build(self):
+        pos = 0
+        try:
+            while pos < self.size and not self._cancelled:
+                block = self.data[pos:pos + INDEX_BLOCK_SIZE]
+                cut = block.rfind(b'\n') + 1
+                if not cut:
+                    # No line break in this block: the current line goes on
+                    pos += len(block)
+                else:
+                    # Each line of the block is one byte longer than its split part (the '\n')
+                    starts = accumulate((len(part) + 1 for part in block[:cut].split(b'\n')[:-1]), initial=pos)
+                    next(starts)
+                    line_starts = array('Q', starts)
+                    pos += cut
+                    with self._lock:
+                        self.offsets.extend(line_starts)
+                with self._lock:
+                    self.indexed_bytes = pos
+        except (ValueError, OSError) as e:
+            # The mapping was closed under us or the file shrank
+            self.error = e
+            if not self._cancelled: logger.error(f"Line index failed at byte {pos}: {e}")
+        finally:
+            with self._lock:
+                self.indexed_bytes = max(self.indexed_bytes, pos)
+            self.done = True
+        logger.debug(f"Indexed {len(self.offsets)} lines ({pos} bytes).")
+
+    @property
+    def line_count(self):
+        """Complete lines indexed so far; a final line break does not start another line."""
+        with self._lock:
+            count = len(self.offsets)
+            if not self.done: return count - 1
+            if count > 1 and self.offsets[-1] >= self.size: count -= 1
+            return count
+
+    def estimated_line_count(self):
+        """Total line count, extrapolated from the indexed part while the index is still being built."""
+        if self.done:
+            return self.line_count
+        with self._lock:
+            count, indexed = len(self.offsets), self.indexed_bytes
+        if not indexed:
+            return max(count, 1)
+        return max(count, int(count * self.size / indexed))
+
+    def byte_range(self, first_line, last_line):
+        """Returns (start, end) byte offsets of lines ``first_line`` to ``last_line`` (0-based, end exclusive)."""
+        with self._lock:
+            known = len(self.offsets)
+            start = self.offsets[min(first_line, known - 1)]
+            end = self.offsets[last_line] if last_line < known else self.size
+        return start, end
+
+
+class LargeFileViewer:
+    """
+    Shows a memory-mapped file in a Text widget, WINDOW_LINES at a time.
+    The widget is read-only while the viewer is open. ``scrollbar`` (whose command is normally the widget's
+    yview) is redirected to the viewer, so dragging it moves through the whole file. ``on_progress`` is
+    called with (lines indexed, fraction of the file indexed, done) while the line index is built.
+    """
+
+    def __init__(self, text_widget, scrollbar=None, on_progress=None, encoding='utf-8'):
+        self.text_widget = text_widget
+        self.scrollbar = scrollbar
+        self.on_progress = on_progress
+        self.encoding = encoding
+        self.file = None
+        self.data = None
+        self.index = None
+        self.window_start = 0
+        self.window_end = 0
+        self._scroll_command = None
+        self._scrollbar_command = None
+        self._shift_pending = False
+        self._poll_job = None
+
+    def open(self, path):
+        """Maps ``path``, starts indexing it and shows its first lines as soon as they are indexed."""
+        self.close()
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            self.file.close()
+            self.file = None
+            raise
+        self.index = LineIndex(self.data)
+        self.index.start()
+
+        widget = self.text_widget
+        self._scroll_command = widget.cget("yscrollcommand")
+        widget.configure(yscrollcommand=self._on_yscroll)
+        if self.scrollbar is not None:
+            self._scrollbar_command = self.scrollbar.cget("command")
+            self.scrollbar.configure(command=self.yview)
+        self.window_start = self.window_end = 0
+        self._poll_index()
+        logger.info(f"Opened {path} in large file mode ({self.index.size} bytes).")
+
+    def close(self):
+        """Stops indexing, unmaps the file and gives the widget (editable and empty) back."""
+        if self.index is None: return
+        if self._poll_job is not None:
+            self.text_widget.after_cancel(self._poll_job)
+            self._poll_job = None
+        self.index.cancel()
+        self.data.close()
+        self.file.close()
+        self.index = self.data = self.file = None
+
+        widget = self.text_widget
+        widget.configure(yscrollcommand=self._scroll_command, state=tk.NORMAL)
+        if self.scrollbar is not None:
+            self.scrollbar.configure(command=self._scrollbar_command)
+        widget.delete("1.0", tk.END)
+
+    def _poll_index(self):
+        """Shows the first window once enough lines are indexed and reports indexing progress."""
+        self._poll_job = None
+        index = self.index
+        if index is None: return
+        line_count = index.line_count
+        if self.window_end - self.window_start < WINDOW_LINES and line_count > self.window_end:
+            self.load_window(self.window_start, self.first_visible_line())
+        else:
+            self._update_scrollbar()
+        if self.on_progress:
+            self.on_progress(line_count, index.indexed_bytes / index.size if index.size else 1.0, index.done)
+        if not index.done:
+            self._poll_job = self.text_widget.after(INDEX_POLL_MS, self._poll_index)
+
+    def load_window(self, first_line, top_line=None):
+        """Materializes WINDOW_LINES lines from ``first_line`` (0-based) and scrolls ``top_line`` (default ``first_line``) to the top."""
+        line_count = self.index.line_count
+        first_line = max(0, min(first_line, line_count - WINDOW_LINES))
+        last_line = min(first_line + WINDOW_LINES, line_count)
+        start, end = self.index.byte_range(first_line, last_line)
+        text = self.data[start:end].decode(self.encoding, errors='replace').replace('\r\n', '\n')
+        if text.endswith('\n'): text = text[:-1]
+
+        widget = self.text_widget
+        widget.configure(state=tk.NORMAL)
+        widget.delete("1.0", tk.END)
+        widget.insert("1.0", text)
+        widget.edit_reset()
+        widget.configure(state=tk.DISABLED)
+        self.window_start, self.window_end = first_line, last_line
+        if top_line is None: top_line = first_line
+        widget.yview_moveto((top_line - first_line) / max(last_line - first_line, 1))
+        logger.debug(f"Large file window moved to lines {first_line + 1}-{last_line}.")
+
+    def first_visible_line(self):
+        """0-based file line shown at the top of the widget."""
+        return self.window_start + int(self.text_widget.index("@0,0").split('.')[0]) - 1
+
+    def yview(self, *args):
+        """Scrollbar command: "moveto" positions are fractions of the whole file, "scroll" moves within the window."""
+        if not args or self.index is None: return
+        if args[0] == 'moveto':
+            line_count = self.index.line_count
+            visible = self._visible_line_count()
+            target = min(int(float(args[1]) * self.index.estimated_line_count()), max(line_count - visible, 0))
+            if self.window_start <= target and target + visible <= self.window_end:
+                self.text_widget.yview_moveto((target - self.window_start) / max(self.window_end - self.window_start, 1))
+            else:
+                self.load_window(target - WINDOW_LINES // 2, target)
+        else:
+            self.text_widget.yview(*args)
+
+    def _visible_line_count(self):
+        widget = self.text_widget
+        return int(widget.index(f"@0,{widget.winfo_height()}").split('.')[0]) - int(widget.index("@0,0").split('.')[0]) + 1
+
+    def _on_yscroll(self, first, last):
+        self._update_scrollbar(float(first), float(last))
+        if not self._shift_pending and self.index is not None:
+            self._shift_pending = True
+            self.text_widget.after_idle(self._shift_window_if_needed)
+
+    def _update_scrollbar(self, first=None, last=None):
+        """Reports the visible part of the whole file to the original yscrollcommand."""
+        if not self._scroll_command or self.index is None: return
+        if first is None: first, last = self.text_widget.yview()
+        window_lines = max(self.window_end - self.window_start, 1)
+        total = max(self.index.estimated_line_count(), 1)
+        global_first = (self.window_start + first * window_lines) / total
+        global_last = (self.window_start + last * window_lines) / total
+        widget = self.text_widget
+        widget.tk.call(*widget.tk.splitlist(self._scroll_command), min(global_first, 1.0), min(global_last, 1.0))
+
+    def _shift_window_if_needed(self):
+        """Re-centres the window on the view when it gets within WINDOW_MARGIN_LINES of an edge that is not the file's."""
+        self._shift_pending = False
+        if self.index is None: return
+        top = self.first_visible_line()
+        bottom = top + self._visible_line_count()
+        near_start = top - self.window_start < WINDOW_MARGIN_LINES and self.window_start > 0
+        near_end = self.window_end - bottom < WINDOW_MARGIN_LINES and self.window_end < self.index.line_count
+        if near_start or near_end:
+            self.load_window(top - WINDOW_LINES // 2, top)
@@ -1,14 +1,55 @@
+import time
+# Taken before the heavy imports below, so --startup-profile can report them
+_PROCESS_START = time.perf_counter()
+import argparse
+import cProfile
 import os
+import pstats
 import re
 import logging
 import sys
 import json
-import subprocess
 import io
+import batch_format
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Ultimate Code Formatter")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="Log how long each startup phase took, with a cProfile summary of the window setup")
+    headless = parser.add_mutually_exclusive_group()
+    headless.add_argument("--format", metavar="DIRECTORY", help="Format every supported file in DIRECTORY without the GUI")
+    headless.add_argument("--check", metavar="DIRECTORY",
+                          help="Report files in DIRECTORY that need formatting without the GUI (exit code 1 if any)")
+    batch_format.add_arguments(parser)
+    args = parser.parse_args()
+    directory = args.format or args.check
+    if directory and not os.path.isdir(directory):
+        parser.error(f"not a directory: {directory}")
+    return args
+
+# Headless runs are dispatched before the GUI toolkit is imported, so CI needs neither it nor a display
+if __name__ == '__main__':
+    _ARGS = parse_arguments()
+    if _ARGS.format or _ARGS.check:
+        directory = _ARGS.format or _ARGS.check
+        _ARGS.check = bool(_ARGS.check)
+        sys.exit(batch_format.run(directory, _ARGS))
+
 import customtkinter as ctk
-from tkinter import filedialog, messagebox, simpledialog, TclError, font as tkfont
+from tkinter import filedialog, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD
-from syntax_highlighter import get_lexer, configure_tags, highlight_line, get_all_styles
+from syntax_highlighter import get_lexer, configure_tags, get_style_names, DocumentHighlighter
+from diff_view import DiffView, diff_lines
+from large_file_viewer import LargeFileViewer
+from formatter_pool import FormatterPool
+import inprocess_formatters
+from tool_detection import ToolRegistry
+from background_jobs import JobRunner
+from format_cache import FormatCache, cache_key
+from formatters import (SUPPORTED_FORMATTERS, IN_PROCESS_FORMATTERS, RANGE_FORMATTERS, language_for_lexer,
+                        formatter_command, range_formatter_command, runs_in_process, run_formatter)
+from edit_tracker import ChangedLines
 
 # --- Global Logging Setup ---
 logging.basicConfig(
@@ -22,55 +63,85 @@ logger = logging.getLogger(__name__)
 HISTORY_FILE = os.path.expanduser("~/.code_formatter_history.json")
 MAX_HISTORY = 10
 
-SUPPORTED_FORMATTERS = {
-    "python": "autopep8",
-    "javascript": "prettier",
-    "typescript": "prettier",
-    "html": "prettier",
-    "css": "prettier",
-    "json": "prettier",
-    "xml": "xmllint",
-    "c": "clang-format",
-    "cpp": "clang-format",
-    "java": "clang-format",
-    "go": "gofmt",
-    "ruby": "rufo",
-    "php": "php-cs-fixer",
-    "rust": "rustfmt",
-    "sh": "shfmt",
-    "markdown": "prettier",
-    "yaml": "prettier",
-    "dockerfile": "hadolint",
-    "perl": "perltidy",
-    "lua": "luafmt"
-}
-
-FORMATTER_COMMANDS = {
-    "autopep8": ["autopep8", "-"],
-    "prettier": ["prettier", "--stdin-filepath", "temp.{ext}"],
-    "xmllint": ["xmllint", "--format", "-"],
-    "clang-format": ["clang-format"],
-    "gofmt": ["gofmt"],
-    "rufo": ["rufo", "-"],
-    "rustfmt": ["rustfmt"],
-    "shfmt": ["shfmt"],
-}
+# Documents with more lines than this are tokenized on a worker thread
+BACKGROUND_HIGHLIGHT_THRESHOLD_LINES = 2000
+# Documents with more lines than this are highlighted lazily (visible lines only)
+LAZY_HIGHLIGHT_THRESHOLD_LINES = 20000
+# Files larger than this open read-only in the memory-mapped large file viewer
+LARGE_FILE_THRESHOLD_BYTES = 64 * 1024 * 1024
+# One merged syntax tag per token range instead of one tag per token type ancestor
+MERGE_INHERITED_TAGS = True
+# Functions listed in the --startup-profile report
+STARTUP_PROFILE_TOP_FUNCTIONS = 25
+# Formatter output with more changed hunks than this replaces the whole buffer instead of being applied
+# hunk by hunk: each hunk costs about 2 ms of re-highlighting (Python), so past a few hundred hunks
+# highlighting the new text once is cheaper
+MINIMAL_EDIT_MAX_HUNKS = 300
+
+
+class StartupProfile:
+    """Startup phase timings (and optionally a cProfile run) reported once the window is ready."""
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.phases = [("start", _PROCESS_START)]
+        self.mark("imports")
+
+    def mark(self, phase):
+        """Records the end of ``phase``."""
+        self.phases.append((phase, time.perf_counter()))
+
+    def report(self):
+        if self.profiler: self.profiler.disable()
+        lines = ["Startup profile:"]
+        for (_previous, previous_time), (phase, phase_time) in zip(self.phases, self.phases[1:]):
+            lines.append(f"  {phase:<28} {(phase_time - previous_time) * 1000:8.1f} ms")
+        lines.append(f"  {'total':<28} {(self.phases[-1][1] - _PROCESS_START) * 1000:8.1f} ms")
+        if self.profiler:
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(STARTUP_PROFILE_TOP_FUNCTIONS)
+            lines.append(stream.getvalue())
+        logger.info("\n".join(lines))
 
 
 class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
-    def __init__(self):
+    def __init__(self, startup_profile=None):
         super().__init__()
+        self.startup_profile = startup_profile
         self.title("Ultimate Code Formatter")
         self.geometry("1600x1000")
         self.current_file_path = None
         self.current_file_modified = False
         self.file_history = []
         self.current_style = "monokai"
+        self.large_file_viewer = None
+        # Warm prettier worker processes, reused across format requests
+        self.formatter_pool = FormatterPool()
+        # Where each formatter/linter is installed, resolved once (see _finish_startup)
+        self.tools = ToolRegistry()
+        # Format and lint run off the Tk thread; a new request cancels the stale one
+        self.jobs = JobRunner(self)
+        # Formatter outputs by (formatter identity, options, input hash), shared across sessions
+        self.format_cache = FormatCache()
         self._setup_ui()
         self._load_file_history()
         self._bind_keyboard_shortcuts()
+        if self.startup_profile: self.startup_profile.mark("window setup")
+        # Style and tag setup is not needed for the first paint of an empty editor
+        self.after_idle(self._finish_startup)
         logger.info("App initialized successfully.")
 
+    def _finish_startup(self):
+        """Runs once the window has been drawn: configures the highlight tags for the current style."""
+        if self.startup_profile: self.startup_profile.mark("first paint")
+        configure_tags(self.content_widget._textbox, self.current_style, merge_inherited=MERGE_INHERITED_TAGS)
+        inprocess_formatters.preload(IN_PROCESS_FORMATTERS)
+        self.tools.detect_async(set(SUPPORTED_FORMATTERS.values()))
+        if self.startup_profile:
+            self.startup_profile.mark("style and tags")
+            self.startup_profile.report()
+            self.startup_profile = None
+
     def _setup_ui(self):
         """Setup the main UI components."""
         # Menu bar
@@ -95,6 +166,18 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
             command=self._format_code
         ).pack(side=ctk.LEFT, padx=5, pady=5)
         
+        ctk.CTkButton(
+            self.menu_bar, 
+            text="Format Changes", 
+            command=self._format_changed_lines
+        ).pack(side=ctk.LEFT, padx=5, pady=5)
+        
+        ctk.CTkButton(
+            self.menu_bar, 
+            text="Show Diff", 
+            command=self._show_format_diff
+        ).pack(side=ctk.LEFT, padx=5, pady=5)
+        
         ctk.CTkButton(
             self.menu_bar, 
             text="Lint Code", 
@@ -104,10 +187,9 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
         # Style selector
         ctk.CTkLabel(self.menu_bar, text="Theme:").pack(side=ctk.LEFT, padx=(20, 5))
         
-        available_styles = list(get_all_styles())
         self.style_selector = ctk.CTkComboBox(
             self.menu_bar,
-            values=available_styles,
+            values=list(get_style_names()),
             command=self._change_style,
             width=150
         )
@@ -125,8 +207,12 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.content_widget.pack(fill=ctk.BOTH, expand=True)
         self.content_widget.bind("<<Modified>>", self._on_text_modified)
         
-        # Configure initial syntax highlighting
-        configure_tags(self.content_widget._textbox, self.current_style)
+        # Tags are configured in _finish_startup, after the first paint
+        self.highlighter = DocumentHighlighter(self.content_widget._textbox)
+        self.highlighter.attach()
+        # Lines edited since the last save or format, for "Format Changes"
+        self.changed_lines = ChangedLines()
+        self.highlighter.edit_listeners.append(self.changed_lines.on_edit)
 
         # Status bar for real-time feedback
         self.status_bar = ctk.CTkLabel(self, text="Ready", anchor='w')
@@ -141,6 +227,7 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.bind("<Control-s>", self._save_file)
         self.bind("<Control-o>", self.load_file)
         self.bind("<Control-f>", lambda e: self._format_code())
+        self.bind("<Control-Shift-F>", lambda e: self._format_changed_lines())
         self.bind("<Control-l>", lambda e: self._lint_code())
 
     def _on_file_drop(self, event):
@@ -151,6 +238,10 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
 
     def _on_text_modified(self, event=None):
         """Track if content has been modified."""
+        if self.large_file_viewer:
+            # Window moves of the read-only viewer are not edits
+            self.content_widget.edit_modified(False)
+            return
         if self.content_widget.edit_modified():
             if not self.current_file_modified:
                 self.current_file_modified = True
@@ -196,13 +287,22 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
             if not filepath:
                 return
             
+            # Results computed for the previous buffer are of no use any more
+            self.jobs.cancel_all()
+            if os.path.getsize(filepath) > LARGE_FILE_THRESHOLD_BYTES:
+                self._open_large_file(filepath)
+                return
+            
             with open(filepath, 'r', encoding='utf-8') as f:
                 content = f.read()
             
+            self._close_large_file()
             self.current_file_path = filepath
             self.current_file_modified = False
+            self.highlighter.reset()
             self.content_widget.delete("1.0", ctk.END)
             self.content_widget.insert("1.0", content)
+            self.changed_lines.clear()
             
             # Apply syntax highlighting
             self._apply_syntax_highlighting()
@@ -219,8 +319,44 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
             self._show_toast(f"Failed to load file: {e}", status="error")
             messagebox.showerror("Error", f"Failed to load file:\n{e}")
 
+    def _open_large_file(self, filepath):
+        """Shows a file above LARGE_FILE_THRESHOLD_BYTES read-only, mapping it instead of reading it into the widget."""
+        self._close_large_file()
+        self.highlighter.reset()
+        self.content_widget.delete("1.0", ctk.END)
+        self.large_file_viewer = LargeFileViewer(
+            self.content_widget._textbox,
+            scrollbar=self.content_widget._y_scrollbar,
+            on_progress=self._on_large_file_progress
+        )
+        self.large_file_viewer.open(filepath)
+        self.changed_lines.clear()
+        self.current_file_path = filepath
+        self.current_file_modified = False
+        self._add_to_history(filepath)
+        self._update_title()
+        self._show_toast(f"Opened read-only (large file): {os.path.basename(filepath)}", status="info")
+
+    def _on_large_file_progress(self, line_count, fraction, done):
+        state = f"{line_count:,} lines" if done else f"indexing... {fraction:.0%} ({line_count:,} lines)"
+        self.status_bar.configure(text=f"{os.path.basename(self.current_file_path or '')}: {state} (read-only)")
+
+    def _close_large_file(self):
+        if self.large_file_viewer:
+            self.large_file_viewer.close()
+            self.large_file_viewer = None
+
+    def _reject_in_large_file_mode(self, action):
+        """True (after telling the user) if ``action`` is not available because a large file is open read-only."""
+        if not self.large_file_viewer:
+            return False
+        self._show_toast(f"{action} is not available for large files (read-only view)", status="warn")
+        return True
+
     def _save_file(self, event=None):
         """Save the current file."""
+        if self._reject_in_large_file_mode("Saving"):
+            return
         try:
             if not self.current_file_path:
                 filepath = filedialog.asksaveasfilename(
@@ -245,6 +381,7 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
                 f.write(content)
             
             self.current_file_modified = False
+            self.changed_lines.clear()
             self._update_title()
             self._add_to_history(self.current_file_path)
             self._show_toast(f"Saved: {os.path.basename(self.current_file_path)}", status="success")
@@ -255,105 +392,238 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
             self._show_toast(f"Failed to save file: {e}", status="error")
             messagebox.showerror("Error", f"Failed to save file:\n{e}")
 
-    def _format_code(self):
-        """Format the current code using appropriate formatter."""
+    def _resolve_formatter(self, current_code):
+        """Returns (formatter, lexer_name) for the current file, or None after telling the user why not."""
+        if self._reject_in_large_file_mode("Formatting"):
+            return None
         if not self.current_file_path:
             self._show_toast("Please load a file first", status="warn")
-            return
+            return None
         
-        current_code = self.content_widget.get("1.0", ctk.END).rstrip()
         lexer = get_lexer(self.current_file_path, current_code)
         
         if not lexer:
             self._show_toast("Could not detect file type", status="warn")
-            return
+            return None
         
-        lexer_name = lexer.name.lower()
+        lexer_name = language_for_lexer(lexer) or lexer.name.lower()
         formatter = SUPPORTED_FORMATTERS.get(lexer_name)
         
         if not formatter:
             self._show_toast(f"No formatter configured for '{lexer_name}'", status="warn")
             logger.warning(f"No formatter configured for language: {lexer_name}")
-            return
+            return None
         
         # Check if formatter is available
-        if not self._is_formatter_available(formatter):
+        if not runs_in_process(formatter) and not self._is_formatter_available(formatter):
             self._show_toast(f"Formatter '{formatter}' not installed", status="error")
             messagebox.showwarning(
                 "Formatter Not Found",
                 f"The formatter '{formatter}' is not installed.\n\n"
                 f"Please install it to format {lexer_name} files."
             )
+            return None
+        return formatter, lexer_name
+
+    def _format_code(self):
+        """Format the current code using appropriate formatter (in the background)."""
+        current_code = self.content_widget.get("1.0", ctk.END).rstrip()
+        resolved = self._resolve_formatter(current_code)
+        if not resolved:
             return
+        formatter, lexer_name = resolved
+        
+        self._show_toast(f"Formatting with {formatter}...", status="info")
+        self.jobs.submit(
+            "format",
+            lambda job: self._run_formatter(formatter, current_code, lexer_name, job),
+            on_done=lambda formatted_code: self._on_code_formatted(formatter, current_code, formatted_code),
+            on_error=self._on_format_error,
+            still_valid=lambda: self._buffer_unchanged(current_code)
+        )
+
+    def _on_code_formatted(self, formatter, current_code, formatted_code):
+        replaced = self._replace_content(formatted_code) if formatted_code else 0
+        if replaced:
+            self._show_toast("Code formatted successfully", status="success")
+            logger.info(f"Formatted code using {formatter}: {replaced} lines replaced")
+        else:
+            self._show_toast("Code already formatted", status="info")
+
+    def _on_format_error(self, error):
+        logger.error(f"Formatting error: {error}", exc_info=error)
+        self._show_toast(f"Formatting failed: {error}", status="error")
+
+    def _buffer_unchanged(self, code):
+        """True if the buffer still holds ``code``; otherwise tells the user a job result was discarded."""
+        if self.large_file_viewer is None and self.content_widget.get("1.0", ctk.END).rstrip() == code:
+            return True
+        self._show_toast("The code changed while it was processed; result discarded", status="warn")
+        return False
+
+    def _replace_content(self, formatted_code):
+        """Applies formatter output to the buffer; returns the number of lines replaced."""
+        replaced = self._apply_line_edits(formatted_code)
+        self.changed_lines.clear()
+        if replaced:
+            self.current_file_modified = True
+            self._update_title()
+        return replaced
+
+    def _apply_line_edits(self, new_text):
+        """
+        Turns the buffer into ``new_text`` with the line-level edits of diff_lines, applied bottom-up so the
+        line numbers of earlier hunks stay valid. Unchanged lines keep their tags and marks, the span from the
+        first to the last edited line is re-highlighted once after all hunks are in, and the edits form a
+        single undo step. Returns the number of lines replaced.
+        """
+        textbox = self.content_widget._textbox
+        old_lines, new_lines, opcodes = diff_lines(textbox.get("1.0", "end-1c"), new_text)
+        changes = [opcode for opcode in opcodes if opcode[0] != 'equal']
+        if not changes:
+            return 0
+        replaced = sum(max(i2 - i1, j2 - j1) for _tag, i1, i2, j1, j2 in changes)
+        if len(changes) > MINIMAL_EDIT_MAX_HUNKS:
+            # A rewrite: highlighting the new text once is cheaper than one incremental re-highlight per hunk
+            self.highlighter.reset()
+            textbox.delete("1.0", ctk.END)
+            textbox.insert("1.0", new_text)
+            self._apply_syntax_highlighting()
+            return replaced
         
+        autoseparators = textbox.cget("autoseparators")
+        textbox.configure(autoseparators=False)
         try:
-            formatted_code = self._run_formatter(formatter, current_code, lexer_name)
-            
-            if formatted_code and formatted_code != current_code:
-                self.content_widget.delete("1.0", ctk.END)
-                self.content_widget.insert("1.0", formatted_code)
-                self._apply_syntax_highlighting()
-                self.current_file_modified = True
-                self._update_title()
-                self._show_toast("Code formatted successfully", status="success")
-                logger.info(f"Formatted code using {formatter}")
-            else:
-                self._show_toast("Code already formatted", status="info")
-                
-        except Exception as e:
-            logger.error(f"Formatting error: {e}", exc_info=True)
-            self._show_toast(f"Formatting failed: {e}", status="error")
+            textbox.edit_separator()
+            with self.highlighter.batch_edits():
+                for _tag, i1, i2, j1, j2 in reversed(changes):
+                    if i1 < i2:
+                        textbox.delete(f"{i1 + 1}.0", f"{i2 + 1}.0" if i2 < len(old_lines) else "end-1c")
+                    if j1 < j2:
+                        textbox.insert(f"{i1 + 1}.0", "".join(new_lines[j1:j2]))
+            textbox.edit_separator()
+        finally:
+            textbox.configure(autoseparators=autoseparators)
+        return replaced
 
-    def _run_formatter(self, formatter, code, language):
-        """Run the specified formatter on the code."""
-        sanitized_code = self._sanitize_code(code)
-        
-        # Get formatter command
-        if formatter == "prettier":
-            ext_map = {
-                "javascript": "js",
-                "typescript": "ts",
-                "html": "html",
-                "css": "css",
-                "json": "json",
-                "markdown": "md",
-                "yaml": "yaml"
-            }
-            ext = ext_map.get(language, "txt")
-            cmd = ["prettier", "--stdin-filepath", f"temp.{ext}"]
-        elif formatter == "autopep8":
-            cmd = ["autopep8", "-"]
-        else:
-            cmd = FORMATTER_COMMANDS.get(formatter, [formatter])
+    def _format_changed_lines(self):
+        """Format only the lines edited since the last save or format, with formatters that support ranges."""
+        current_code = self.content_widget.get("1.0", ctk.END).rstrip()
+        resolved = self._resolve_formatter(current_code)
+        if not resolved:
+            return
+        formatter, lexer_name = resolved
+        if not self.changed_lines:
+            self._show_toast("No lines changed since the last save or format", status="info")
+            return
+        if formatter not in RANGE_FORMATTERS:
+            self._show_toast(f"{formatter} cannot format line ranges; formatting the whole file", status="info")
+            self._format_code()
+            return
         
-        process = subprocess.run(
-            cmd,
-            input=sanitized_code,
-            capture_output=True,
-            text=True
+        line_ranges = self.changed_lines.line_ranges(current_code.count('\n') + 1)
+        self._show_toast(f"Formatting {len(line_ranges)} changed range(s) with {formatter}...", status="info")
+        self.jobs.submit(
+            "format",
+            lambda job: self._run_formatter(formatter, current_code, lexer_name, job, line_ranges),
+            on_done=lambda formatted_code: self._on_changed_lines_formatted(formatter, formatted_code),
+            on_error=self._on_format_error,
+            still_valid=lambda: self._buffer_unchanged(current_code)
         )
+
+    def _on_changed_lines_formatted(self, formatter, formatted_code):
+        replaced = self._replace_content(formatted_code)
+        if not replaced:
+            self._show_toast("Changed lines already formatted", status="info")
+            return
+        self._show_toast(f"Formatted changed lines ({replaced} lines replaced)", status="success")
+        logger.info(f"Formatted changed lines using {formatter}: {replaced} lines replaced")
+
+    def _show_format_diff(self):
+        """Show a diff between the current code and the formatter's output."""
+        current_code = self.content_widget.get("1.0", ctk.END).rstrip()
+        resolved = self._resolve_formatter(current_code)
+        if not resolved:
+            return
+        formatter, lexer_name = resolved
+        
+        self._show_toast(f"Formatting with {formatter}...", status="info")
+        self.jobs.submit(
+            "format",
+            lambda job: self._run_formatter(formatter, current_code, lexer_name, job),
+            on_done=lambda formatted_code: self._open_format_diff(formatter, current_code, formatted_code),
+            on_error=self._on_format_error,
+            still_valid=lambda: self._buffer_unchanged(current_code)
+        )
+
+    def _open_format_diff(self, formatter, current_code, formatted_code):
+        if not formatted_code or formatted_code.rstrip() == current_code:
+            self._show_toast("Code already formatted", status="info")
+            return
         
-        if process.returncode != 0:
-            error_msg = process.stderr or "Unknown error"
-            logger.error(f"Formatter error: {error_msg}")
-            raise Exception(error_msg)
+        dialog = ctk.CTkToplevel(self)
+        dialog.title(f"Formatting Diff - {os.path.basename(self.current_file_path)} ({formatter})")
+        dialog.geometry("1200x800")
+        
+        diff_widget = ctk.CTkTextbox(dialog, wrap=ctk.NONE, activate_scrollbars=True)
+        diff_widget.pack(fill=ctk.BOTH, expand=True)
+        configure_tags(diff_widget._textbox, self.current_style, merge_inherited=MERGE_INHERITED_TAGS)
+        diff_view = DiffView(diff_widget._textbox)
+        diff_view.attach()
+        # Compare like _format_code does: the buffer without its trailing whitespace
+        hunk_count = diff_view.set_texts(current_code + "\n", formatted_code)
+        
+        def apply_formatted():
+            dialog.destroy()
+            # The dialog is not modal: the buffer may have been edited since the diff was computed
+            if not self._buffer_unchanged(current_code):
+                return
+            self._replace_content(formatted_code)
+            self._show_toast("Code formatted successfully", status="success")
+        
+        button_bar = ctk.CTkFrame(dialog)
+        button_bar.pack(fill=ctk.X)
+        ctk.CTkLabel(button_bar, text=f"{hunk_count} change(s)").pack(side=ctk.LEFT, padx=10)
+        ctk.CTkButton(button_bar, text="Close", command=dialog.destroy).pack(side=ctk.RIGHT, padx=5, pady=5)
+        ctk.CTkButton(button_bar, text="Apply", command=apply_formatted).pack(side=ctk.RIGHT, padx=5, pady=5)
+        logger.info(f"Showing formatting diff: {hunk_count} hunks")
+
+    def _run_formatter(self, formatter, code, language, job=None, line_ranges=None):
+        """
+        Run the specified formatter on the code, or only on ``line_ranges`` of it; with a ``job``, its
+        subprocess or worker is killed if the job is cancelled.
+        """
+        sanitized_code = self._sanitize_code(code)
         
-        return process.stdout
+        if line_ranges:
+            cmd, options = range_formatter_command(formatter, language, sanitized_code, line_ranges)
+        else:
+            cmd, options = formatter_command(formatter, language), None
+        
+        in_process = runs_in_process(formatter)
+        identity = inprocess_formatters.identity(formatter) if in_process else self.tools.identity(formatter)
+        # Part of the key, so a result is never served for a backend that did not produce it
+        backend = "in-process" if in_process else "worker" if self.formatter_pool.supports(formatter) else "subprocess"
+        key = cache_key(identity, [cmd, options, backend], sanitized_code) if identity else None
+        if key:
+            cached = self.format_cache.get(key)
+            if cached is not None:
+                logger.info(f"Format cache hit for {formatter}")
+                return cached
+        
+        formatted_code = run_formatter(formatter, cmd, sanitized_code, in_process, self.formatter_pool, job, options)
+        if key:
+            self.format_cache.put(key, formatted_code)
+        return formatted_code
 
     def _is_formatter_available(self, formatter):
-        """Check if a formatter is available in PATH."""
-        try:
-            subprocess.run(
-                [formatter, "--version"],
-                capture_output=True,
-                timeout=2
-            )
-            return True
-        except (subprocess.SubprocessError, FileNotFoundError):
-            return False
+        """Check if a formatter is available in PATH (resolved once, without starting it)."""
+        return self.tools.is_available(formatter)
 
     def _lint_code(self):
         """Lint the current code."""
+        if self._reject_in_large_file_mode("Linting"):
+            return
         if not self.current_file_path:
             self._show_toast("Please load a file first", status="warn")
             return
@@ -365,46 +635,47 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
             self._show_toast("Could not detect file type", status="warn")
             return
         
-        lexer_name = lexer.name.lower()
+        lexer_name = language_for_lexer(lexer) or lexer.name.lower()
         linter = SUPPORTED_FORMATTERS.get(lexer_name)
         
         if not linter:
             self._show_toast(f"No linter configured for '{lexer_name}'", status="warn")
             return
 
-        try:
-            process = subprocess.run(
-                [linter, "--version"],
-                capture_output=True,
-                text=True,
-                timeout=2
-            )
-            
-            # Run linter
-            lint_cmd = [linter]
-            if linter == "autopep8":
-                lint_cmd = ["autopep8", "--diff", "-"]
-            
-            process = subprocess.run(
-                lint_cmd,
-                input=self._sanitize_code(current_code),
-                capture_output=True,
-                text=True
-            )
-            
-            lint_output = process.stderr or process.stdout
-            if lint_output.strip():
-                self._show_toast("Linting completed with issues", status="warn")
-                logger.warning(f"Linting issues:\n{lint_output.strip()}")
-                messagebox.showinfo("Lint Results", f"Issues found:\n\n{lint_output[:500]}")
-            else:
-                self._show_toast("No linting issues found", status="success")
-                
-        except FileNotFoundError:
+        if not self.tools.is_available(linter):
             self._show_toast(f"Linter '{linter}' not installed", status="error")
-        except Exception as e:
-            logger.error(f"Linting error: {e}", exc_info=True)
-            self._show_toast(f"Linting failed: {e}", status="error")
+            return
+
+        # Run linter
+        lint_cmd = [linter]
+        if linter == "autopep8":
+            lint_cmd = ["autopep8", "--diff", "-"]
+        sanitized_code = self._sanitize_code(current_code)
+        
+        self._show_toast(f"Linting with {linter}...", status="info")
+        self.jobs.submit(
+            "lint",
+            lambda job: job.run_process(lint_cmd, sanitized_code),
+            on_done=self._on_lint_done,
+            on_error=lambda error: self._on_lint_error(linter, error),
+            still_valid=lambda: self._buffer_unchanged(current_code)
+        )
+
+    def _on_lint_done(self, process):
+        lint_output = process.stderr or process.stdout
+        if lint_output.strip():
+            self._show_toast("Linting completed with issues", status="warn")
+            logger.warning(f"Linting issues:\n{lint_output.strip()}")
+            messagebox.showinfo("Lint Results", f"Issues found:\n\n{lint_output[:500]}")
+        else:
+            self._show_toast("No linting issues found", status="success")
+
+    def _on_lint_error(self, linter, error):
+        if isinstance(error, FileNotFoundError):
+            self._show_toast(f"Linter '{linter}' not installed", status="error")
+            return
+        logger.error(f"Linting error: {error}", exc_info=error)
+        self._show_toast(f"Linting failed: {error}", status="error")
 
     def _sanitize_code(self, code):
         """Sanitize code for UTF-8 encoding."""
@@ -418,7 +689,7 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
 
     def _apply_syntax_highlighting(self):
         """Apply syntax highlighting to the current content."""
-        if not self.current_file_path:
+        if not self.current_file_path or self.large_file_viewer:
             return
         
         try:
@@ -426,29 +697,26 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
             lexer = get_lexer(self.current_file_path, content)
             
             if lexer:
-                # Reconfigure tags for current style
-                configure_tags(self.content_widget._textbox, self.current_style)
+                # Reconfigure tags for current style (a no-op if it is already applied)
+                configure_tags(self.content_widget._textbox, self.current_style, merge_inherited=MERGE_INHERITED_TAGS)
                 
-                # Apply highlighting line by line
-                lines = content.split('\n')
-                for line_num, line in enumerate(lines, 1):
-                    line_start = f"{line_num}.0"
-                    line_end = f"{line_num}.end"
-                    
-                    # Clear existing tags for this line
-                    for tag in self.content_widget._textbox.tag_names(line_start):
-                        if tag.startswith("pygments_"):
-                            self.content_widget._textbox.tag_remove(tag, line_start, line_end)
+                # Large documents only get their visible lines tagged, extended as the view scrolls
+                line_count = content.count('\n')
+                lazy = line_count > LAZY_HIGHLIGHT_THRESHOLD_LINES
+                background = not lazy and line_count > BACKGROUND_HIGHLIGHT_THRESHOLD_LINES
+                self.highlighter.set_document(lexer, lazy=lazy, background=background)
                 
-                logger.info("Syntax highlighting applied")
+                mode = 'lazy' if lazy else 'background' if background else 'full'
+                logger.info(f"Syntax highlighting applied ({mode}, {line_count} lines)")
         except Exception as e:
             logger.error(f"Failed to apply syntax highlighting: {e}", exc_info=True)
 
     def _change_style(self, style_name):
         """Change the syntax highlighting style."""
         self.current_style = style_name
-        configure_tags(self.content_widget._textbox, style_name)
-        self._apply_syntax_highlighting()
+        # Tag names do not depend on the style, so the document only needs retagging if new tags appeared
+        if configure_tags(self.content_widget._textbox, style_name, merge_inherited=MERGE_INHERITED_TAGS):
+            self._apply_syntax_highlighting()
         self._show_toast(f"Style changed to: {style_name}", status="info")
 
     def _load_file_history(self):
@@ -528,5 +796,10 @@ class CodeFormatterApp(ctk.CTk, TkinterDnD.DnDWrapper):
 
 
 if __name__ == '__main__':
-    app = CodeFormatterApp()
+    startup_profile = None
+    if _ARGS.startup_profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        startup_profile = StartupProfile(profiler)
+    app = CodeFormatterApp(startup_profile)
     app.mainloop()
\ No newline at end of file
@@ -1,15 +1,109 @@
+import contextlib
+import fnmatch
+import functools
+import html
+import inspect
 import logging
 import os
+import queue
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
 from pygments import highlight 
+from pygments.lexer import RegexLexer, ExtendedRegexLexer
 from pygments.lexers import get_lexer_by_name, guess_lexer_for_filename, guess_lexer
+from pygments.lexers._mapping import LEXERS
 from pygments.styles import get_style_by_name, get_all_styles
-from pygments.token import Token 
+from pygments.token import Token, Error, Text, Whitespace, _TokenType
 import tkinter as tk
+from tkinter import font as tkfont
+
+from edit_tracker import ChangedLines
+from fast_lexers import get_fast_lexer_class
 
 logger = logging.getLogger(__name__)
 
 TOKEN_CONFIG = {}
+# Maps each Pygments token type to the ordered tag names (most specific first) it should carry.
+TOKEN_TAG_TABLE = {}
 CURRENT_PYGMENTS_STYLE_NAME = 'monokai'
+# When set, each token range carries only the tag of its most specific configured type, with inherited options merged in
+MERGE_INHERITED_TAGS = False
+# (style name, font family, font size, merge inherited) -> (resolved style name, TOKEN_CONFIG, TOKEN_TAG_TABLE)
+_STYLE_CACHE = {}
+# Named fonts shared by all tags: (Tk interpreter, font family) -> {variant: tkinter.font.Font}
+_SHARED_FONTS = {}
+# Font variant -> (size relative to the base font, weight, slant)
+SHARED_FONT_VARIANTS = {
+    'normal': (0, 'normal', 'roman'),
+    'bold': (0, 'bold', 'roman'),
+    'italic': (0, 'normal', 'italic'),
+    'bold italic': (0, 'bold', 'italic'),
+    'small': (-1, 'normal', 'roman'),
+    'small italic': (-1, 'normal', 'italic'),
+}
+
+# Maximum number of (start, end) index pairs passed to a single tag_add call.
+TAG_ADD_BATCH_SIZE = 2000
+
+# Resolved lexer classes kept by get_lexer, and how much of the code content analysis may look at.
+LEXER_CACHE_SIZE = 128
+LEXER_ANALYSIS_PREFIX = 4096
+_LEXER_CACHE = OrderedDict()
+_LEXER_CACHE_LOCK = threading.Lock()
+
+ROOT_LEXER_STATE = ('root',)
+# Lexers without a state stack: every line start outside a multi-line comment or string is a safe restart
+# point, including those inside whitespace (or plain text) tokens spanning several lines.
+LINE_RESTARTABLE_LEXERS = {'JsonLexer', 'FastJsonLexer', 'TextLexer'}
+# get_lexer hands out the single-regex tokenizers from fast_lexers for Python, JSON and YAML
+USE_FAST_LEXERS = True
+# Lines highlighted above and below the viewport in lazy mode.
+LAZY_HIGHLIGHT_MARGIN = 100
+# Lines re-lexed per step after an edit while waiting for the lexer states to converge (doubles each step).
+INCREMENTAL_CHUNK_LINES = 16
+# Lines past the re-lexed ones the lexer gets to see for rules that look ahead; doubled while a token
+# runs into the end of the lookahead.
+LEX_LOOKAHEAD_LINES = 200
+# Background highlighting: lines per batch produced by the worker thread, and the UI-thread time budget
+# per after() slice spent applying them (kept well under one 16 ms frame).
+BACKGROUND_BATCH_LINES = 500
+BACKGROUND_APPLY_BUDGET_MS = 10
+BACKGROUND_POLL_MS = 15
+# Lines lexed per chunk when exporting, and the approximate size of the chunks handed to the writer
+EXPORT_CHUNK_LINES = 2000
+EXPORT_WRITE_CHUNK_SIZE = 64 * 1024
+# Chunks read without finding a line boundary to resume from before the rest of the file is lexed in one go
+# (re-lexing an ever growing chunk would be quadratic)
+EXPORT_MAX_CHUNKS_WITHOUT_BOUNDARY = 4
+
+# Replaces a Text widget command: insert/delete/replace and undo/redo report the affected lines to a callback,
+# everything else goes straight to the original widget command.
+_EDIT_PROXY_TCL = """
+proc ::syntax_highlighter_edit_proxy {orig callback op args} {
+    if {$op eq "edit" && [lindex $args 0] in {undo redo}} {
+        set result [uplevel 1 [list $orig $op {*}$args]]
+        $callback 0 0 0 0
+        return $result
+    }
+    if {$op ni {insert delete replace}} {
+        return [uplevel 1 [list $orig $op {*}$args]]
+    }
+    set first [$orig index [lindex $args 0]]
+    if {$op eq "insert"} {
+        set last $first
+    } elseif {$op eq "replace" || [llength $args] > 1} {
+        set last [$orig index [lindex $args [expr {$op eq "replace" ? 1 : "end"}]]]
+    } else {
+        set last [$orig index "$first +1c"]
+    }
+    set end_before [$orig index end]
+    set result [uplevel 1 [list $orig $op {*}$args]]
+    $callback $first $last $end_before [$orig index end]
+    return $result
+}
+"""
 
 MANUAL_OVERRIDES = { 
     Token.Keyword: {'foreground': '#FF79C6'},
@@ -26,9 +120,18 @@ def _get_font_tuple(base_font_family, base_font_size, style_parts_str="normal"):
     """Helper to create Tkinter font tuples."""
     return (base_font_family, base_font_size, style_parts_str)
 
-def initialize_style(style_name='monokai', base_font_family="Consolas", base_font_size=11):
-    """Initializes TOKEN_CONFIG based on a Pygments style and applies overrides."""
-    global TOKEN_CONFIG, CURRENT_PYGMENTS_STYLE_NAME
+def initialize_style(style_name='monokai', base_font_family="Consolas", base_font_size=11, merge_inherited=False):
+    """
+    Initializes TOKEN_CONFIG based on a Pygments style and applies overrides.
+    Results are cached per (style, font family, font size, tag mode), so switching back to a style costs nothing.
+    """
+    global TOKEN_CONFIG, TOKEN_TAG_TABLE, CURRENT_PYGMENTS_STYLE_NAME, MERGE_INHERITED_TAGS
+    MERGE_INHERITED_TAGS = merge_inherited
+    cache_key = (style_name, base_font_family, base_font_size, merge_inherited)
+    cached = _STYLE_CACHE.get(cache_key)
+    if cached is not None:
+        CURRENT_PYGMENTS_STYLE_NAME, TOKEN_CONFIG, TOKEN_TAG_TABLE = cached
+        return
     TOKEN_CONFIG = {}
     CURRENT_PYGMENTS_STYLE_NAME = style_name
     logger.debug(f"Initializing Pygments style: {style_name} with base font: {base_font_family} {base_font_size}pt")
@@ -43,8 +146,10 @@ def initialize_style(style_name='monokai', base_font_family="Consolas", base_fon
     default_fg = f"#{style.style_for_token(Token.Text)['color'] or 'F8F8F2'}"
     TOKEN_CONFIG[Token.Text] = {'foreground': default_fg}
 
+    # Every token type of the style gets an entry, even without options of its own, so the set of tags
+    # stays the same across styles and a theme switch never has to retag the document.
     for token_type, style_info in style:
-        config = {}
+        config = TOKEN_CONFIG.get(token_type, {})
         font_style_parts = []
         if style_info['color']: config['foreground'] = f"#{style_info['color']}"
         if style_info['bgcolor']: config['background'] = f"#{style_info['bgcolor']}" 
@@ -57,82 +162,281 @@ def initialize_style(style_name='monokai', base_font_family="Consolas", base_fon
             config['font'] = _get_font_tuple(base_font_family, base_font_size, manual_font_style)
         elif font_style_parts:
             config['font'] = _get_font_tuple(base_font_family, base_font_size, " ".join(font_style_parts))
-        if config: TOKEN_CONFIG[token_type] = config
+        TOKEN_CONFIG[token_type] = config
     
     for token_type, override_config in MANUAL_OVERRIDES.items():
         if token_type not in TOKEN_CONFIG: TOKEN_CONFIG[token_type] = {} 
         for k,v in override_config.items():
             if k != 'font_style_override': TOKEN_CONFIG[token_type][k] = v
+    _build_token_tag_table()
+    _STYLE_CACHE[cache_key] = (CURRENT_PYGMENTS_STYLE_NAME, TOKEN_CONFIG, TOKEN_TAG_TABLE)
     logger.debug(f"Token config after style '{style_name}': {len(TOKEN_CONFIG)} rules loaded.")
 
+@functools.lru_cache(maxsize=None)
+def get_style_names():
+    """
+    Sorted names of the built-in and plugin Pygments styles, listed once per process.
+    Names come from Pygments' style mapping; a style module is only imported when initialize_style selects it.
+    """
+    return tuple(sorted(get_all_styles()))
+
+def _iter_token_types(root=Token):
+    """Yields every token type created so far below (and including) ``root``."""
+    pending = [root]
+    while pending:
+        token_type = pending.pop()
+        yield token_type
+        pending.extend(token_type.subtypes)
+
+def _resolve_tags_for_token(token_type):
+    """
+    Walks the token type's ancestors and collects the tag names of those present in TOKEN_CONFIG.
+    With MERGE_INHERITED_TAGS only the merged tag of the nearest configured ancestor is returned.
+    """
+    if MERGE_INHERITED_TAGS:
+        while token_type is not None and token_type not in TOKEN_CONFIG:
+            token_type = token_type.parent
+        return [get_merged_tag_for_token(token_type)] if token_type is not None else []
+    tags = []
+    while token_type is not None:
+        if token_type in TOKEN_CONFIG: tags.append(get_tkinter_tag_for_token(token_type))
+        token_type = token_type.parent
+    return tags
+
+def _build_token_tag_table():
+    """Precomputes TOKEN_TAG_TABLE for all known token types from the current TOKEN_CONFIG."""
+    global TOKEN_TAG_TABLE
+    TOKEN_TAG_TABLE = {token_type: _resolve_tags_for_token(token_type) for token_type in _iter_token_types()}
+    logger.debug(f"Token tag table built for {len(TOKEN_TAG_TABLE)} token types.")
+
+def get_tags_for_token(token_type):
+    """Returns the configured tag names for a token type, resolving (and caching) types created after the table was built."""
+    tags = TOKEN_TAG_TABLE.get(token_type)
+    if tags is None:
+        tags = TOKEN_TAG_TABLE[token_type] = _resolve_tags_for_token(token_type)
+    return tags
+
+@functools.lru_cache(maxsize=None)
+def _is_specially_named_file(basename):
+    """True if a lexer claims this file by name (Makefile, CMakeLists.txt, ...) rather than by extension alone."""
+    return any(fnmatch.fnmatch(basename, pattern)
+               for _module, _name, _aliases, filenames, _mimetypes in LEXERS.values()
+               for pattern in filenames if not pattern.startswith('*.'))
+
+def _lexer_cache_key(filename, code):
+    """Cache key for get_lexer: the file extension (or the name, for specially named files) plus the shebang line."""
+    first_line = code[:code.find('\n')] if '\n' in code[:200] else code[:200]
+    if not filename:
+        return (None, first_line.strip())
+    basename = os.path.basename(filename)
+    name_key = basename if _is_specially_named_file(basename) else os.path.splitext(basename)[1].lower() or basename
+    return (name_key, first_line.strip() if first_line.startswith('#!') else '')
+
 def get_lexer(filename, code):
-    """Gets the appropriate Pygments lexer for a filename or code snippet."""
+    """
+    Gets the appropriate Pygments lexer for a filename or code snippet.
+    Resolved lexer classes are cached per file type, and content analysis only sees the first LEXER_ANALYSIS_PREFIX characters.
+    """
     lexer = None
+    code = code or ''
+    cache_key = _lexer_cache_key(filename, code)
+    with _LEXER_CACHE_LOCK:
+        lexer_class = _LEXER_CACHE.get(cache_key)
+        if lexer_class is not None: _LEXER_CACHE.move_to_end(cache_key)
+    if lexer_class is not None:
+        return lexer_class()
+
+    analysis_code = code[:LEXER_ANALYSIS_PREFIX]
     try:
         log_filename = os.path.basename(filename) if filename else 'code snippet'
         if filename: 
-            lexer = guess_lexer_for_filename(filename, code)
+            lexer = guess_lexer_for_filename(filename, analysis_code)
             logger.debug(f"Guessed lexer for filename '{log_filename}': {type(lexer).__name__}")
-        elif code.strip(): 
-            lexer = guess_lexer(code) 
+        elif analysis_code.strip(): 
+            lexer = guess_lexer(analysis_code) 
             logger.debug(f"Guessed lexer from code: {type(lexer).__name__}")
         else: 
              lexer = get_lexer_by_name("text")
              logger.debug("No filename or code, defaulting to text lexer.")
-        return lexer
     except Exception as e: 
         log_filename_on_error = os.path.basename(filename) if filename else 'code snippet'
         logger.warning(f"Could not guess lexer for '{log_filename_on_error}'. Falling back to text. Error: {e}")
-        try: return get_lexer_by_name("text") 
+        try: lexer = get_lexer_by_name("text") 
         except Exception: logger.error("CRITICAL: Could not get 'text' lexer from Pygments."); return None
 
+    if USE_FAST_LEXERS:
+        fast_lexer_class = get_fast_lexer_class(type(lexer))
+        if fast_lexer_class is not None:
+            lexer = fast_lexer_class(**lexer.options)
+            logger.debug(f"Using {fast_lexer_class.__name__} for '{log_filename}'.")
+
+    with _LEXER_CACHE_LOCK:
+        _LEXER_CACHE[cache_key] = type(lexer)
+        while len(_LEXER_CACHE) > LEXER_CACHE_SIZE: _LEXER_CACHE.popitem(last=False)
+    return lexer
+
 def get_tkinter_tag_for_token(token_type):
-    """Generates a unique tag name for a Pygments token type for Tkinter."""
-    return f"pygments_{CURRENT_PYGMENTS_STYLE_NAME}_{str(token_type).replace('.', '_')}"
+    """Generates a unique tag name for a Pygments token type for Tkinter. Names do not depend on the style."""
+    return f"pygments_{str(token_type).replace('.', '_')}"
 
-def configure_tags(text_widget, style_name='monokai', base_font_family="Consolas", base_font_size=11):
-    """Configures Tkinter Text widget tags based on the chosen Pygments style."""
-    logger.info(f"Configuring tags for style '{style_name}' on widget: {text_widget}")
-    initialize_style(style_name, base_font_family, base_font_size)
-    
-    for tag in text_widget.tag_names():
-        if tag.startswith("pygments_"): 
-            try: text_widget.tag_delete(tag)
-            except tk.TclError: pass 
+def get_merged_tag_for_token(token_type):
+    """Tag name for a token type's merged (inherited options included) configuration."""
+    return f"pygments_merged_{str(token_type).replace('.', '_')}"
+
+def _merge_inherited_config(token_type):
+    """Merges the TOKEN_CONFIG entries of a token type and its ancestors, the most specific type winning."""
+    chain = []
+    while token_type is not None:
+        if token_type in TOKEN_CONFIG: chain.append(TOKEN_CONFIG[token_type])
+        token_type = token_type.parent
+    merged = {}
+    for config in reversed(chain):
+        merged.update(config)
+    return merged
+
+def get_shared_fonts(text_widget, base_font_family, base_font_size):
+    """
+    Returns {variant: font} for the SHARED_FONT_VARIANTS of ``base_font_family``, to be used as tag font options.
+    The named Tk fonts are created once per interpreter and family and shared by every tag; a new
+    ``base_font_size`` resizes them in place, so Tk re-lays out the text without any tag being reconfigured.
+    Widgets without a Tk interpreter (such as the benchmark stub) get plain font tuples.
+    """
+    if not isinstance(text_widget, tk.Misc):
+        return {variant: _get_font_tuple(base_font_family, base_font_size + size_delta, f"{weight} {slant}")
+                for variant, (size_delta, weight, slant) in SHARED_FONT_VARIANTS.items()}
+    key = (text_widget.tk, base_font_family)
+    fonts = _SHARED_FONTS.get(key)
+    if fonts is None:
+        prefix = "highlight_" + "".join(c if c.isalnum() else '_' for c in base_font_family)
+        fonts = _SHARED_FONTS[key] = {
+            variant: tkfont.Font(root=text_widget, name=f"{prefix}_{variant.replace(' ', '_')}", family=base_font_family,
+                                 size=base_font_size + size_delta, weight=weight, slant=slant)
+            for variant, (size_delta, weight, slant) in SHARED_FONT_VARIANTS.items()}
+        logger.debug(f"Created {len(fonts)} shared fonts for {base_font_family} {base_font_size}pt.")
+    elif fonts['normal'].cget('size') != base_font_size:
+        for variant, font in fonts.items():
+            font.configure(size=base_font_size + SHARED_FONT_VARIANTS[variant][0])
+        logger.debug(f"Resized shared {base_font_family} fonts to {base_font_size}pt.")
+    return {variant: str(font) for variant, font in fonts.items()}
 
-    base_font_tuple = _get_font_tuple(base_font_family, base_font_size)
+def _font_variant(font_tuple):
+    """Maps a TOKEN_CONFIG font tuple to its SHARED_FONT_VARIANTS name."""
+    parts = font_tuple[2].split() if font_tuple and len(font_tuple) > 2 else []
+    return {(False, False): 'normal', (True, False): 'bold', (False, True): 'italic',
+            (True, True): 'bold italic'}['bold' in parts, 'italic' in parts]
 
+def _compute_tag_options(text_widget, base_font_family, base_font_size):
+    """Returns {tag name: options} for every Pygments and diff/utility tag under the current TOKEN_CONFIG."""
+    fonts = get_shared_fonts(text_widget, base_font_family, base_font_size)
+    base_font = fonts['normal']
+    tag_options = {}
     for token_type, config in TOKEN_CONFIG.items():
-        tag_name = get_tkinter_tag_for_token(token_type)
-        final_config = config.copy()
-        if 'font' not in final_config: 
-            final_config['font'] = base_font_tuple
+        if MERGE_INHERITED_TAGS:
+            final_config, tag_name = _merge_inherited_config(token_type), get_merged_tag_for_token(token_type)
+        else:
+            final_config, tag_name = config.copy(), get_tkinter_tag_for_token(token_type)
+        final_config['font'] = fonts[_font_variant(final_config.get('font'))]
+        tag_options[tag_name] = final_config
+
+    default_bg = text_widget.cget("bg") 
+    tag_options.update({
+        "diff_add": {'background': "#163B1F", 'font': base_font},
+        "diff_del": {'background': "#401C1F", 'font': base_font},
+        "diff_header": {'foreground': "#888888", 'font': fonts['bold']},
+        "diff_common": {'background': default_bg, 'font': base_font},
+        "line_no": {'foreground': "#586069", 'font': fonts['small']},
+        "char_highlight_add": {'background': "#1F542A", 'font': base_font},
+        "char_highlight_del": {'background': "#6B2028", 'font': base_font},
+        "no_newline_marker": {'foreground': "#C87A23", 'font': fonts['small italic']},
+        "line_del_bg": {'background': "#401C1F", 'font': base_font},
+        "line_add_bg": {'background': "#163B1F", 'font': base_font},
+        "line_changed_bg": {'background': "#443A1F", 'font': base_font},
+    })
+    return tag_options
+
+def configure_tags(text_widget, style_name='monokai', base_font_family="Consolas", base_font_size=11,
+                   merge_inherited=False):
+    """
+    Configures Tkinter Text widget tags based on the chosen Pygments style.
+    Only tags whose options differ from what was last applied to this widget are reconfigured (one
+    tag_configure each), so re-applying the current style is free. Returns True if Pygments tags were
+    created that the existing text cannot carry yet, i.e. the document needs re-highlighting.
+    With ``merge_inherited`` every token type gets one tag with its ancestors' options merged in, so each
+    token range carries a single syntax tag instead of one per ancestor.
+    Tags use the named fonts from get_shared_fonts, so a new ``base_font_size`` reconfigures no tag.
+    """
+    initialize_style(style_name, base_font_family, base_font_size, merge_inherited)
+    try:
+        tag_options = _compute_tag_options(text_widget, base_font_family, base_font_size)
+    except tk.TclError as e:
+        logger.error(f"TclError computing tag options: {e}")
+        return False
+    # {tag name: options} as last applied, kept on the widget object: it goes away with the widget, and a
+    # new widget reusing the same Tk path name starts empty
+    applied = getattr(text_widget, "_applied_tag_options", None)
+    if applied is None:
+        applied = text_widget._applied_tag_options = {}
+    if tag_options == applied:
+        logger.debug(f"Tags for style '{style_name}' already configured on widget: {text_widget}")
+        return False
+    logger.info(f"Configuring tags for style '{style_name}' on widget: {text_widget}")
+
+    needs_rehighlight = False
+    for tag_name in applied.keys() - tag_options.keys():
+        # Defined by the previous style only: keep the tag on the text, but without any styling.
+        tag_options[tag_name] = dict.fromkeys(applied[tag_name], '')
+    for tag_name, options in tag_options.items():
+        previous = applied.get(tag_name)
+        if previous == options:
+            continue
+        if previous is None and tag_name.startswith("pygments_"):
+            needs_rehighlight = True
+        final_config = {option: '' for option in (previous or {}) if option not in options}
+        final_config.update(options)
         try:
             text_widget.tag_configure(tag_name, **final_config)
+            applied[tag_name] = options
         except tk.TclError as e: 
-            logger.error(f"TclError configuring Pygments tag '{tag_name}' with {final_config}: {e}")
+            logger.error(f"TclError configuring tag '{tag_name}' with {final_config}: {e}")
         except Exception as e: 
-             logger.error(f"Unexpected error configuring Pygments tag '{tag_name}': {e}", exc_info=True)
+             logger.error(f"Unexpected error configuring tag '{tag_name}': {e}", exc_info=True)
+    logger.debug(f"Tag configuration for style '{style_name}' complete.")
+    return needs_rehighlight
 
-    try:
-        default_bg = text_widget.cget("bg") 
-        text_widget.tag_configure("diff_add", background="#163B1F", font=base_font_tuple) 
-        text_widget.tag_configure("diff_del", background="#401C1F", font=base_font_tuple) 
-        text_widget.tag_configure("diff_header", foreground="#888888", font=_get_font_tuple(base_font_family, base_font_size, "bold"))
-        text_widget.tag_configure("diff_common", background=default_bg, font=base_font_tuple) 
-        text_widget.tag_configure("line_no", foreground="#586069", font=_get_font_tuple(base_font_family, base_font_size -1)) 
-        text_widget.tag_configure("char_highlight_add", background="#1F542A", font=base_font_tuple) 
-        text_widget.tag_configure("char_highlight_del", background="#6B2028", font=base_font_tuple) 
-        text_widget.tag_configure("no_newline_marker", foreground="#C87A23", font=_get_font_tuple(base_font_family, base_font_size - 1, "italic"))
-        text_widget.tag_configure("line_del_bg", background="#401C1F", font=base_font_tuple) 
-        text_widget.tag_configure("line_add_bg", background="#163B1F", font=base_font_tuple) 
-        text_widget.tag_configure("line_changed_bg", background="#443A1F", font=base_font_tuple) 
-    except tk.TclError as e:
-        logger.error(f"TclError configuring diff utility tags: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error configuring diff utility tags: {e}", exc_info=True)
-    logger.debug("Diff and utility tags configuration attempt complete.")
 
+class LineOffsetIndex:
+    """
+    Maps character offsets in a text to absolute Tk ``"line.col"`` indices, given where the text starts in
+    the widget. The line-start array is built once, so Tk never has to resolve ``"+Nc"`` relative indices
+    by counting characters.
+    """
+
+    def __init__(self, text, start_line=1, start_col=0):
+        self.start_line, self.start_col = start_line, start_col
+        self.line_starts = line_starts = [0]
+        find = text.find
+        pos = find('\n')
+        while pos != -1:
+            line_starts.append(pos + 1)
+            pos = find('\n', pos + 1)
+
+    @classmethod
+    def from_index(cls, text, start_index):
+        """Builds the index for ``text`` starting at the absolute widget index ``start_index``."""
+        start_line, start_col = (int(part) for part in start_index.split('.'))
+        return cls(text, start_line, start_col)
+
+    def line_col(self, offset):
+        """Returns the absolute (line, col) of ``offset``."""
+        line = bisect_right(self.line_starts, offset) - 1
+        col = offset - self.line_starts[line]
+        if line == 0: col += self.start_col
+        return self.start_line + line, col
+
+    def index(self, offset):
+        """Returns the absolute Tk index of ``offset``."""
+        line, col = self.line_col(offset)
+        return f"{line}.{col}"
 
 def highlight_line(text_widget, line_content_with_marker, base_line_tags, lexer,
                    char_highlight_tags=None, content_start_offset=0):
@@ -143,7 +447,8 @@ def highlight_line(text_widget, line_content_with_marker, base_line_tags, lexer,
     try:
         start_index_line = text_widget.index(tk.END + "-1c") 
         text_widget.insert(tk.END, line_content_with_marker)
-        end_index_line = text_widget.index(tk.END + "-1c") 
+        line_index = LineOffsetIndex.from_index(line_content_with_marker, start_index_line)
+        end_index_line = line_index.index(len(line_content_with_marker))
 
         if base_line_tags:
             for tag in base_line_tags:
@@ -169,14 +474,10 @@ def highlight_line(text_widget, line_content_with_marker, base_line_tags, lexer,
                         logger.error(f"Token type or text is None after unpacking: {token_tuple}. Skipping.")
                         continue
                         
-                    token_start_widget_idx = f"{start_index_line}+{content_start_offset + current_char_pos_in_syntax_content}c"
-                    token_end_widget_idx = f"{start_index_line}+{content_start_offset + current_char_pos_in_syntax_content + len(token_text)}c"
-                    current_token_type_iter = token_type
-                    while current_token_type_iter is not None: 
-                        pygments_tag_name = get_tkinter_tag_for_token(current_token_type_iter)
-                        if pygments_tag_name in text_widget.tag_names(): 
-                            text_widget.tag_add(pygments_tag_name, token_start_widget_idx, token_end_widget_idx)
-                        current_token_type_iter = current_token_type_iter.parent
+                    token_start_widget_idx = line_index.index(content_start_offset + current_char_pos_in_syntax_content)
+                    token_end_widget_idx = line_index.index(content_start_offset + current_char_pos_in_syntax_content + len(token_text))
+                    for pygments_tag_name in get_tags_for_token(token_type):
+                        text_widget.tag_add(pygments_tag_name, token_start_widget_idx, token_end_widget_idx)
                     current_char_pos_in_syntax_content += len(token_text)
             except ValueError as e: 
                 logger.error(f"ValueError during Pygments token processing for content '{content_for_syntax[:30].strip()}...': {e}", exc_info=True)
@@ -185,10 +486,748 @@ def highlight_line(text_widget, line_content_with_marker, base_line_tags, lexer,
 
         if char_highlight_tags:
             for tag_name, start_char, end_char in char_highlight_tags:
-                char_tag_start_idx = f"{start_index_line}+{content_start_offset + start_char}c"
-                char_tag_end_idx = f"{start_index_line}+{content_start_offset + end_char}c"
+                char_tag_start_idx = line_index.index(content_start_offset + start_char)
+                char_tag_end_idx = line_index.index(content_start_offset + end_char)
                 text_widget.tag_add(tag_name, char_tag_start_idx, char_tag_end_idx)
     except tk.TclError as e:
         logger.error(f"TclError in highlight_line for content '{line_content_with_marker[:30].strip()}...': {e}", exc_info=False)
     except Exception as e:
-        logger.error(f"Unexpected error in highlight_line (outer try-except) for content '{line_content_with_marker[:30].strip()}...': {e}", exc_info=True)
\ No newline at end of file
+        logger.error(f"Unexpected error in highlight_line (outer try-except) for content '{line_content_with_marker[:30].strip()}...': {e}", exc_info=True)
+
+
+def group_token_ranges(tokens, start_line=1, start_col=0, first_line=None, stop_line=None):
+    """
+    Groups the widget index ranges of ``(index, token_type, value)`` tokens by tag name,
+    with the first token starting at ``start_line.start_col``. Adjacent ranges carrying the same tag are merged.
+    Tokens ending before ``first_line`` are skipped; grouping stops at the first token starting on ``stop_line``.
+    """
+    tag_table = TOKEN_TAG_TABLE
+    ranges_by_tag = {}
+    line, col = start_line, start_col
+    for token_tuple in tokens:
+        token_type, token_text = token_tuple[-2], token_tuple[-1]
+        if token_type is None or not token_text:
+            continue
+        newlines = token_text.count('\n')
+        if newlines:
+            end_line, end_col = line + newlines, len(token_text) - token_text.rfind('\n') - 1
+        else:
+            end_line, end_col = line, col + len(token_text)
+
+        tags = tag_table.get(token_type)
+        if tags is None: tags = get_tags_for_token(token_type)
+        if stop_line is not None and line >= stop_line:
+            break
+        if tags and (first_line is None or end_line >= first_line):
+            start_idx, end_idx = f"{line}.{col}", f"{end_line}.{end_col}"
+            for tag_name in tags:
+                indices = ranges_by_tag.get(tag_name)
+                if indices is None:
+                    ranges_by_tag[tag_name] = [start_idx, end_idx]
+                elif indices[-1] == start_idx:
+                    indices[-1] = end_idx
+                else:
+                    indices.append(start_idx)
+                    indices.append(end_idx)
+        line, col = end_line, end_col
+    return ranges_by_tag
+
+def collect_tag_ranges(lexer, code, start_line=1, start_col=0):
+    """Lexes ``code`` in a single pass and groups the widget index ranges of its tokens by tag name."""
+    return group_token_ranges(lexer.get_tokens_unprocessed(code), start_line, start_col)
+
+def apply_tag_ranges(text_widget, ranges_by_tag):
+    """Applies grouped tag ranges with as few tag_add calls as possible."""
+    step = TAG_ADD_BATCH_SIZE * 2
+    for tag_name, indices in ranges_by_tag.items():
+        for i in range(0, len(indices), step):
+            text_widget.tag_add(tag_name, *indices[i:i + step])
+
+def highlight_document(text_widget, lexer, code=None, start_index="1.0"):
+    """
+    Highlights the widget content from ``start_index`` to the end with a single lexer pass.
+    Unlike highlight_line, lexer state carries across lines, so multi-line strings and comments are tagged correctly.
+    """
+    if not lexer: return
+    try:
+        start_index = text_widget.index(start_index)
+        if code is None: code = text_widget.get(start_index, tk.END)
+        start_line, start_col = (int(part) for part in start_index.split('.'))
+        ranges_by_tag = collect_tag_ranges(lexer, code, start_line, start_col)
+
+        for tag in text_widget.tag_names():
+            if tag.startswith("pygments_"): text_widget.tag_remove(tag, start_index, tk.END)
+        apply_tag_ranges(text_widget, ranges_by_tag)
+        logger.debug(f"Highlighted document from {start_index}: {sum(len(v) for v in ranges_by_tag.values()) // 2} ranges in {len(ranges_by_tag)} tags.")
+    except tk.TclError as e:
+        logger.error(f"TclError in highlight_document: {e}", exc_info=False)
+    except Exception as e:
+        logger.error(f"Unexpected error in highlight_document: {e}", exc_info=True)
+
+
+def _has_stack_aware_override(lexer):
+    """True for RegexLexers that post-process the standard loop in an override taking the initial ``stack`` (e.g. the C family)."""
+    method = type(lexer).get_tokens_unprocessed
+    return (method is not RegexLexer.get_tokens_unprocessed
+            and 'stack' in inspect.signature(method).parameters)
+
+def supports_line_states(lexer):
+    """True if lexing can resume at a line start from a recorded state instead of from the top of the document."""
+    if type(lexer).__name__ in LINE_RESTARTABLE_LEXERS or hasattr(lexer, 'get_tokens_with_line_states'): return True
+    if not isinstance(lexer, RegexLexer) or isinstance(lexer, ExtendedRegexLexer): return False
+    return type(lexer).get_tokens_unprocessed is RegexLexer.get_tokens_unprocessed or _has_stack_aware_override(lexer)
+
+def lex_with_line_states(lexer, text, state=ROOT_LEXER_STATE, line_states=None):
+    """
+    Yields ``(index, token_type, value)`` tokens like ``get_tokens_unprocessed``, starting from lexer ``state``.
+    For every line that begins on a token boundary (or, for LINE_RESTARTABLE_LEXERS, inside a whitespace
+    token), ``(line_offset, state)`` is appended to ``line_states``, where ``line_offset`` counts lines from
+    the start of ``text``. Lexing resumed from a recorded state produces the same tokens as lexing the
+    document from the top.
+    """
+    if hasattr(lexer, 'get_tokens_with_line_states'):
+        yield from lexer.get_tokens_with_line_states(text, state, line_states)
+        return
+    if not supports_line_states(lexer) or not isinstance(lexer, RegexLexer):
+        restartable = type(lexer).__name__ in LINE_RESTARTABLE_LEXERS
+        line_offset = 0
+        for token_tuple in lexer.get_tokens_unprocessed(text):
+            yield token_tuple
+            value = token_tuple[-1]
+            if restartable and line_states is not None and '\n' in value:
+                if token_tuple[1] is Text or value.isspace():
+                    for _ in range(value.count('\n')):
+                        line_offset += 1
+                        line_states.append((line_offset, ROOT_LEXER_STATE))
+                else:
+                    line_offset += value.count('\n')
+                    if value[-1] == '\n': line_states.append((line_offset, ROOT_LEXER_STATE))
+        return
+    if type(lexer).get_tokens_unprocessed is RegexLexer.get_tokens_unprocessed:
+        yield from _lex_regex_with_line_states(lexer, text, state, line_states)
+        return
+
+    # The override yields the tokens; a shadow run of the standard loop, kept in step with it, records the states.
+    shadow = _lex_regex_with_line_states(lexer, text, state, line_states)
+    shadow_pos = -1
+    for token_tuple in lexer.get_tokens_unprocessed(text, stack=state):
+        while shadow_pos < token_tuple[0]:
+            shadow_token = next(shadow, None)
+            if shadow_token is None: break
+            shadow_pos = shadow_token[0]
+        yield token_tuple
+    for _ in shadow: pass
+
+def _lex_regex_with_line_states(lexer, text, state, line_states):
+    """Same loop as RegexLexer.get_tokens_unprocessed, additionally recording the state stack at line starts."""
+    pos, line_offset = 0, 0
+    tokendefs = lexer._tokens
+    statestack = list(state)
+    statetokens = tokendefs[statestack[-1]]
+    while 1:
+        for rexmatch, action, new_state in statetokens:
+            m = rexmatch(text, pos)
+            if m:
+                if action is not None:
+                    if type(action) is _TokenType:
+                        yield pos, action, m.group()
+                    else:
+                        yield from action(lexer, m)
+                end = m.end()
+                if new_state is not None:
+                    if isinstance(new_state, tuple):
+                        for new in new_state:
+                            if new == '#pop':
+                                if len(statestack) > 1: statestack.pop()
+                            elif new == '#push':
+                                statestack.append(statestack[-1])
+                            else:
+                                statestack.append(new)
+                    elif isinstance(new_state, int):
+                        if abs(new_state) >= len(statestack): del statestack[1:]
+                        else: del statestack[new_state:]
+                    elif new_state == '#push':
+                        statestack.append(statestack[-1])
+                    statetokens = tokendefs[statestack[-1]]
+                if end > pos:
+                    newlines = text.count('\n', pos, end)
+                    if newlines:
+                        line_offset += newlines
+                        if line_states is not None and text[end - 1] == '\n':
+                            line_states.append((line_offset, tuple(statestack)))
+                pos = end
+                break
+        else:
+            try:
+                if text[pos] == '\n':
+                    statestack = ['root']
+                    statetokens = tokendefs['root']
+                    yield pos, Whitespace, '\n'
+                    pos += 1
+                    line_offset += 1
+                    if line_states is not None: line_states.append((line_offset, ROOT_LEXER_STATE))
+                    continue
+                yield pos, Error, text[pos]
+                pos += 1
+            except IndexError:
+                break
+
+
+class DocumentHighlighter:
+    """
+    Keeps the Pygments tags of a Text widget up to date, remembering the lexer state at line starts.
+    In lazy mode only the visible lines plus a margin are tagged; the tagged region grows as the view
+    scrolls or resizes, and lexing resumes from the nearest remembered state instead of the top of the file.
+    Edits are re-highlighted incrementally: lexing restarts at the last unaffected line and stops as soon
+    as the new line states match the recorded ones again. Rules whose matches start before that line but
+    depend on text after the edit (such as Python docstrings) are only corrected by the next set_document.
+    """
+
+    def __init__(self, text_widget, margin=LAZY_HIGHLIGHT_MARGIN):
+        self.text_widget = text_widget
+        self.margin = margin
+        self.lexer = None
+        self.lazy = False
+        self.background = False
+        # False for lexers that can only start at the top of the document (see supports_line_states):
+        # their edits are re-highlighted by a background job instead of synchronously.
+        self.resumable = False
+        self.line_count = 0
+        self.line_states = []
+        self.tagged_lines = bytearray()
+        self._scroll_command = None
+        self._job_id = 0
+        self._job_queue = None
+        self._job_work = None
+        self._job_next_line = None
+        # Called with the edit proxy's arguments for every edit, whether or not a document is highlighted
+        self.edit_listeners = []
+        # Inside batch_edits(): the lines edited so far, re-highlighted once on exit
+        self._batched_lines = None
+
+    def attach(self):
+        """Hooks yscrollcommand, <Configure> and the widget's edit operations."""
+        widget = self.text_widget
+        self._scroll_command = widget.cget("yscrollcommand")
+        widget.configure(yscrollcommand=self._on_yscroll)
+        widget.bind("<Configure>", self._on_view_changed, add="+")
+
+        widget.tk.eval(_EDIT_PROXY_TCL)
+        original_command = widget._w + "_highlighter_orig"
+        widget.tk.call("rename", widget._w, original_command)
+        widget.tk.call("interp", "alias", "", widget._w, "", "::syntax_highlighter_edit_proxy",
+                       original_command, widget.register(self._on_edit))
+
+    def _on_yscroll(self, first, last):
+        if self._scroll_command:
+            self.text_widget.tk.call(*self.text_widget.tk.splitlist(self._scroll_command), first, last)
+        self._on_view_changed()
+
+    def _on_view_changed(self, event=None):
+        if self.lazy and self.lexer: self.highlight_visible()
+
+    def reset(self):
+        """Forgets the current document; edits are not highlighted until set_document is called again."""
+        self._cancel_background_job()
+        self.lexer = None
+        self.line_count = 0
+        self.line_states = []
+        self.tagged_lines = bytearray()
+
+    def set_document(self, lexer, lazy=False, background=False):
+        """
+        Forgets all recorded state and highlights the current widget content with ``lexer``.
+        With ``background``, tokenizing runs on a worker thread and the tags are applied in time slices.
+        """
+        widget = self.text_widget
+        self._cancel_background_job()
+        self.lexer = lexer
+        self.lazy = lazy
+        self.background = background
+        self.resumable = bool(lexer) and supports_line_states(lexer)
+        if lexer and not self.resumable:
+            logger.info(f"{type(lexer).__name__} cannot resume at line starts; edits are highlighted in the background.")
+        self.line_count = int(widget.index("end-1c").split('.')[0])
+        self.line_states = [None] * (self.line_count + 2)
+        self.line_states[1] = ROOT_LEXER_STATE
+        self.tagged_lines = bytearray(self.line_count + 2)
+        self.tagged_lines[0] = 1
+        if not lexer: return
+        try:
+            if lazy:
+                self.highlight_visible()
+            elif background:
+                self._start_background_job(1)
+            else:
+                self.highlight_lines(1, self.line_count)
+        except tk.TclError as e:
+            logger.error(f"TclError in set_document: {e}", exc_info=False)
+        except Exception as e:
+            logger.error(f"Unexpected error in set_document: {e}", exc_info=True)
+
+    def visible_lines(self):
+        """Returns the first and last line currently shown in the widget."""
+        widget = self.text_widget
+        first = int(widget.index("@0,0").split('.')[0])
+        last = int(widget.index(f"@0,{widget.winfo_height()}").split('.')[0])
+        return first, last
+
+    def highlight_visible(self):
+        """Tags the visible lines plus the margin, skipping lines that are already tagged."""
+        try:
+            first, last = self.visible_lines()
+            self.highlight_lines(first - self.margin, last + self.margin)
+        except tk.TclError as e:
+            logger.error(f"TclError in lazy highlighting: {e}", exc_info=False)
+        except Exception as e:
+            logger.error(f"Unexpected error in lazy highlighting: {e}", exc_info=True)
+
+    def highlight_lines(self, first_line, last_line):
+        """Ensures lines ``first_line`` through ``last_line`` are tagged."""
+        if not self.lexer: return
+        first_line, last_line = max(first_line, 1), min(last_line, self.line_count)
+        first_untagged = self.tagged_lines.find(0, first_line, last_line + 1)
+        if first_untagged == -1: return
+        last_untagged = self.tagged_lines.rfind(0, first_line, last_line + 1)
+        self._retag_lines(first_untagged, last_untagged)
+        logger.debug(f"Highlighted lines {first_untagged}-{last_untagged}.")
+
+    def _on_edit(self, first_index, last_index, end_before, end_after):
+        """Edit proxy callback: splices the per-line bookkeeping and re-highlights the edited lines."""
+        try:
+            for listener in self.edit_listeners:
+                listener(first_index, last_index, end_before, end_after)
+            if not self.lexer: return
+            if first_index == "0":
+                self.set_document(self.lexer, self.lazy, self.background)
+                return
+            first_line = min(int(first_index.split('.')[0]), self.line_count)
+            last_line = min(max(int(last_index.split('.')[0]), first_line), self.line_count)
+            line_delta = int(end_after.split('.')[0]) - int(end_before.split('.')[0])
+            new_last_line = last_line + line_delta
+
+            # States at the start of lines after first_line within the edit are unknown now; later ones
+            # keep their old values, which the re-lex compares against to detect convergence.
+            self.line_states[first_line + 1:last_line + 1] = [None] * (new_last_line - first_line)
+            self.tagged_lines[first_line:last_line + 1] = bytes(new_last_line - first_line + 1)
+            self.line_count += line_delta
+            if self._batched_lines is not None:
+                self._batched_lines.record(first_line, last_line, line_delta)
+                return
+            self._highlight_edited(first_line, new_last_line)
+        except tk.TclError as e:
+            logger.error(f"TclError re-highlighting edit: {e}", exc_info=False)
+        except Exception as e:
+            logger.error(f"Unexpected error re-highlighting edit: {e}", exc_info=True)
+
+    @contextlib.contextmanager
+    def batch_edits(self):
+        """
+        Context manager for applying many edits at once (such as a formatter's hunks): inside it each edit
+        only splices the per-line bookkeeping, and the edited line ranges are re-highlighted once on exit
+        instead of after every edit.
+        """
+        self._batched_lines = ChangedLines()
+        try:
+            yield
+        finally:
+            batched_lines, self._batched_lines = self._batched_lines, None
+            try:
+                self._highlight_batched(batched_lines.line_ranges(self.line_count))
+            except tk.TclError as e:
+                logger.error(f"TclError re-highlighting edits: {e}", exc_info=False)
+            except Exception as e:
+                logger.error(f"Unexpected error re-highlighting edits: {e}", exc_info=True)
+
+    def _highlight_batched(self, line_ranges):
+        """Re-highlights the merged ``line_ranges`` edited inside batch_edits(), top to bottom."""
+        if not line_ranges or not self.lexer: return
+        if self._job_next_line is not None or not self.resumable:
+            # One background job from the first edit covers them all
+            self._highlight_edited(*line_ranges[0])
+            return
+        limit_line = self.visible_lines()[1] + self.margin if self.lazy else self.line_count
+        for first_line, last_line in line_ranges:
+            # The re-lex of an earlier range may have run through this one
+            if self.tagged_lines.find(0, first_line, last_line + 1) == -1: continue
+            self._rehighlight_edit(first_line, last_line)
+            # Everything past the view was forgotten
+            if first_line > limit_line: break
+
+    def _highlight_edited(self, first_line, new_last_line):
+        """Re-highlights lines ``first_line`` through ``new_last_line`` after their bookkeeping was spliced."""
+        if self._job_next_line is not None:
+            # A background job is still working on the old text: restart it from the edit or from
+            # where it had got to, whichever comes first.
+            self._start_background_job(min(first_line, self._job_next_line))
+            return
+        if not self.resumable:
+            self._start_background_job(first_line)
+            return
+        self._rehighlight_edit(first_line, new_last_line)
+
+    def _rehighlight_edit(self, first_line, new_last_line):
+        """
+        Re-lexes from the edit in growing chunks until the line states converge with the recorded ones.
+        In lazy mode it gives up past the visible region and forgets the states and tags beyond it instead.
+        """
+        limit_line = self.line_count
+        if self.lazy:
+            limit_line = min(max(self.visible_lines()[1] + self.margin, new_last_line), self.line_count)
+            if first_line > limit_line:
+                self._forget_from(first_line)
+                return
+        # Tokens ending before first_line may still change when a match reaches into the edit, so retagging
+        # starts at the nearest recorded state rather than at the edited line itself.
+        line, chunk = first_line, INCREMENTAL_CHUNK_LINES
+        while self.line_states[line] is None: line -= 1
+        while True:
+            last_line = min(max(new_last_line, line + chunk), limit_line)
+            converged_line = self._retag_lines(line, last_line, converge_after=new_last_line)
+            if converged_line is not None:
+                logger.debug(f"Edit at lines {first_line}-{new_last_line} re-highlighted through line {converged_line - 1}.")
+                return
+            if last_line >= limit_line: break
+            line, chunk = last_line + 1, chunk * 2
+        if last_line < self.line_count: self._forget_from(last_line + 1)
+
+    def _forget_from(self, line):
+        """Drops the recorded states after ``line`` and marks lines from ``line`` on as untagged."""
+        self.line_states[line + 1:] = [None] * (len(self.line_states) - line - 1)
+        self.tagged_lines[line:] = bytes(len(self.tagged_lines) - line)
+
+    def _retag_lines(self, first_line, last_line, converge_after=None):
+        """
+        Lexes from the nearest recorded state at or before ``first_line`` and replaces the Pygments tags
+        of lines ``first_line`` through ``last_line``. With ``converge_after``, stops at the first line past
+        it whose new state equals the recorded one and returns that line (None if there was none).
+        """
+        start_line = first_line
+        while self.line_states[start_line] is None: start_line -= 1
+        tokens, converged_line = self._lex_lines(start_line, last_line, converge_after)
+        end_line = last_line if converged_line is None else converged_line - 1
+
+        widget = self.text_widget
+        for tag in widget.tag_names():
+            if tag.startswith("pygments_"): widget.tag_remove(tag, f"{first_line}.0", f"{end_line + 1}.0")
+        apply_tag_ranges(widget, group_token_ranges(tokens, start_line, 0, first_line=first_line, stop_line=end_line + 1))
+        self.tagged_lines[first_line:end_line + 1] = b'\x01' * (end_line - first_line + 1)
+        return converged_line
+
+    def _lex_lines(self, start_line, last_line, converge_after=None):
+        """
+        Lexes from ``start_line`` (which must have a recorded state) through ``last_line`` and records
+        the states reached at line starts. Since some rules (e.g. Python docstrings) look ahead, the lexer
+        also sees the next LEX_LOOKAHEAD_LINES lines, and more while a token runs to the end of what it saw;
+        a match depending on text even further on is only corrected by the next set_document.
+        """
+        widget = self.text_widget
+        head = widget.get(f"{start_line}.0", f"{last_line + 1}.0")
+        stop_offset = len(head)
+        lookahead = LEX_LOOKAHEAD_LINES
+        while True:
+            tail = widget.get(f"{last_line + 1}.0", f"{last_line + 1 + lookahead}.0")
+            code = head + tail
+            tokens, line_states = [], []
+            for token_tuple in lex_with_line_states(self.lexer, code, self.line_states[start_line], line_states):
+                if token_tuple[0] >= stop_offset: break
+                tokens.append(token_tuple)
+            at_end = tail.count('\n') < lookahead
+            if at_end or not tokens or tokens[-1][0] + len(tokens[-1][2]) < len(code): break
+            lookahead *= 2
+
+        old_states = self.line_states[start_line + 1:last_line + 2]
+        self.line_states[start_line + 1:last_line + 2] = [None] * len(old_states)
+        for line_offset, state in line_states:
+            line = start_line + line_offset
+            if line > last_line + 1: break
+            if converge_after is not None and line > converge_after and old_states[line_offset - 1] == state:
+                self.line_states[line:last_line + 2] = old_states[line_offset - 1:]
+                return tokens, line
+            self.line_states[line] = state
+        return tokens, None
+
+    def _cancel_background_job(self):
+        """Invalidates the running background job; its worker stops and its queued batches are dropped."""
+        self._job_id += 1
+        self._job_queue = None
+        self._job_work = None
+        self._job_next_line = None
+
+    def _start_background_job(self, from_line):
+        """Snapshots the text from the nearest recorded state at or before ``from_line`` and tokenizes it on a worker thread."""
+        while self.line_states[from_line] is None: from_line -= 1
+        self._cancel_background_job()
+        job_id = self._job_id
+        self._job_queue = queue.Queue()
+        self._job_next_line = from_line
+        code = self.text_widget.get(f"{from_line}.0", tk.END)
+        worker = threading.Thread(
+            target=self._tokenize_job,
+            args=(job_id, self.lexer, code, from_line, self.line_states[from_line], self._job_queue),
+            name=f"highlight-job-{job_id}", daemon=True)
+        worker.start()
+        self.text_widget.after(BACKGROUND_POLL_MS, self._apply_job_batches, job_id)
+        logger.debug(f"Background highlight job {job_id} started at line {from_line}.")
+
+    def _tokenize_job(self, job_id, lexer, code, start_line, state, out_queue):
+        """
+        Worker thread: lexes ``code`` (which starts at ``start_line``) and queues one batch per
+        BACKGROUND_BATCH_LINES lines as ``(start_index, end_index, end_line, ranges_by_tag, line_states)``,
+        followed by None. Never touches the widget; stops as soon as the job is cancelled.
+        """
+        try:
+            line_states = []
+            batch, batch_line, batch_col = [], start_line, 0
+            line, col, flushed_states = start_line, 0, 0
+            for token_tuple in lex_with_line_states(lexer, code, state, line_states):
+                if job_id != self._job_id: return
+                if line - batch_line >= BACKGROUND_BATCH_LINES:
+                    states = [(start_line + offset, st) for offset, st in line_states[flushed_states:]]
+                    flushed_states = len(line_states)
+                    out_queue.put((f"{batch_line}.{batch_col}", f"{line}.{col}", line,
+                                   group_token_ranges(batch, batch_line, batch_col), states))
+                    batch, batch_line, batch_col = [], line, col
+                batch.append(token_tuple)
+                value = token_tuple[-1]
+                newlines = value.count('\n')
+                if newlines: line, col = line + newlines, len(value) - value.rfind('\n') - 1
+                else: col += len(value)
+            states = [(start_line + offset, st) for offset, st in line_states[flushed_states:]]
+            out_queue.put((f"{batch_line}.{batch_col}", tk.END, line,
+                           group_token_ranges(batch, batch_line, batch_col), states))
+            out_queue.put(None)
+        except Exception as e:
+            logger.error(f"Unexpected error in background highlight job {job_id}: {e}", exc_info=True)
+            out_queue.put(None)
+
+    def _apply_job_batches(self, job_id):
+        """UI thread: applies queued batches for at most BACKGROUND_APPLY_BUDGET_MS, then yields to the event loop."""
+        if job_id != self._job_id: return
+        deadline = time.perf_counter() + BACKGROUND_APPLY_BUDGET_MS / 1000
+        try:
+            while time.perf_counter() < deadline:
+                if self._job_work is None:
+                    try:
+                        batch = self._job_queue.get_nowait()
+                    except queue.Empty:
+                        self.text_widget.after(BACKGROUND_POLL_MS, self._apply_job_batches, job_id)
+                        return
+                    if batch is None:
+                        logger.debug(f"Background highlight job {job_id} finished.")
+                        self._cancel_background_job()
+                        return
+                    self._job_work = self._apply_batch(*batch)
+                for _ in self._job_work:
+                    if time.perf_counter() >= deadline: break
+                else:
+                    self._job_work = None
+        except tk.TclError as e:
+            logger.error(f"TclError applying background highlight batch: {e}", exc_info=False)
+            self._cancel_background_job()
+            return
+        self.text_widget.after(1, self._apply_job_batches, job_id)
+
+    def _apply_batch(self, start_index, end_index, end_line, ranges_by_tag, line_states):
+        """Generator applying one batch, yielding after every widget call so it can be time-sliced."""
+        widget = self.text_widget
+        for tag in widget.tag_names():
+            if tag.startswith("pygments_"):
+                widget.tag_remove(tag, start_index, end_index)
+                yield
+        step = TAG_ADD_BATCH_SIZE * 2
+        for tag_name, indices in ranges_by_tag.items():
+            for i in range(0, len(indices), step):
+                widget.tag_add(tag_name, *indices[i:i + step])
+                yield
+        start_line = int(start_index.split('.')[0])
+        end_line = min(end_line, self.line_count)
+        self.line_states[start_line + 1:end_line + 1] = [None] * (end_line - start_line)
+        for line, state in line_states: self.line_states[line] = state
+        self.tagged_lines[start_line:end_line] = b'\x01' * (end_line - start_line)
+        if end_index == tk.END: self.tagged_lines[end_line] = 1
+        self._job_next_line = end_line
+
+
+def get_css_class_for_token(token_type):
+    """CSS class name for a token type in exported HTML, e.g. ``tok-Literal-String-Doc``."""
+    return "-".join(["tok", *token_type]) if token_type else "tok"
+
+def _export_style_table():
+    """Maps every configured token type to its merged TOKEN_CONFIG options (inherited options included)."""
+    return {token_type: _merge_inherited_config(token_type) for token_type in TOKEN_CONFIG}
+
+def _resolve_export_type(token_type, cache):
+    """Nearest configured ancestor of ``token_type`` (None if there is none), memoized in ``cache``."""
+    if token_type in cache: return cache[token_type]
+    resolved = token_type
+    while resolved is not None and resolved not in TOKEN_CONFIG:
+        resolved = resolved.parent
+    cache[token_type] = resolved
+    return resolved
+
+def _font_style_parts(config):
+    font = config.get('font')
+    return font[2].split() if font and len(font) > 2 else []
+
+def export_css(selector="pre.highlight"):
+    """Returns a stylesheet with one rule per configured token type for the current style."""
+    style = get_style_by_name(CURRENT_PYGMENTS_STYLE_NAME)
+    text_config = TOKEN_CONFIG.get(Token.Text, {})
+    rules = [f"{selector} {{ background-color: {style.background_color}; color: {text_config.get('foreground', 'inherit')}; }}"]
+    for token_type, config in _export_style_table().items():
+        declarations = []
+        if config.get('foreground'): declarations.append(f"color: {config['foreground']}")
+        if config.get('background'): declarations.append(f"background-color: {config['background']}")
+        parts = _font_style_parts(config)
+        if 'bold' in parts: declarations.append("font-weight: bold")
+        if 'italic' in parts: declarations.append("font-style: italic")
+        if config.get('underline'): declarations.append("text-decoration: underline")
+        if declarations:
+            rules.append(f"{selector} .{get_css_class_for_token(token_type)} {{ {'; '.join(declarations)}; }}")
+    return "\n".join(rules) + "\n"
+
+def _ansi_color(hex_color, background=False):
+    hex_color = hex_color.lstrip('#')
+    if len(hex_color) == 3: hex_color = "".join(c * 2 for c in hex_color)
+    try:
+        r, g, b = int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16)
+    except ValueError:
+        return None
+    return f"{48 if background else 38};2;{r};{g};{b}"
+
+def ansi_codes():
+    """Maps every configured token type to the truecolor ANSI escape sequence for its merged options."""
+    codes = {}
+    for token_type, config in _export_style_table().items():
+        params = []
+        parts = _font_style_parts(config)
+        if 'bold' in parts: params.append("1")
+        if 'italic' in parts: params.append("3")
+        if config.get('underline'): params.append("4")
+        if config.get('foreground'): params.append(_ansi_color(config['foreground']))
+        if config.get('background'): params.append(_ansi_color(config['background'], background=True))
+        params = [param for param in params if param]
+        codes[token_type] = f"\x1b[{';'.join(params)}m" if params else ""
+    return codes
+
+def iter_export_tokens(lexer, lines, chunk_lines=EXPORT_CHUNK_LINES):
+    """
+    Yields ``(token_type, value)`` for the text made of ``lines`` (any iterable of strings, e.g. an open
+    file), holding only about ``chunk_lines`` lines at a time. Lexers that support line states are lexed
+    chunk by chunk, resuming from the state recorded at the last line boundary; tokens after that boundary
+    are lexed again with the next chunk. Rules that look further ahead than a quarter of a chunk may
+    therefore differ from lexing the whole file, as in the editor. Other lexers need the whole text, as
+    does the rest of the file when EXPORT_MAX_CHUNKS_WITHOUT_BOUNDARY chunks pass without a boundary.
+    """
+    if not supports_line_states(lexer):
+        yield from ((token_type, value) for _index, token_type, value in lexer.get_tokens_unprocessed("".join(lines)))
+        return
+    state = ROOT_LEXER_STATE
+    pending = []
+    lookahead = max(chunk_lines // 4, 1)
+    lines = iter(lines)
+    exhausted = False
+    chunks_without_boundary = 0
+    while not exhausted or pending:
+        target = len(pending) + chunk_lines
+        for line in lines:
+            pending.append(line)
+            if len(pending) >= target: break
+        else:
+            exhausted = True
+        text = "".join(pending)
+        line_states = []
+        if not exhausted and chunks_without_boundary >= EXPORT_MAX_CHUNKS_WITHOUT_BOUNDARY:
+            logger.debug(f"No line boundary in {len(pending)} lines; lexing the rest of the file at once.")
+            text += "".join(lines)
+            exhausted = True
+        if exhausted:
+            for _index, token_type, value in lex_with_line_states(lexer, text, state):
+                yield token_type, value
+            return
+        # Commit up to the last line boundary that leaves enough lookahead text behind it
+        tokens = list(lex_with_line_states(lexer, text, state, line_states))
+        boundary = None
+        for line_offset, line_state in reversed(line_states):
+            if line_offset <= len(pending) - lookahead:
+                boundary = (line_offset, line_state)
+                break
+        if boundary is None:
+            # A single token spans the whole chunk: read more lines before committing anything
+            chunks_without_boundary += 1
+            continue
+        chunks_without_boundary = 0
+        line_offset, state = boundary
+        stop = sum(len(line) for line in pending[:line_offset])
+        for index, token_type, value in tokens:
+            if index >= stop: break
+            # A boundary may fall inside a whitespace token
+            yield token_type, value[:stop - index]
+        del pending[:line_offset]
+
+def iter_export(lexer, lines, fmt="html", chunk_lines=EXPORT_CHUNK_LINES, write_chunk_size=EXPORT_WRITE_CHUNK_SIZE):
+    """
+    Yields the highlighted text of ``lines`` as ``fmt`` ("html" spans carrying the export_css classes, or
+    "ansi" escape sequences) in string chunks of about ``write_chunk_size`` characters.
+    The current style (see initialize_style) decides the classes and colors.
+    """
+    if fmt not in ("html", "ansi"):
+        raise ValueError(f"Unknown export format: {fmt}")
+    codes = ansi_codes() if fmt == "ansi" else None
+    resolve_cache = {}
+    out, size = [], 0
+    current_type, current_values = None, []
+
+    def render(token_type, text):
+        if fmt == "html":
+            text = html.escape(text, quote=False)
+            return f'<span class="{get_css_class_for_token(token_type)}">{text}</span>' if token_type is not None else text
+        code = codes.get(token_type) if token_type is not None else None
+        if not code: return text
+        # Reset before every newline so pagers and partial output never bleed colors across lines
+        return "\n".join(f"{code}{segment}\x1b[0m" if segment else segment for segment in text.split("\n"))
+
+    for token_type, value in iter_export_tokens(lexer, lines, chunk_lines):
+        export_type = _resolve_export_type(token_type, resolve_cache)
+        if export_type is current_type:
+            current_values.append(value)
+            continue
+        if current_values:
+            rendered = render(current_type, "".join(current_values))
+            out.append(rendered)
+            size += len(rendered)
+            if size >= write_chunk_size:
+                yield "".join(out)
+                out, size = [], 0
+        current_type, current_values = export_type, [value]
+    if current_values:
+        out.append(render(current_type, "".join(current_values)))
+    if out:
+        yield "".join(out)
+
+def export_file(source_path, out, fmt="html", lexer=None, full_document=True, stylesheet_href=None):
+    """
+    Writes the highlighted contents of ``source_path`` to the writable text stream ``out`` in chunks.
+    HTML output is a standalone page with the export_css stylesheet unless ``full_document`` is false;
+    with ``stylesheet_href`` the page links to that stylesheet instead of embedding it.
+    """
+    with open(source_path, 'r', encoding='utf-8', errors='replace') as f:
+        if lexer is None:
+            lexer = get_lexer(source_path, f.read(LEXER_ANALYSIS_PREFIX))
+            f.seek(0)
+        if fmt == "html" and full_document:
+            title = html.escape(os.path.basename(source_path))
+            if stylesheet_href:
+                style = f'<link rel="stylesheet" href="{html.escape(stylesheet_href)}">\n'
+            else:
+                style = f'<style>\n{export_css()}</style>\n'
+            out.write(f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{title}</title>\n'
+                      f'{style}</head>\n<body>\n<pre class="highlight">')
+        elif fmt == "html":
+            out.write('<pre class="highlight">')
+        for chunk in iter_export(lexer, f, fmt):
+            out.write(chunk)
+        if fmt == "html":
+            out.write("</pre>\n</body>\n</html>\n" if full_document else "</pre>\n")
+    logger.debug(f"Exported {source_path} as {fmt} using {type(lexer).__name__}")
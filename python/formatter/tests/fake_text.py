@@ -0,0 +1,153 @@
+"""
+In-memory stand-in for a tk.Text, so the highlighting code can be tested without a display.
+
+Models what DocumentHighlighter and the edit helpers in main.py use: "line.col", "line.end" and "end"
+indices with "+Nc"/"-Nc" offsets, the trailing newline Tk always keeps, tags (inserted text takes the tags
+present on both sides, as in Tk) and after() callbacks, which run_pending() executes.
+"""
+import re
+import time
+from bisect import bisect_right
+
+_INDEX = re.compile(r'^(end|\d+\.(?:\d+|end))((?:\s*[+-]\s*\d+\s*c(?:hars)?)*)$')
+_OFFSET = re.compile(r'([+-])\s*(\d+)')
+
+
+class FakeText:
+
+    def __init__(self, text=""):
+        self.text = "\n"
+        self.tags = {}
+        self.pending = []
+        self._line_starts = None
+        if text:
+            self.insert("1.0", text)
+
+    def __str__(self):
+        return f".fake_text_{id(self)}"
+
+    def _starts(self):
+        if self._line_starts is None:
+            starts, i = [0], self.text.find('\n')
+            while i != -1:
+                starts.append(i + 1)
+                i = self.text.find('\n', i + 1)
+            self._line_starts = starts
+        return self._line_starts
+
+    def offset(self, index):
+        """Character offset of a Tk index, clamped to the text like Tk does."""
+        m = _INDEX.match(str(index).strip())
+        if m is None:
+            raise ValueError(f"unsupported index {index!r}")
+        base, modifiers = m.groups()
+        starts = self._starts()
+        line_count = len(starts) - 1
+        if base == 'end':
+            offset = len(self.text)
+        else:
+            line, col = base.split('.')
+            line = max(int(line), 1)
+            if line > line_count:
+                offset = len(self.text)
+            else:
+                length = starts[line] - 1 - starts[line - 1]
+                offset = starts[line - 1] + (length if col == 'end' else min(int(col), length))
+        for sign, amount in _OFFSET.findall(modifiers):
+            offset += int(amount) if sign == '+' else -int(amount)
+        return max(0, min(offset, len(self.text)))
+
+    def _index(self, offset):
+        starts = self._starts()
+        line = bisect_right(starts, offset)
+        if line > len(starts) - 1:
+            return f"{line}.0"
+        return f"{line}.{offset - starts[line - 1]}"
+
+    def index(self, index):
+        return self._index(self.offset(index))
+
+    def get(self, start, end=None):
+        first = self.offset(start)
+        last = self.offset(end) if end is not None else first + 1
+        return self.text[first:last]
+
+    def insert(self, index, chars, *tags):
+        # Nothing goes after the final newline
+        at = min(self.offset(index), len(self.text) - 1)
+        for name, flags in self.tags.items():
+            inherited = at > 0 and flags[at - 1] and flags[at]
+            flags[at:at] = (b'\x01' if inherited else b'\x00') * len(chars)
+        self.text = self.text[:at] + chars + self.text[at:]
+        self._line_starts = None
+
+    def delete(self, start, end=None):
+        first = min(self.offset(start), len(self.text) - 1)
+        last = min(self.offset(end) if end is not None else first + 1, len(self.text) - 1)
+        if last <= first:
+            return
+        for flags in self.tags.values():
+            del flags[first:last]
+        self.text = self.text[:first] + self.text[last:]
+        self._line_starts = None
+
+    def _flags(self, name):
+        if name not in self.tags:
+            self.tags[name] = bytearray(len(self.text))
+        return self.tags[name]
+
+    def tag_configure(self, name, **options):
+        self._flags(name)
+
+    def tag_names(self, index=None):
+        return tuple(self.tags)
+
+    def tag_add(self, name, *indices):
+        flags = self._flags(name)
+        for i in range(0, len(indices), 2):
+            first, last = self.offset(indices[i]), self.offset(indices[i + 1])
+            if last > first:
+                flags[first:last] = b'\x01' * (last - first)
+
+    def tag_remove(self, name, start, end=None):
+        flags = self._flags(name)
+        first = self.offset(start)
+        last = self.offset(end) if end is not None else first + 1
+        if last > first:
+            flags[first:last] = bytes(last - first)
+
+    def cget(self, option):
+        return "#272822"
+
+    def after(self, ms, callback, *args):
+        self.pending.append((callback, args))
+
+    def run_pending(self, timeout=10):
+        """Runs after() callbacks until none are left (background highlight jobs poll a worker thread)."""
+        deadline = time.monotonic() + timeout
+        while self.pending:
+            if time.monotonic() > deadline:
+                raise TimeoutError("after() callbacks still pending")
+            callback, args = self.pending.pop(0)
+            callback(*args)
+            if self.pending:
+                time.sleep(0.001)
+
+    def char_tags(self, prefix="pygments_"):
+        """Per character of the content (without the final newline), the set of tags named ``prefix``..."""
+        names = [name for name in self.tags if name.startswith(prefix)]
+        return [frozenset(name for name in names if self.tags[name][i]) for i in range(len(self.text) - 1)]
+
+
+def edit(widget, highlighter, op, *args):
+    """Performs an insert or delete on ``widget`` and reports it to ``highlighter._on_edit`` as the edit proxy does."""
+    first = widget.index(args[0])
+    if op == "insert":
+        last = first
+    elif len(args) > 1:
+        last = widget.index(args[1])
+    else:
+        last = widget.index(f"{first}+1c")
+    end_before = widget.index("end")
+    getattr(widget, op)(*args)
+    highlighter._on_edit(first, last, end_before, widget.index("end"))
@@ -0,0 +1,96 @@
+"""Cancelling a job must stop (or drop) its formatter run on every backend and free the backend for the next run."""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import inprocess_formatters
+from background_jobs import Job, JobCancelled, JobRunner
+from fake_text import FakeText
+from formatter_pool import FormatterPool, RequestCancelled
+from formatters import run_formatter
+
+
+def _cancel_after(job, seconds):
+    timer = threading.Timer(seconds, job.cancel)
+    timer.start()
+    return timer
+
+def test_subprocess_is_killed():
+    job = Job("format")
+    _cancel_after(job, 0.2)
+    start = time.monotonic()
+    with pytest.raises(JobCancelled):
+        run_formatter("slow", [sys.executable, "-c", "import time; time.sleep(30)"], "", False, job=job)
+    assert time.monotonic() - start < 5
+
+def test_pool_request_kills_worker_and_frees_the_lock():
+    pool = FormatterPool()
+    try:
+        pool.format("stub", "warm up\n")
+        cancelled = threading.Event()
+        threading.Timer(0.2, cancelled.set).start()
+        start = time.monotonic()
+        with pytest.raises(RequestCancelled):
+            pool.format("stub", "x\n", options={'delay': 30}, cancelled=cancelled)
+        assert time.monotonic() - start < 5
+        # The next request gets a fresh worker instead of waiting behind the stale one
+        assert pool.format("stub", "y\n") == "y\n"
+    finally:
+        pool.shutdown()
+
+def test_pool_run_raises_job_cancelled(monkeypatch):
+    pool = FormatterPool()
+    def cancelled_format(*args, **kwargs):
+        raise RequestCancelled()
+    monkeypatch.setattr(pool, "format", cancelled_format)
+    monkeypatch.setattr(pool, "supports", lambda formatter: True)
+    with pytest.raises(JobCancelled):
+        run_formatter("prettier", ["prettier", "--stdin-filepath", "temp.js"], "a", False, pool, Job("format"))
+
+def test_in_process_run_stops_waiting_and_drops_queued_runs(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    started = []
+    def slow_format(code):
+        started.append(code)
+        release.wait(30)
+        return code
+    monkeypatch.setattr(inprocess_formatters, "format_code",
+                        lambda formatter, code, options=None: executor.submit(slow_format, code))
+    try:
+        running, queued = Job("format"), Job("format")
+        results = {}
+        def run(name, job):
+            try:
+                results[name] = run_formatter("autopep8", [], name, True, job=job)
+            except JobCancelled:
+                results[name] = "cancelled"
+        threads = [threading.Thread(target=run, args=(name, job)) for name, job in (("running", running), ("queued", queued))]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.1)
+        running.cancel()
+        queued.cancel()
+        for thread in threads:
+            thread.join(5)
+        assert results == {"running": "cancelled", "queued": "cancelled"}
+        # Only the run that had started is left on the in-process thread
+        release.set()
+        executor.shutdown(wait=True)
+        assert started == ["running"]
+    finally:
+        release.set()
+
+def test_runner_drops_superseded_results():
+    widget = FakeText()
+    runner = JobRunner(widget)
+    delivered = []
+    gate = threading.Event()
+    runner.submit("format", lambda job: gate.wait(5) and "stale", delivered.append)
+    runner.submit("format", lambda job: "fresh", delivered.append)
+    gate.set()
+    widget.run_pending()
+    assert delivered == ["fresh"]
@@ -0,0 +1,21 @@
+import os
+
+from batch_export import export_tree
+from benchmark import generate_corpus
+
+
+def test_export_tree_exports_then_skips_unchanged(tmp_path):
+    source = tmp_path / "src"
+    (source / "pkg").mkdir(parents=True)
+    _filename, code = generate_corpus("json", 200000)
+    (source / "data.json").write_text(code, encoding='utf-8')
+    (source / "pkg" / "mod.py").write_text("def f(x):\n    return '<x>'\n", encoding='utf-8')
+    (source / "blob.bin").write_bytes(b"\0\1\2")
+    output = tmp_path / "out"
+
+    assert export_tree(str(source), str(output), jobs=2) == {"exported": 2, "binary": 1}
+    html = (output / "pkg" / "mod.py.html").read_text(encoding='utf-8')
+    assert "&lt;x&gt;" in html
+    assert os.path.getsize(output / "data.json.html") > len(code)
+
+    assert export_tree(str(source), str(output), jobs=2) == {"unchanged": 2, "binary": 1}
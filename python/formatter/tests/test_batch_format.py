@@ -0,0 +1,95 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import batch_format
+from batch_format import EXIT_ERRORS, EXIT_NEEDS_FORMATTING, EXIT_OK, exit_code, format_tree
+
+FORMATTER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Strips trailing whitespace; fails on input containing "syntax error"
+FAKE_GOFMT = """#!{python}
+import sys
+code = sys.stdin.read()
+if "syntax error" in code:
+    sys.exit("fake gofmt: syntax error")
+sys.stdout.write("".join(line.rstrip() + "\\n" for line in code.splitlines()))
+"""
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """A directory to format, with a fake gofmt on PATH and the manifests kept in tmp_path."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    gofmt = bin_dir / "gofmt"
+    gofmt.write_text(FAKE_GOFMT.format(python=sys.executable), encoding='utf-8')
+    gofmt.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bin_dir) + os.pathsep + os.environ["PATH"])
+    monkeypatch.setattr(batch_format, "MANIFEST_DIR", str(tmp_path / "manifests"))
+    monkeypatch.setattr(batch_format, "_formatter_identities", lambda formatters: {"gofmt": [str(gofmt), 1, "fake"]})
+    root = tmp_path / "src"
+    root.mkdir()
+    return root
+
+def _run(root, check=True, **kwargs):
+    report = format_tree(str(root), check=check, jobs=2, **kwargs)
+    return report, exit_code(report)
+
+def test_check_exit_codes(tree):
+    (tree / "ok.go").write_text("package main\n", encoding='utf-8')
+    assert _run(tree)[1] == EXIT_OK
+
+    (tree / "bad.go").write_text("package main   \n", encoding='utf-8')
+    report, code = _run(tree)
+    assert code == EXIT_NEEDS_FORMATTING
+    assert {result['path']: result['status'] for result in report['files']} == {"ok.go": "skipped", "bad.go": "would_reformat"}
+    assert (tree / "bad.go").read_text(encoding='utf-8') == "package main   \n"
+
+    (tree / "broken.go").write_text("syntax error\n", encoding='utf-8')
+    assert _run(tree)[1] == EXIT_ERRORS
+
+def test_format_then_check(tree):
+    (tree / "bad.go").write_text("package main   \n", encoding='utf-8')
+    report, code = _run(tree, check=False)
+    assert code == EXIT_OK and report['summary'] == {"formatted": 1}
+    assert (tree / "bad.go").read_text(encoding='utf-8') == "package main\n"
+    assert _run(tree, force=True)[0]['summary'] == {"unchanged": 1}
+
+def test_missing_formatter_fails_unless_skipped(tree):
+    (tree / "script.py").write_text("x=1\n", encoding='utf-8')
+    (tree / "ok.go").write_text("package main\n", encoding='utf-8')
+    report, code = _run(tree)
+    assert code == EXIT_ERRORS
+    assert report['missing_formatters'] == ["autopep8"]
+    assert exit_code(report, skip_missing=True) == EXIT_OK
+
+def test_manifest_is_kept_outside_the_tree(tree):
+    (tree / "ok.go").write_text("package main\n", encoding='utf-8')
+    _run(tree)
+    assert os.listdir(tree) == ["ok.go"]
+    manifest_path = batch_format.default_manifest_path(str(tree))
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        assert list(json.load(f)['files']) == ["ok.go"]
+
+def test_unwritable_manifest_does_not_fail_the_run(tree, tmp_path):
+    (tree / "ok.go").write_text("package main\n", encoding='utf-8')
+    (tmp_path / "file").write_text("", encoding='utf-8')
+    assert _run(tree, manifest_path=str(tmp_path / "file" / "manifest.json"))[1] == EXIT_OK
+
+def test_main_check_does_not_import_the_gui(tmp_path):
+    root = tmp_path / "src"
+    root.mkdir()
+    (root / "notes.txt").write_text("nothing to format\n", encoding='utf-8')
+    # Importing a module mapped to None raises ImportError
+    script = ("import runpy, sys\n"
+              "sys.modules['customtkinter'] = sys.modules['tkinterdnd2'] = None\n"
+              f"sys.argv = ['main.py', '--check', {str(root)!r}, '--manifest', {str(tmp_path / 'manifest.json')!r}]\n"
+              "runpy.run_path('main.py', run_name='__main__')\n")
+    process = subprocess.run([sys.executable, "-c", script], cwd=FORMATTER_DIR, capture_output=True, text=True,
+                             env=dict(os.environ, HOME=str(tmp_path)), timeout=60)
+    assert process.returncode == EXIT_OK, process.stderr
+    assert json.loads(process.stdout)['summary'] == {"unsupported": 1}
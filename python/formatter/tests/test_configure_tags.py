@@ -0,0 +1,33 @@
+from fake_text import FakeText
+from syntax_highlighter import configure_tags
+
+
+class CountingText(FakeText):
+    """FakeText named like a Tk widget path, counting tag_configure calls."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.configured = 0
+
+    def __str__(self):
+        return self.path
+
+    def tag_configure(self, name, **options):
+        self.configured += 1
+        super().tag_configure(name, **options)
+
+def test_reapplying_the_style_configures_nothing():
+    widget = CountingText(".text")
+    assert configure_tags(widget, "monokai") is True
+    configured = widget.configured
+    assert configured > 0
+    assert configure_tags(widget, "monokai") is False
+    assert widget.configured == configured
+
+def test_new_widget_with_a_reused_path_is_configured():
+    configure_tags(CountingText(".dialog.text"), "monokai")
+    # Tk reuses the path name of a destroyed widget
+    widget = CountingText(".dialog.text")
+    assert configure_tags(widget, "monokai") is True
+    assert widget.configured > 0
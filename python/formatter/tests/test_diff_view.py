@@ -0,0 +1,107 @@
+"""The Myers diff in diff_view against difflib and a dynamic-programming LCS, on seeded random inputs."""
+import difflib
+import random
+
+import pytest
+
+import diff_view
+from diff_view import diff_lines, get_opcodes, group_hunks, matching_blocks, split_lines
+
+
+def _random_pair(rng, alphabet, max_length):
+    a = [rng.choice(alphabet) for _ in range(rng.randint(0, max_length))]
+    b = list(a)
+    for _ in range(rng.randint(0, 6)):
+        position = rng.randint(0, len(b))
+        if rng.random() < 0.5 and b:
+            del b[position:position + rng.randint(1, 4)]
+        else:
+            b[position:position] = [rng.choice(alphabet) for _ in range(rng.randint(1, 4))]
+    return a, b
+
+def _lcs_length(a, b):
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for j, y in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+def _apply(opcodes, a, b):
+    result = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        result.extend(a[i1:i2] if tag == 'equal' else b[j1:j2])
+    return result
+
+def _check_opcodes(opcodes, a, b):
+    i = j = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        if tag == 'equal':
+            assert a[i1:i2] == b[j1:j2]
+        i, j = i2, j2
+    assert (i, j) == (len(a), len(b))
+    assert _apply(opcodes, a, b) == b
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_myers_finds_a_longest_common_subsequence(seed, monkeypatch):
+    # Dropping very common items among changed ones (_kept_indices) trades minimality for speed, as GNU
+    # diff does; without it the search is exact.
+    monkeypatch.setattr(diff_view, "_kept_indices", lambda items, other_counts: list(range(len(items))))
+    rng = random.Random(seed)
+    a, b = _random_pair(rng, "abcdefgh"[:rng.randint(2, 8)], 40)
+    opcodes = get_opcodes(a, b, max_cost=1000)
+    _check_opcodes(opcodes, a, b)
+    matched = sum(size for _i, _j, size in matching_blocks(a, b, max_cost=1000))
+    assert matched == _lcs_length(a, b)
+    reference = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    assert matched >= sum(block.size for block in reference.get_matching_blocks())
+
+@pytest.mark.parametrize("seed", range(200))
+def test_opcodes_rebuild_b(seed):
+    rng = random.Random(seed)
+    a, b = _random_pair(rng, "abcdefgh"[:rng.randint(2, 8)], 40)
+    opcodes = get_opcodes(a, b)
+    _check_opcodes(opcodes, a, b)
+
+@pytest.mark.parametrize("seed", range(20))
+def test_large_inputs_stay_valid(seed):
+    rng = random.Random(seed)
+    lines = [f"line {rng.randint(0, 300)}\n" for _ in range(3000)]
+    a, b = _random_pair(rng, lines, 3000)
+    if seed % 2:
+        # A wholesale rewrite, past DIFF_MAX_COST
+        rng.shuffle(b)
+    _check_opcodes(get_opcodes(a, b), a, b)
+
+@pytest.mark.parametrize("seed", range(50))
+def test_group_hunks_matches_difflib(seed):
+    rng = random.Random(seed)
+    a, b = _random_pair(rng, "abcde", 60)
+    opcodes = get_opcodes(a, b)
+    if all(tag == 'equal' for tag, *_ in opcodes):
+        assert group_hunks(opcodes) == []
+        return
+    reference = difflib.SequenceMatcher(None, a, b)
+    reference.get_opcodes = lambda: list(opcodes)
+    for context in (0, 1, 3):
+        assert group_hunks(opcodes, context) == [list(map(tuple, hunk)) for hunk in reference.get_grouped_opcodes(context)]
+
+def test_diff_lines_keeps_line_endings():
+    old_lines, new_lines, opcodes = diff_lines("a\nb\nc", "a\nB\nc\n")
+    assert old_lines == ["a\n", "b\n", "c"]
+    assert _apply(opcodes, old_lines, new_lines) == new_lines
+
+@pytest.mark.parametrize("text", ["", "a", "a\n", "\n\n", "a\r\nb\rc\n", "x\x0cy\n\x1cz\u2028w\x85v\x0b"])
+def test_split_lines_splits_on_newline_only(text):
+    lines = split_lines(text)
+    assert "".join(lines) == text
+    assert len(lines) == text.count('\n') + (not text.endswith('\n') and text != "")
+    assert all(line.count('\n') == 1 and line.endswith('\n') for line in lines[:-1])
+
+def test_diff_lines_numbers_lines_like_tk():
+    old_lines, new_lines, opcodes = diff_lines("x = 1\n\x0c\ny=2\n", "x = 1\n\x0c\ny = 2\n")
+    assert old_lines == ["x = 1\n", "\x0c\n", "y=2\n"]
+    assert [op for op in opcodes if op[0] != 'equal'] == [('replace', 2, 3, 2, 3)]
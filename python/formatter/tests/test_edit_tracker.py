@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from edit_tracker import ChangedLines
+from fake_text import FakeText
+
+
+def _edit(widget, changed, op, *args):
+    """Performs an insert or delete on ``widget`` and reports it to ``changed`` as the edit proxy does."""
+    first = widget.index(args[0])
+    last = first if op == "insert" else widget.index(args[1])
+    end_before = widget.index("end")
+    getattr(widget, op)(*args)
+    changed.on_edit(first, last, end_before, widget.index("end"))
+
+def _flagged_ranges(flags):
+    ranges = []
+    for line, flagged in enumerate(flags, 1):
+        if not flagged: continue
+        if ranges and ranges[-1][1] == line - 1:
+            ranges[-1] = (ranges[-1][0], line)
+        else:
+            ranges.append((line, line))
+    return ranges
+
+@pytest.mark.parametrize("first, last, delta, expected", [
+    # Inserted lines after, before and inside a recorded range
+    (20, 20, 2, [(5, 6), (20, 22)]),
+    (1, 1, 2, [(1, 3), (7, 8)]),
+    (5, 5, 3, [(5, 9)]),
+    # Deleting lines that end inside the range pulls the rest of it up
+    (3, 6, -3, [(3, 3)]),
+    # Adjacent ranges merge
+    (7, 7, 0, [(5, 7)]),
+    (4, 4, 0, [(4, 6)]),
+])
+def test_record(first, last, delta, expected):
+    changed = ChangedLines()
+    changed.record(5, 6, 0)
+    changed.record(first, last, delta)
+    assert changed.ranges == expected
+
+def test_random_edits_match_a_line_model():
+    """After any sequence of edits, the recorded ranges are exactly the lines an edit touched."""
+    rng = random.Random(7)
+    widget = FakeText("".join(f"line {i}\n" for i in range(30)))
+    changed = ChangedLines()
+    flags = [False] * 31
+    for _ in range(300):
+        line_count = int(widget.index("end-1c").split('.')[0])
+        first_line = rng.randint(1, line_count)
+        first = f"{first_line}.{rng.randint(0, 3)}"
+        if rng.random() < 0.5:
+            text = rng.choice(["x", "\n", "a\nb", "\n\n", "yy\nz\n"])
+            _edit(widget, changed, "insert", first, text)
+            replaced, new_count = (first_line, first_line), first_line + text.count('\n')
+        else:
+            last_line = min(first_line + rng.randint(0, 3), line_count)
+            _edit(widget, changed, "delete", first, f"{last_line}.{rng.randint(0, 3)}")
+            replaced, new_count = (first_line, max(last_line, first_line)), first_line
+        flags[replaced[0] - 1:replaced[1]] = [True] * (new_count - first_line + 1)
+        assert len(flags) == int(widget.index("end-1c").split('.')[0])
+        assert changed.line_ranges(len(flags)) == _flagged_ranges(flags)
+
+def test_undo_marks_everything_until_cleared():
+    changed = ChangedLines()
+    assert not changed
+    changed.record(3, 3, 0)
+    changed.on_edit("0", "0", "0", "0")
+    assert changed and changed.line_ranges(40) == [(1, 40)]
+    changed.clear()
+    assert not changed and changed.line_ranges(40) == []
+
+def test_line_ranges_are_clipped_to_the_document():
+    changed = ChangedLines()
+    changed.record(2, 3, 0)
+    changed.record(8, 12, 0)
+    changed.record(20, 20, 0)
+    assert changed.line_ranges(10) == [(2, 3), (8, 10)]
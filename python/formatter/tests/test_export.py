@@ -0,0 +1,51 @@
+"""Chunked export must produce the same tokens as lexing the whole file at once."""
+import io
+import json.decoder
+
+import pytest
+
+import syntax_highlighter
+from benchmark import generate_corpus
+from syntax_highlighter import get_lexer, iter_export, iter_export_tokens
+
+
+def _merged(tokens):
+    """Adjacent tokens of the same type joined, since chunk boundaries may split whitespace runs."""
+    merged = []
+    for token_type, value in tokens:
+        if merged and merged[-1][0] is token_type:
+            merged[-1][1] += value
+        else:
+            merged.append([token_type, value])
+    return merged
+
+def _python_source():
+    with open(json.decoder.__file__, 'r', encoding='utf-8') as f:
+        return f.read()
+
+@pytest.mark.parametrize("filename, code", [
+    ("decoder.py", _python_source()),
+    generate_corpus("json", 50000),
+    ("comment.json", "[1,\n/*\n" + "inside a comment\n" * 500 + "*/\n2]\n"),
+    ("open.json", "/*\n" + "never closed\n" * 500),
+], ids=["python", "json", "long-comment", "no-boundary"])
+def test_chunked_export_matches_whole_file(filename, code):
+    lexer = get_lexer(filename, code)
+    expected = [(token_type, value) for _index, token_type, value in lexer.get_tokens_unprocessed(code)]
+    exported = list(iter_export_tokens(lexer, io.StringIO(code), chunk_lines=100))
+    assert "".join(value for _token_type, value in exported) == code
+    assert _merged(exported) == _merged(expected)
+
+def test_no_boundary_lexes_rest_at_once(monkeypatch):
+    code = "/*\n" + "never closed\n" * 2000
+    lexed = []
+    lex = syntax_highlighter.lex_with_line_states
+    monkeypatch.setattr(syntax_highlighter, "lex_with_line_states",
+                        lambda lexer, text, *args: lexed.append(len(text)) or lex(lexer, text, *args))
+    list(iter_export_tokens(get_lexer("open.json", code), io.StringIO(code), chunk_lines=10))
+    # Without the fallback every chunk would re-lex everything read so far
+    assert sum(lexed) < 10 * len(code)
+
+def test_export_html_escapes():
+    html = "".join(iter_export(get_lexer("x.py", "a = '<b>'\n"), ["a = '<b>'\n"]))
+    assert "&lt;b&gt;" in html and "<b>" not in html
@@ -0,0 +1,82 @@
+"""The fast tokenizers must produce exactly the tokens of the Pygments lexers they replace."""
+import glob
+import json
+import os
+import random
+
+import pytest
+from pygments.lexers.data import JsonLexer, YamlLexer
+from pygments.lexers.python import PythonLexer
+
+from benchmark import generate_corpus
+from fast_lexers import FastJsonLexer, FastYamlLexer, verify_text
+from syntax_highlighter import lex_with_line_states
+
+STDLIB = os.path.dirname(json.__path__[0])
+STDLIB_SAMPLES = sorted(glob.glob(os.path.join(STDLIB, "json", "*.py")) + glob.glob(os.path.join(STDLIB, "email", "*.py"))
+                        + [os.path.join(STDLIB, name) for name in ("argparse.py", "typing.py", "dataclasses.py", "string.py")])
+
+JSON_FIXTURES = [
+    generate_corpus("json", 20000)[1],
+    json.dumps({"key": [1, -2.5e3, True, False, None, 's"t\u00e9\n', "\\"], "": {}, "nested": {"a": []}}, indent=4),
+    '{"a": 1, /* comment */ "b": // line comment\n 2}',
+    '{"unterminated": "string',
+    '[1, 2 /* unterminated comment',
+    '{"key"\n:\n"value", "x" "y": @}',
+    '',
+]
+
+YAML_FIXTURES = [
+    "a: 1\nb:\n  - x\n  - y: |\n      block\n      scalar\n    z: >-\n      folded\n",
+    "--- !tag\n? complex\n: value\n- &anchor item\n- *anchor\n...\n%YAML 1.2\n---\n{a: [1, 2], 'b': \"c\"}\n",
+    "key: 'multi\n  line'\nlist: [a,\n  b]\n# comment\nplain: text with: colon\n",
+    "\t- tab\n  - : \n|\n",
+]
+
+FUZZ_ALPHABETS = {
+    PythonLexer: ['def ', 'class ', 'x', ' = ', '"', "'", '"""', '#', '\n', '    ', '(', ')', ':', '1.5', 'f"{', '}', '\\', '@', 'lambda', 'b"'],
+    JsonLexer: ['{', '}', '[', ']', ':', ',', '"k"', '"', '\\', '1', '-2.5e3', 'true', 'null', ' ', '\n', '/*', '*/', '//', 'u00'],
+    YamlLexer: ['a: ', '- ', '  ', '\n', '|', '>', '"', "'", '#', '&x', '*x', '!!str', '---', '...', '?', '{', '}', '[', ']', ',', '%', '\t'],
+}
+
+
+def _check(lexer_class, text):
+    mismatch, _reference_seconds, _fast_seconds = verify_text(lexer_class, text)
+    assert mismatch is None
+
+@pytest.mark.parametrize("path", STDLIB_SAMPLES, ids=os.path.basename)
+def test_python_stdlib(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        _check(PythonLexer, f.read())
+
+@pytest.mark.parametrize("text", JSON_FIXTURES)
+def test_json_fixtures(text):
+    _check(JsonLexer, text)
+
+@pytest.mark.parametrize("text", YAML_FIXTURES)
+def test_yaml_fixtures(text):
+    _check(YamlLexer, text)
+
+@pytest.mark.parametrize("lexer_class", list(FUZZ_ALPHABETS), ids=lambda cls: cls.__name__)
+@pytest.mark.parametrize("seed", range(40))
+def test_fuzz(lexer_class, seed):
+    rng = random.Random(seed)
+    alphabet = FUZZ_ALPHABETS[lexer_class]
+    _check(lexer_class, "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 300))))
+
+@pytest.mark.parametrize("lexer_class", [FastJsonLexer, FastYamlLexer], ids=lambda cls: cls.__name__)
+def test_resume_from_line_states(lexer_class):
+    """Lexing resumed at any recorded line start gives the tokens of lexing from the top."""
+    text = JSON_FIXTURES[0] if lexer_class is FastJsonLexer else "".join(YAML_FIXTURES[:3]) * 5
+    lexer = lexer_class()
+    line_states = []
+    full = list(lex_with_line_states(lexer, text, line_states=line_states))
+    assert line_states
+    line_starts = [0] + [i + 1 for i, c in enumerate(text) if c == '\n']
+    for line_offset, state in line_states[::7]:
+        start = line_starts[line_offset]
+        resumed = [(start + index, token_type, value) for index, token_type, value in lex_with_line_states(lexer, text[start:], state)]
+        # A restart inside a whitespace token splits it at the line start
+        expected = [(max(index, start), token_type, value[max(start - index, 0):])
+                    for index, token_type, value in full if index + len(value) > start]
+        assert resumed == expected
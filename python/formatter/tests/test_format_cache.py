@@ -0,0 +1,58 @@
+import os
+
+from format_cache import FormatCache, cache_key
+
+
+def _age(cache, ages):
+    """Sets the entries' last use to ``ages`` (key -> seconds since the epoch) and reloads the index from disk."""
+    for key, seconds in ages.items():
+        os.utime(os.path.join(cache.directory, key), ns=(seconds * 10**9, seconds * 10**9))
+    return FormatCache(cache.directory, cache.max_bytes)
+
+def test_key_depends_on_identity_options_and_code():
+    key = cache_key(["/usr/bin/gofmt", 1, "1.22"], None, "package main\n")
+    assert key == cache_key(["/usr/bin/gofmt", 1, "1.22"], None, "package main\n")
+    assert key != cache_key(["/usr/bin/gofmt", 1, "1.23"], None, "package main\n")
+    assert key != cache_key(["/usr/bin/gofmt", 1, "1.22"], ["--lines=1:2"], "package main\n")
+    assert key != cache_key(["/usr/bin/gofmt", 1, "1.22"], None, "package main\n\n")
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = FormatCache(str(tmp_path), max_bytes=300)
+    keys = [cache_key("formatter", None, str(i)) for i in range(3)]
+    for key in keys:
+        cache.put(key, "x" * 100)
+    assert cache.total_bytes == 300
+    cache = _age(cache, {keys[0]: 1000, keys[1]: 2000, keys[2]: 3000})
+
+    # A hit makes the oldest entry the most recently used one
+    assert cache.get(keys[0]) == "x" * 100
+    cache.put(cache_key("formatter", None, "new"), "y" * 100)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == "x" * 100 and cache.get(keys[2]) == "x" * 100
+    assert cache.total_bytes == 300
+    assert sorted(os.listdir(tmp_path)) == sorted(cache.entries)
+
+def test_oversized_output_is_not_cached(tmp_path):
+    cache = FormatCache(str(tmp_path), max_bytes=10)
+    cache.put("a" * 64, "too long for the cache")
+    assert cache.get("a" * 64) is None and cache.total_bytes == 0
+
+def test_replacing_an_entry_keeps_the_size_right(tmp_path):
+    cache = FormatCache(str(tmp_path), max_bytes=1000)
+    cache.put("a" * 64, "x" * 100)
+    cache.put("a" * 64, "x" * 10)
+    assert cache.total_bytes == 10
+    assert FormatCache(str(tmp_path)).total_bytes == 10
+
+def test_missing_file_is_forgotten(tmp_path):
+    cache = FormatCache(str(tmp_path), max_bytes=1000)
+    cache.put("b" * 64, "formatted")
+    os.remove(tmp_path / ("b" * 64))
+    assert cache.get("b" * 64) is None
+    assert cache.entries == {} and cache.total_bytes == 0
+
+def test_clear(tmp_path):
+    cache = FormatCache(str(tmp_path), max_bytes=1000)
+    cache.put("c" * 64, "formatted")
+    cache.clear()
+    assert os.listdir(tmp_path) == [] and cache.total_bytes == 0
@@ -0,0 +1,77 @@
+import json
+import shutil
+
+import pytest
+
+from formatter_pool import NODE_WORKER, WORKER_COMMANDS, FormatterPool
+from formatters import (SUPPORTED_FORMATTERS, FORMATTER_COMMANDS, IN_PROCESS_FORMATTERS, RANGE_FORMATTERS,
+                        languages_for_filename, range_formatter_command)
+
+
+def test_every_backend_is_reachable():
+    selectable = set(SUPPORTED_FORMATTERS.values())
+    assert set(FORMATTER_COMMANDS) <= selectable
+    assert set(IN_PROCESS_FORMATTERS) <= selectable
+    assert set(RANGE_FORMATTERS) <= selectable
+    assert set(WORKER_COMMANDS) - {"stub"} <= selectable
+
+def test_languages_for_filename():
+    assert languages_for_filename("setup.py") == ("python",)
+    assert languages_for_filename("Dockerfile") == ("dockerfile",)
+    assert languages_for_filename("notes.unknown-extension") == ()
+
+def test_prettier_range_counts_utf16_units():
+    code = "const a = '😀';\nconst b = 1;\n"
+    cmd, options = range_formatter_command("prettier", "javascript", code, [(2, 2)])
+    assert options == {'rangeStart': 16, 'rangeEnd': 29}
+    assert cmd[-4:] == ["--range-start", "16", "--range-end", "29"]
+
+def test_prettier_range_counts_only_newlines_as_line_ends():
+    _cmd, options = range_formatter_command("prettier", "javascript", "a\x0cb\nc\nd\n", [(3, 3)])
+    assert options == {'rangeStart': 6, 'rangeEnd': 8}
+    _cmd, options = range_formatter_command("prettier", "javascript", "a\u2028b\nc", [(2, 2)])
+    assert options == {'rangeStart': 4, 'rangeEnd': 5}
+
+def test_range_command_keeps_stdin_marker_last():
+    cmd, options = range_formatter_command("autopep8", "python", "x=1\n", [(1, 1), (3, 4)])
+    assert cmd == ["autopep8", "--line-range", "1", "4", "-"]
+    with pytest.raises(ValueError):
+        range_formatter_command("gofmt", "go", "", [(1, 1)])
+
+def test_pool_round_trip_with_stub_worker():
+    pool = FormatterPool()
+    try:
+        assert pool.format("stub", "x = 1\n") == "x = 1\n"
+        assert pool.format("stub", "y\n") == "y\n"
+        assert len(pool.workers) == 1
+    finally:
+        pool.shutdown()
+
+# Stands in for the prettier package: resolveConfig reads a JSON .prettierrc next to the file, and format
+# returns the options it was given
+FAKE_PRETTIER = """
+const fs = require("fs"), path = require("path");
+exports.resolveConfig = async (filepath, options) => {
+  const rc = path.join(path.dirname(path.resolve(filepath)), ".prettierrc");
+  return fs.existsSync(rc) ? JSON.parse(fs.readFileSync(rc, "utf8")) : null;
+};
+exports.format = async (code, options) => JSON.stringify(options);
+"""
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_prettier_worker_applies_the_project_config(tmp_path, monkeypatch):
+    package_dir = tmp_path / "prettier"
+    package_dir.mkdir()
+    (package_dir / "index.js").write_text(FAKE_PRETTIER, encoding='utf-8')
+    (tmp_path / ".prettierrc").write_text('{"semi": false, "rangeStart": 0}', encoding='utf-8')
+    monkeypatch.setitem(WORKER_COMMANDS, "prettier", lambda: [shutil.which("node"), NODE_WORKER, str(package_dir)])
+    pool = FormatterPool()
+    try:
+        filepath = str(tmp_path / "temp.js")
+        options = json.loads(pool.format("prettier", "a;", filepath, {'rangeStart': 3}))
+        assert options == {'semi': False, 'rangeStart': 3, 'filepath': filepath}
+        # The config is read again for every request
+        (tmp_path / ".prettierrc").write_text('{"semi": true}', encoding='utf-8')
+        assert json.loads(pool.format("prettier", "a;", filepath))['semi'] is True
+    finally:
+        pool.shutdown()
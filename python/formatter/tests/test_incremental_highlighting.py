@@ -0,0 +1,188 @@
+"""Incremental re-highlighting after edits must leave the same tags as highlighting the text from scratch."""
+import json.decoder
+import random
+
+import pytest
+
+import syntax_highlighter
+from benchmark import generate_corpus
+from diff_view import diff_lines
+from fake_text import FakeText, edit
+from syntax_highlighter import DocumentHighlighter, configure_tags, get_lexer, highlight_document
+
+YAML_SAMPLE = """\
+services:
+  web:
+    image: "nginx:latest"
+    ports:
+      - 80:80
+    command: |
+      run --all
+      --verbose
+    description: >-
+      folded
+      text
+  db: {image: postgres, env: [A, B]}
+? complex key
+: value
+---
+- &anchor item
+- *anchor
+- !!str tagged
+""" * 20
+
+C_SAMPLE = """\
+#include <stdio.h>
+/* multi-line
+   comment */
+static int add(int a, int b)
+{
+    return a + b; // sum
+}
+""" * 40
+
+SNIPPETS = ['"', "'", '#', '\n', ' ', '{', '}', '[', ']', ':', '- ', '/*', '*/', '"""', 'x = 1\n', '  key: v\n']
+
+
+def _python_source():
+    with open(json.decoder.__file__, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def _samples():
+    return [
+        ("decoder.py", _python_source()),
+        generate_corpus("json", 20000),
+        ("compose.yaml", YAML_SAMPLE),
+        ("sample.c", C_SAMPLE),
+        # Picked up as JavascriptGenshiLexer, which cannot resume at line starts
+        generate_corpus("javascript", 8000),
+    ]
+
+def _full_highlight(text, lexer):
+    widget = FakeText(text)
+    configure_tags(widget)
+    highlight_document(widget, lexer)
+    return widget.char_tags()
+
+def _random_edit(rng, widget, highlighter):
+    line_count = int(widget.index("end-1c").split('.')[0])
+    start = widget.index(f"{rng.randint(1, line_count)}.{rng.randint(0, 8)}")
+    if rng.random() < 0.6:
+        edit(widget, highlighter, "insert", start, rng.choice(SNIPPETS))
+    else:
+        edit(widget, highlighter, "delete", start, widget.index(f"{start}+{rng.randint(1, 40)}c"))
+
+
+@pytest.mark.parametrize("filename, code", _samples(), ids=["python", "json", "yaml", "c", "javascript"])
+def test_edits_match_full_highlight(filename, code):
+    lexer = get_lexer(filename, code)
+    widget = FakeText(code)
+    configure_tags(widget)
+    highlighter = DocumentHighlighter(widget)
+    highlighter.set_document(lexer)
+    rng = random.Random(filename)
+    for step in range(25):
+        _random_edit(rng, widget, highlighter)
+        widget.run_pending()
+        assert len(highlighter.line_states) == highlighter.line_count + 2
+        assert widget.char_tags() == _full_highlight(widget.text[:-1], lexer), f"after edit {step}"
+
+def test_non_resumable_lexer_edits_in_background():
+    filename, code = generate_corpus("javascript", 4000)
+    widget = FakeText(code)
+    configure_tags(widget)
+    highlighter = DocumentHighlighter(widget)
+    highlighter.set_document(get_lexer(filename, code))
+    assert not highlighter.resumable
+    edit(widget, highlighter, "insert", "3.0", "// note\n")
+    assert widget.pending
+    widget.run_pending()
+    assert widget.char_tags() == _full_highlight(widget.text[:-1], highlighter.lexer)
+
+def test_json_records_state_at_every_line():
+    filename, code = generate_corpus("json", 4000)
+    line_states = []
+    list(syntax_highlighter.lex_with_line_states(get_lexer(filename, code), code, line_states=line_states))
+    assert [offset for offset, _state in line_states] == list(range(1, code.count('\n') + 1))
+
+def test_edit_reads_bounded_text(monkeypatch):
+    filename, code = generate_corpus("json", 200000)
+    widget = FakeText(code)
+    configure_tags(widget)
+    highlighter = DocumentHighlighter(widget)
+    highlighter.set_document(get_lexer(filename, code))
+    read = []
+    get = widget.get
+    monkeypatch.setattr(widget, "get", lambda start, end=None: read.append(get(start, end)) or read[-1])
+    edit(widget, highlighter, "insert", "100.2", " ")
+    assert 0 < sum(len(text) for text in read) < len(code) // 10
+
+def test_undo_keeps_background_mode():
+    filename, code = generate_corpus("python", 20000)
+    widget = FakeText(code)
+    configure_tags(widget)
+    highlighter = DocumentHighlighter(widget)
+    highlighter.set_document(get_lexer(filename, code), background=True)
+    widget.run_pending()
+    widget.insert("2.0", "x = 1\n")
+    # What the edit proxy reports for undo/redo
+    highlighter._on_edit("0", "0", "0", "0")
+    assert highlighter.background and widget.pending
+    widget.run_pending()
+    assert widget.char_tags() == _full_highlight(widget.text[:-1], highlighter.lexer)
+
+def _apply_hunks(widget, highlighter, new_text):
+    """Applies the line diff bottom-up through the edit proxy, as main.py does with formatter output."""
+    old_lines, new_lines, opcodes = diff_lines(widget.text[:-1], new_text)
+    for tag, i1, i2, j1, j2 in reversed(opcodes):
+        if tag == 'equal': continue
+        if i1 < i2:
+            edit(widget, highlighter, "delete", f"{i1 + 1}.0", f"{i2 + 1}.0" if i2 < len(old_lines) else "end-1c")
+        if j1 < j2:
+            edit(widget, highlighter, "insert", f"{i1 + 1}.0", "".join(new_lines[j1:j2]))
+
+def _reformat(code, rng):
+    lines = code.splitlines(keepends=True)
+    for i in sorted(rng.sample(range(len(lines)), len(lines) // 10), reverse=True):
+        choice = rng.random()
+        if choice < 0.4: lines[i] = lines[i].rstrip('\n') + "  # note\n"
+        elif choice < 0.7: del lines[i]
+        else: lines.insert(i, "\n")
+    return "".join(lines)
+
+@pytest.mark.parametrize("filename, code", [("decoder.py", _python_source()), generate_corpus("json", 20000)],
+                         ids=["python", "json"])
+def test_batched_hunks_are_highlighted_once(filename, code, monkeypatch):
+    lexer = get_lexer(filename, code)
+    widget = FakeText(code)
+    configure_tags(widget)
+    highlighter = DocumentHighlighter(widget)
+    highlighter.set_document(lexer)
+    calls = []
+    rehighlight_edit = highlighter._rehighlight_edit
+    monkeypatch.setattr(highlighter, "_rehighlight_edit", lambda *args: calls.append(args) or rehighlight_edit(*args))
+    new_code = _reformat(code, random.Random(filename))
+    hunks = sum(tag != 'equal' for tag, *_ in diff_lines(code, new_code)[2])
+    with highlighter.batch_edits():
+        _apply_hunks(widget, highlighter, new_code)
+        assert calls == []
+    # Once per merged range of edited lines, skipping ranges an earlier re-lex ran through
+    assert widget.text[:-1] == new_code and 0 < len(calls) < hunks
+    assert len(set(calls)) == len(calls)
+    assert len(highlighter.line_states) == highlighter.line_count + 2
+    assert widget.char_tags() == _full_highlight(new_code, lexer)
+
+@pytest.mark.parametrize("old, new", [
+    ("x = 1\n\x0c\ny=2\n", "x = 1\n\x0c\ny = 2\n"),
+    ("s = 'a b'\nt=1\nu = '\x1c\u2028'\nv=2\n", "s = 'a b'\nt = 1\nu = '\x1c\u2028'\nv = 2\n"),
+], ids=["form feed", "line separators"])
+def test_hunks_with_unicode_line_breaks_edit_the_right_lines(old, new):
+    lexer = get_lexer("sample.py", old)
+    widget = FakeText(old)
+    configure_tags(widget)
+    highlighter = DocumentHighlighter(widget)
+    highlighter.set_document(lexer)
+    with highlighter.batch_edits():
+        _apply_hunks(widget, highlighter, new)
+    assert widget.text[:-1] == new
+    assert widget.char_tags() == _full_highlight(new, lexer)
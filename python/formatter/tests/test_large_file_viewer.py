@@ -0,0 +1,49 @@
+import random
+import time
+
+import pytest
+
+import large_file_viewer
+from large_file_viewer import LineIndex
+
+
+def _index(data):
+    index = LineIndex(data)
+    index.start()
+    deadline = time.monotonic() + 10
+    while not index.done:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    return index
+
+def _lines(data):
+    """The file's lines with their line breaks; only '\n' ends a line."""
+    parts = data.split(b'\n')
+    return [part + b'\n' for part in parts[:-1]] + ([parts[-1]] if parts[-1] or not data else [])
+
+@pytest.mark.parametrize("data", [
+    b"", b"\n", b"a", b"a\n", b"\n\n", b"one\ntwo\nthree", b"one\ntwo\nthree\n",
+    b"crlf\r\nline\r\nends\r\n", b"mixed\r\nno trailing newline\rx",
+])
+@pytest.mark.parametrize("block_size", [1, 2, 3, 7, 1 << 20])
+def test_line_starts(data, block_size, monkeypatch):
+    monkeypatch.setattr(large_file_viewer, "INDEX_BLOCK_SIZE", block_size)
+    index = _index(data)
+    lines = _lines(data)
+    assert index.error is None and index.indexed_bytes == len(data)
+    assert index.line_count == len(lines) == index.estimated_line_count()
+    assert [data[slice(*index.byte_range(i, i + 1))] for i in range(len(lines))] == lines
+    assert index.byte_range(0, index.line_count) == (0, len(data))
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_files_across_block_boundaries(seed, monkeypatch):
+    rng = random.Random(seed)
+    monkeypatch.setattr(large_file_viewer, "INDEX_BLOCK_SIZE", rng.randint(1, 64))
+    data = b"".join(rng.choice([b"x", b"yy", b"\n", b"\r\n", b"\n\n", b"z" * 40]) for _ in range(rng.randint(0, 300)))
+    index = _index(data)
+    lines = _lines(data)
+    assert index.line_count == len(lines)
+    first = rng.randint(0, len(lines) - 1)
+    last = rng.randint(first, len(lines))
+    start, end = index.byte_range(first, last)
+    assert data[start:end] == b"".join(lines[first:last])
@@ -0,0 +1,91 @@
+import os
+import subprocess
+
+import pytest
+
+import tool_detection
+from tool_detection import ToolRegistry, probe_version
+
+
+@pytest.fixture
+def tools(tmp_path, monkeypatch):
+    """Fake executables in tmp_path found by a patched shutil.which; ``probes`` records the --version runs."""
+    installed = {}
+    probes = []
+    outputs = {}
+    def install(name, stdout="", stderr="", returncode=0):
+        path = tmp_path / name
+        path.write_text("", encoding='utf-8')
+        installed[name] = str(path)
+        outputs[str(path)] = subprocess.CompletedProcess([str(path), "--version"], returncode, stdout, stderr)
+        return path
+    def run(cmd, **kwargs):
+        probes.append(cmd[0])
+        return outputs[cmd[0]]
+    monkeypatch.setattr(tool_detection.shutil, "which", installed.get)
+    monkeypatch.setattr(tool_detection.subprocess, "run", run)
+    return install, installed, probes
+
+def test_missing_tool(tools, tmp_path):
+    _install, _installed, probes = tools
+    registry = ToolRegistry(str(tmp_path / "cache.json"))
+    assert not registry.is_available("gofmt")
+    assert registry.identity("gofmt") is None and registry.version("gofmt") is None
+    assert registry.detect(["gofmt"]) == {}
+    assert probes == [] and registry.ready.is_set()
+
+def test_versions_are_cached_by_path_and_mtime(tools, tmp_path):
+    install, _installed, probes = tools
+    gofmt = install("gofmt", stdout="\ngo version go1.22\nmore\n")
+    cache_file = str(tmp_path / "cache.json")
+    assert ToolRegistry(cache_file).detect(["gofmt"]) == {"gofmt": "go version go1.22"}
+    assert probes == [str(gofmt)]
+
+    # A new registry (the next start) reads the version from the cache file
+    registry = ToolRegistry(cache_file)
+    assert registry.detect(["gofmt"]) == {"gofmt": "go version go1.22"}
+    assert probes == [str(gofmt)]
+    identity = registry.identity("gofmt")
+    assert identity == (os.path.realpath(gofmt), os.stat(gofmt).st_mtime_ns, "go version go1.22")
+
+    # An upgrade changes the mtime: the tool is probed again and its identity changes
+    stat = os.stat(gofmt)
+    os.utime(gofmt, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    registry = ToolRegistry(cache_file)
+    registry.detect(["gofmt"])
+    assert probes == [str(gofmt)] * 2
+    assert registry.identity("gofmt") != identity
+
+def test_failed_probes_have_no_version(tools, tmp_path):
+    install, _installed, _probes = tools
+    install("broken", returncode=1, stdout="v1")
+    install("quiet")
+    install("stderr-only", stderr="tool 2.0\n")
+    registry = ToolRegistry(str(tmp_path / "cache.json"))
+    assert registry.detect(["broken", "quiet", "stderr-only"]) == {"broken": None, "quiet": None, "stderr-only": "tool 2.0"}
+    assert registry.identity("broken")[2] is None
+
+def test_uninstalled_tool_is_resolved_again(tools, tmp_path):
+    install, installed, _probes = tools
+    path = install("shfmt")
+    registry = ToolRegistry(str(tmp_path / "cache.json"))
+    assert registry.resolve("shfmt") == str(path)
+    # Reinstalled somewhere else
+    os.remove(path)
+    (tmp_path / "bin").mkdir()
+    moved = tmp_path / "bin" / "shfmt"
+    moved.write_text("", encoding='utf-8')
+    installed["shfmt"] = str(moved)
+    assert registry.resolve("shfmt") == str(moved)
+    # Removed for good
+    os.remove(moved)
+    del installed["shfmt"]
+    assert not registry.is_available("shfmt")
+
+def test_probe_version_handles_missing_executables(tmp_path):
+    assert probe_version(str(tmp_path / "does-not-exist")) is None
+
+def test_unreadable_cache_file_is_ignored(tools, tmp_path):
+    cache_file = tmp_path / "cache.json"
+    cache_file.write_text("not json", encoding='utf-8')
+    assert ToolRegistry(str(cache_file)).versions == {}
@@ -0,0 +1,131 @@
+"""
+Detection of the external formatters and linters.
+
+Tools are located with ``shutil.which`` (no process is started), and their ``--version`` output is probed
+in parallel on a thread pool. Versions are cached by (executable path, mtime) in TOOL_CACHE_FILE, so a
+later start only probes tools that were installed or upgraded since.
+"""
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+TOOL_CACHE_FILE = os.path.expanduser("~/.code_formatter_tools.json")
+VERSION_PROBE_TIMEOUT = 2
+VERSION_PROBE_WORKERS = 8
+
+
+def probe_version(path):
+    """Returns the first line ``path --version`` prints, or None if it fails (some tools have no --version)."""
+    try:
+        process = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=VERSION_PROBE_TIMEOUT)
+    except (subprocess.SubprocessError, OSError):
+        return None
+    if process.returncode != 0:
+        return None
+    for line in (process.stdout or process.stderr or "").splitlines():
+        if line.strip():
+            return line.strip()
+    return None
+
+
+class ToolRegistry:
+    """
+    Knows where each tool is installed and which version it is.
+    ``is_available`` never starts a process: it uses the resolved path, resolving unknown tools with
+    ``shutil.which`` on demand.
+    """
+
+    def __init__(self, cache_file=TOOL_CACHE_FILE):
+        self.cache_file = cache_file
+        self.paths = {}
+        # (executable path, mtime_ns) -> version line or None
+        self.versions = {}
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._load_cache()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            self.versions = {(entry['path'], entry['mtime_ns']): entry.get('version') for entry in entries}
+        except (OSError, ValueError, KeyError, TypeError):
+            self.versions = {}
+
+    def _save_cache(self):
+        with self._lock:
+            entries = [{'path': path, 'mtime_ns': mtime_ns, 'version': version}
+                       for (path, mtime_ns), version in self.versions.items()]
+        try:
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Could not save the tool cache: {e}")
+
+    def resolve(self, tool):
+        """Returns the executable path of ``tool`` (cached), or None if it is not on PATH."""
+        with self._lock:
+            if tool in self.paths:
+                path = self.paths[tool]
+                # An uninstalled tool is looked up again
+                if path is None or os.path.exists(path):
+                    return path
+        path = shutil.which(tool)
+        with self._lock:
+            self.paths[tool] = path
+        return path
+
+    def is_available(self, tool):
+        return self.resolve(tool) is not None
+
+    def version(self, tool):
+        """Cached version line of ``tool``; None if unknown, not yet probed, or not installed."""
+        key = self._version_key(self.resolve(tool))
+        with self._lock:
+            return self.versions.get(key)
+
+    def identity(self, tool):
+        """(real path, mtime_ns, version) of the installed ``tool``, or None; changes when the tool is upgraded."""
+        key = self._version_key(self.resolve(tool))
+        if key is None:
+            return None
+        with self._lock:
+            return key + (self.versions.get(key),)
+
+    @staticmethod
+    def _version_key(path):
+        if not path: return None
+        try:
+            return os.path.realpath(path), os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def detect(self, tools):
+        """Resolves ``tools`` and probes the versions missing from the cache in parallel; returns {tool: version}."""
+        keys = {tool: self._version_key(self.resolve(tool)) for tool in tools}
+        with self._lock:
+            missing = sorted({key for key in keys.values() if key is not None and key not in self.versions})
+        if missing:
+            with ThreadPoolExecutor(max_workers=VERSION_PROBE_WORKERS) as executor:
+                versions = list(executor.map(probe_version, (path for path, _mtime_ns in missing)))
+            with self._lock:
+                self.versions.update(zip(missing, versions))
+            self._save_cache()
+        with self._lock:
+            found = {tool: self.versions.get(key) for tool, key in keys.items() if key is not None}
+        logger.info(f"Found {len(found)} of {len(keys)} tools ({len(missing)} probed): "
+                    + ", ".join(f"{tool} ({version or 'unknown version'})" for tool, version in sorted(found.items())))
+        self.ready.set()
+        return found
+
+    def detect_async(self, tools):
+        """Runs detect on a background thread."""
+        thread = threading.Thread(target=self.detect, args=(list(tools),), name="tool-detection", daemon=True)
+        thread.start()
+        return thread